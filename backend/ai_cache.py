@@ -0,0 +1,107 @@
+import hashlib
+import json
+import logging
+import os
+from datetime import datetime, timezone, timedelta
+from typing import Any, Dict, Optional
+
+from cache_utils import TTLCache
+
+logger = logging.getLogger(__name__)
+
+AI_CACHE_TTL = int(os.environ.get("AI_CACHE_TTL", str(7 * 24 * 60 * 60)))
+AI_CACHE_MEMORY_SIZE = int(os.environ.get("AI_CACHE_MEMORY_SIZE", "2048"))
+AI_CACHE_MEMORY_TTL = int(os.environ.get("AI_CACHE_MEMORY_TTL", str(60 * 60)))
+
+
+def make_cache_key(*parts: Any) -> str:
+    """Content address for a request: sha256 over the canonical JSON of its parts."""
+    payload = json.dumps(parts, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """Two-tier cache: an in-process LRU in front of a MongoDB collection.
+
+    Documents carry an ``expires_at`` date that drives a TTL index, so MongoDB
+    removes stale entries on its own. Lookups that hit MongoDB refill the
+    memory tier. MongoDB errors are logged and treated as misses; the cache
+    never fails the request it is serving.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        collection,
+        ttl: int = AI_CACHE_TTL,
+        memory_size: int = AI_CACHE_MEMORY_SIZE,
+        memory_ttl: int = AI_CACHE_MEMORY_TTL,
+    ):
+        self.name = name
+        self.collection = collection
+        self.ttl = ttl
+        self.memory = TTLCache(maxsize=memory_size, ttl=min(memory_ttl, ttl))
+        self.db_hits = 0
+        self.db_misses = 0
+        self.writes = 0
+        self.savings: Dict[str, int] = {}
+
+    def record_saving(self, kind: str, amount: int = 1) -> None:
+        """Count work a hit let us skip (LLM calls, parsed pages, ...)."""
+        self.savings[kind] = self.savings.get(kind, 0) + amount
+
+    async def ensure_indexes(self) -> None:
+        await self.collection.create_index("expires_at", expireAfterSeconds=0)
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        value = self.memory.get(key)
+        if value is not None:
+            return value
+
+        try:
+            doc = await self.collection.find_one(
+                {"_id": key, "expires_at": {"$gt": datetime.now(timezone.utc)}}
+            )
+        except Exception:
+            logger.exception("%s cache lookup failed", self.name)
+            doc = None
+
+        if doc is None:
+            self.db_misses += 1
+            return None
+
+        self.db_hits += 1
+        self.memory.set(key, doc["value"])
+        return doc["value"]
+
+    async def set(self, key: str, value: Dict[str, Any]) -> None:
+        self.memory.set(key, value)
+        now = datetime.now(timezone.utc)
+        try:
+            await self.collection.replace_one(
+                {"_id": key},
+                {"value": value, "created_at": now, "expires_at": now + timedelta(seconds=self.ttl)},
+                upsert=True,
+            )
+            self.writes += 1
+        except Exception:
+            logger.exception("%s cache write failed", self.name)
+
+    def stats(self) -> Dict[str, Any]:
+        memory = self.memory.stats()
+        lookups = memory["hits"] + memory["misses"]
+        hits = memory["hits"] + self.db_hits
+        db_lookups = self.db_hits + self.db_misses
+        return {
+            "lookups": lookups,
+            "hits": hits,
+            "hit_ratio": round(hits / lookups, 4) if lookups else 0.0,
+            "writes": self.writes,
+            "savings": dict(self.savings),
+            "memory": memory,
+            "mongo": {
+                "hits": self.db_hits,
+                "misses": self.db_misses,
+                "hit_ratio": round(self.db_hits / db_lookups, 4) if db_lookups else 0.0,
+            },
+        }
@@ -0,0 +1,153 @@
+import asyncio
+import hashlib
+import logging
+import os
+import time
+from datetime import datetime, timezone, timedelta
+from typing import Any, Dict, List, Optional
+
+import jwt
+
+from date_utils import as_datetime
+
+logger = logging.getLogger(__name__)
+
+# "session": opaque tokens checked against user_sessions on every request.
+# "token": short-lived signed access tokens, refreshed with the session token.
+AUTH_MODE = os.environ.get("AUTH_MODE", "session")
+AUTH_TOKEN_SECRET = os.environ.get("AUTH_TOKEN_SECRET")
+ACCESS_TOKEN_TTL = int(os.environ.get("ACCESS_TOKEN_TTL", "900"))
+TOKEN_DENYLIST_REFRESH = float(os.environ.get("TOKEN_DENYLIST_REFRESH", "10"))
+
+ALGORITHM = "HS256"
+
+
+class InvalidAccessToken(Exception):
+    pass
+
+
+def session_id(session_token: str) -> str:
+    """Stable, non-secret id for a session, safe to put in a readable token."""
+    return hashlib.sha256(session_token.encode("utf-8")).hexdigest()[:32]
+
+
+def looks_like_access_token(token: str) -> bool:
+    return token.count(".") == 2
+
+
+class AccessTokens:
+    """Issues and verifies HS256 JWTs that carry the user and their plan."""
+
+    def __init__(self, secret: Optional[str] = AUTH_TOKEN_SECRET, ttl: int = ACCESS_TOKEN_TTL):
+        self.secret = secret
+        self.ttl = ttl
+
+    def issue(self, user: Dict[str, Any], session_token: str) -> str:
+        if not self.secret:
+            raise RuntimeError("AUTH_TOKEN_SECRET not set")
+        now = time.time()
+        claims = {
+            "sub": user["user_id"],
+            "plan": user.get("subscription_plan", "free"),
+            "email": user["email"],
+            "name": user["name"],
+            "picture": user.get("picture"),
+            "created_at": as_datetime(user["created_at"]).isoformat(),
+            "sid": session_id(session_token),
+            # Sub-second iat so a token issued right after a revocation stays valid
+            "iat": round(now, 3),
+            "exp": int(now) + self.ttl,
+        }
+        return jwt.encode(claims, self.secret, algorithm=ALGORITHM)
+
+    def verify(self, token: str) -> Dict[str, Any]:
+        if not self.secret:
+            raise RuntimeError("AUTH_TOKEN_SECRET not set")
+        try:
+            return jwt.decode(token, self.secret, algorithms=[ALGORITHM], options={"require": ["exp", "iat", "sub"]})
+        except jwt.ExpiredSignatureError:
+            raise InvalidAccessToken("Access token expired")
+        except jwt.InvalidTokenError:
+            raise InvalidAccessToken("Invalid access token")
+
+
+class TokenDenylist:
+    """Revoked sessions and users, mirrored in memory from MongoDB.
+
+    Access tokens are short-lived, so entries only need to outlive them:
+    the TTL index drops each one after ``ttl`` seconds, which keeps the
+    list small enough to reload in full every ``refresh_interval``.
+    Revocations made on this node apply immediately; other nodes pick
+    them up on their next reload.
+    """
+
+    def __init__(self, collection, ttl: int = ACCESS_TOKEN_TTL, refresh_interval: float = TOKEN_DENYLIST_REFRESH):
+        self.collection = collection
+        self.ttl = ttl
+        self.refresh_interval = refresh_interval
+        self._sessions: Dict[str, float] = {}
+        # user_id -> tokens issued before this time are revoked
+        self._users: Dict[str, float] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    async def ensure_indexes(self) -> None:
+        await self.collection.create_index("expires_at", expireAfterSeconds=0)
+
+    def is_revoked(self, claims: Dict[str, Any]) -> bool:
+        if claims.get("sid") in self._sessions:
+            return True
+        return claims["iat"] < self._users.get(claims["sub"], -1)
+
+    async def revoke_session(self, session_token: str) -> None:
+        await self.revoke_sid(session_id(session_token))
+
+    async def revoke_sid(self, sid: str) -> None:
+        await self._add(f"sid:{sid}")
+
+    async def revoke_user(self, user_id: str) -> None:
+        """Revoke every access token issued to the user so far."""
+        await self._add(f"user:{user_id}")
+
+    async def _add(self, key: str) -> None:
+        now = datetime.now(timezone.utc)
+        self._apply(key, now.timestamp())
+        await self.collection.update_one(
+            {"_id": key},
+            {"$set": {"revoked_at": now, "expires_at": now + timedelta(seconds=self.ttl)}},
+            upsert=True,
+        )
+
+    def _apply(self, key: str, revoked_at: float) -> None:
+        kind, _, value = key.partition(":")
+        if kind == "sid":
+            self._sessions[value] = revoked_at
+        elif kind == "user":
+            self._users[value] = max(self._users.get(value, -1), revoked_at)
+
+    async def reload(self) -> None:
+        docs: List[Dict[str, Any]] = await self.collection.find({}, {"revoked_at": 1}).to_list(None)
+        self._sessions, self._users = {}, {}
+        for doc in docs:
+            self._apply(doc["_id"], doc["revoked_at"].timestamp())
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run(), name="token-denylist-refresh")
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {"sessions": len(self._sessions), "users": len(self._users)}
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.reload()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Failed to reload token denylist")
+            await asyncio.sleep(self.refresh_interval)
@@ -0,0 +1,168 @@
+"""Local stand-ins for the third-party APIs the backend calls.
+
+One FastAPI app, one path prefix per service:
+
+    /openrouter/api/v1   chat completions (plain and streamed)
+    /github              user repos (paginated, with ETags) and languages
+    /resend              single and batch email sends
+    /razorpay            order creation
+    /cloudinary          uploads
+
+Each response is delayed by FAKE_LATENCY_MS (default 50), or by
+FAKE_<SERVICE>_LATENCY_MS for one service, +/- FAKE_LATENCY_JITTER
+(a fraction, default 0.2). Run with:
+
+    uvicorn fake_upstreams:app --port 9100
+"""
+import asyncio
+import hashlib
+import json
+import os
+import random
+import time
+import uuid
+
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import StreamingResponse
+
+FAKE_LATENCY_MS = float(os.environ.get("FAKE_LATENCY_MS", "50"))
+FAKE_LATENCY_JITTER = float(os.environ.get("FAKE_LATENCY_JITTER", "0.2"))
+FAKE_GITHUB_REPOS = int(os.environ.get("FAKE_GITHUB_REPOS", "30"))
+FAKE_LLM_WORDS = int(os.environ.get("FAKE_LLM_WORDS", "120"))
+
+app = FastAPI()
+calls = {}
+
+
+async def delay(service: str) -> None:
+    calls[service] = calls.get(service, 0) + 1
+    latency = float(os.environ.get(f"FAKE_{service.upper()}_LATENCY_MS", FAKE_LATENCY_MS))
+    if latency > 0:
+        await asyncio.sleep(latency * random.uniform(1 - FAKE_LATENCY_JITTER, 1 + FAKE_LATENCY_JITTER) / 1000)
+
+
+@app.get("/calls")
+async def get_calls():
+    return calls
+
+
+# ---------- OpenRouter (OpenAI-compatible) ----------
+
+def completion_text() -> str:
+    return " ".join(random.choice(("portfolio", "engineer", "built", "scalable", "systems", "with", "impact"))
+                    for _ in range(FAKE_LLM_WORDS))
+
+
+@app.post("/openrouter/api/v1/chat/completions")
+async def chat_completions(body: dict):
+    await delay("openrouter")
+    text = completion_text()
+    base = {"id": f"gen-{uuid.uuid4().hex[:12]}", "created": int(time.time()), "model": body.get("model", "fake")}
+
+    if body.get("stream"):
+        async def chunks():
+            for word in text.split(" "):
+                chunk = {**base, "object": "chat.completion.chunk",
+                         "choices": [{"index": 0, "delta": {"content": word + " "}, "finish_reason": None}]}
+                yield f"data: {json.dumps(chunk)}\n\n"
+                await asyncio.sleep(0)
+            yield "data: [DONE]\n\n"
+        return StreamingResponse(chunks(), media_type="text/event-stream")
+
+    return {
+        **base,
+        "object": "chat.completion",
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": 50, "completion_tokens": FAKE_LLM_WORDS, "total_tokens": 50 + FAKE_LLM_WORDS},
+    }
+
+
+# ---------- GitHub ----------
+
+def github_headers(body: bytes) -> dict:
+    return {
+        "ETag": f'"{hashlib.sha1(body).hexdigest()}"',
+        "X-RateLimit-Remaining": "4999",
+        "X-RateLimit-Reset": str(int(time.time()) + 3600),
+    }
+
+
+def github_response(request: Request, data, extra_headers=None) -> Response:
+    body = json.dumps(data).encode()
+    headers = {**github_headers(body), **(extra_headers or {})}
+    if request.headers.get("if-none-match") == headers["ETag"]:
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
+
+
+@app.get("/github/users/{username}/repos")
+async def github_repos(username: str, request: Request, page: int = 1, per_page: int = 30):
+    await delay("github")
+    last_page = max(1, -(-FAKE_GITHUB_REPOS // per_page))
+    start = (page - 1) * per_page
+    repos = [
+        {
+            "name": f"repo-{i}",
+            "full_name": f"{username}/repo-{i}",
+            "description": f"Project {i} by {username}",
+            "html_url": f"https://github.com/{username}/repo-{i}",
+            "language": "Python",
+            "fork": i % 7 == 0,
+        }
+        for i in range(start, min(start + per_page, FAKE_GITHUB_REPOS))
+    ]
+    link = f'<{request.url.include_query_params(page=last_page)}>; rel="last"' if last_page > 1 else ""
+    return github_response(request, repos, {"Link": link} if link else None)
+
+
+@app.get("/github/repos/{owner}/{repo}/languages")
+async def github_languages(owner: str, repo: str, request: Request):
+    await delay("github")
+    return github_response(request, {"Python": 12000, "JavaScript": 3400, "CSS": 800})
+
+
+# ---------- Resend ----------
+
+@app.post("/resend/emails")
+async def resend_email():
+    await delay("resend")
+    return {"id": str(uuid.uuid4())}
+
+
+@app.post("/resend/emails/batch")
+async def resend_batch(request: Request):
+    await delay("resend")
+    emails = await request.json()
+    return {"data": [{"id": str(uuid.uuid4())} for _ in emails]}
+
+
+# ---------- Razorpay ----------
+
+@app.post("/razorpay/v1/orders")
+async def razorpay_order(body: dict):
+    await delay("razorpay")
+    return {
+        "id": f"order_{uuid.uuid4().hex[:14]}",
+        "entity": "order",
+        "amount": body.get("amount"),
+        "currency": body.get("currency", "INR"),
+        "status": "created",
+        "notes": body.get("notes", {}),
+        "created_at": int(time.time()),
+    }
+
+
+# ---------- Cloudinary ----------
+
+@app.post("/cloudinary/v1_1/{cloud_name}/{resource_type}/upload")
+async def cloudinary_upload(cloud_name: str, resource_type: str, request: Request):
+    form = await request.form()
+    await delay("cloudinary")
+    public_id = form.get("public_id") or uuid.uuid4().hex
+    folder = form.get("folder")
+    path = f"{folder}/{public_id}" if folder else public_id
+    return {
+        "public_id": path,
+        "resource_type": resource_type,
+        "secure_url": f"https://res.cloudinary.com/{cloud_name}/{resource_type}/upload/v1/{path}",
+    }
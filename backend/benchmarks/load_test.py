@@ -0,0 +1,484 @@
+"""Load test: server.py against fake upstreams, driven by a mixed workload.
+
+Usage:
+    python benchmarks/load_test.py [--mongo-url URL] [--concurrency 50]
+        [--duration 30] [--warmup 5] [--latency-ms 50]
+        [--mix public_view=50,dashboard=20,login=5,ai_generate=10,...]
+        [--output results.json] [--compare baseline.json]
+
+Boots fake_upstreams.py (OpenRouter, GitHub, Resend, Razorpay, Cloudinary)
+and server.py with uvicorn on free local ports. Seeds a scratch database
+(dropped afterwards) on a local MongoDB, or on a throwaway mongod when
+--inmemory is given and pymongo_inmemory is installed. Then --concurrency
+clients each run weighted scenarios back to back for --duration seconds.
+
+Prints RPS and p50/p95/p99 latency per route. --output writes them as
+JSON, together with the commit and settings. --compare reads a previous
+JSON and exits 1 if any route's p95 got more than --max-regression
+(a fraction) slower.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timezone, timedelta
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import bcrypt
+import httpx
+from pymongo import MongoClient
+
+BENCH_DIR = Path(__file__).resolve().parent
+BACKEND_DIR = BENCH_DIR.parent
+
+PASSWORD = "bench-password"
+CLIENT_PORTFOLIOS = 2
+GITHUB_USERS = ["octocat", "torvalds", "gvanrossum", "tiangolo", "encode"]
+AI_CONTEXTS = [f"Full-stack developer, {n} years of Python and React" for n in range(1, 21)]
+# 1x1 transparent PNG
+PNG = bytes.fromhex(
+    "89504e470d0a1a0a0000000d4948445200000001000000010806000000"
+    "1f15c4890000000d49444154789c6360000002000001e221bc330000000049454e44ae426082"
+)
+
+DEFAULT_MIX = "public_view=50,dashboard=20,login=5,ai_generate=10,ai_stream=3,github_import=5,contact=3,portfolio_write=3,checkout=1"
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=BACKEND_DIR, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# ---------- Setup ----------
+
+def portfolio_doc(user_id: str, slug: str) -> Dict[str, Any]:
+    now = datetime.now(timezone.utc)
+    return {
+        "portfolio_id": f"portfolio_{uuid.uuid4().hex[:12]}",
+        "user_id": user_id,
+        "name": f"Bench {slug}",
+        "bio": "Engineer who builds fast, reliable web services. " * 5,
+        "role": "Software Engineer",
+        "skills": ["Python", "FastAPI", "MongoDB", "React", "Docker", "AWS"],
+        "projects": [
+            {"title": f"Project {i}", "description": "Did things at scale. " * 10,
+             "tech_stack": ["Python", "React"], "link": None, "github_link": None}
+            for i in range(6)
+        ],
+        "education": [{"institution": "Bench University", "degree": "BSc Computer Science", "year": "2018"}],
+        "experience": [{"company": "Bench Corp", "title": "Engineer", "duration": "2019-2024",
+                        "description": "Built and ran services. " * 5}],
+        "template": "minimal",
+        "theme_color": "#4F46E5",
+        "is_published": True,
+        "slug": slug,
+        "created_at": now,
+        "updated_at": now,
+    }
+
+
+def seed(db, clients: int, login_users: int, portfolios: int) -> Dict[str, Any]:
+    """Users (one per client, plus login-only and owner-only ones), sessions and published portfolios."""
+    password_hash = bcrypt.hashpw(PASSWORD.encode(), bcrypt.gensalt(4)).decode()
+    now = datetime.now(timezone.utc)
+
+    def user(prefix: str, i: int) -> Dict[str, Any]:
+        return {
+            "user_id": f"user_{prefix}{i:06d}",
+            "email": f"{prefix}{i}@bench.example.com",
+            "name": f"Bench {prefix} {i}",
+            "password_hash": password_hash,
+            "picture": None,
+            "subscription_plan": "pro",
+            "is_verified": True,
+            "created_at": now,
+        }
+
+    client_users = [user("client", i) for i in range(clients)]
+    logins = [user("login", i) for i in range(login_users)]
+    owners = [user("owner", i) for i in range(max(1, portfolios // 5))]
+    db.users.insert_many(client_users + logins + owners)
+
+    sessions = [
+        {"user_id": u["user_id"], "session_token": f"session_{uuid.uuid4().hex}",
+         "expires_at": now + timedelta(days=7), "created_at": now}
+        for u in client_users
+    ]
+    db.user_sessions.insert_many(sessions)
+
+    # Each client owns a couple (dashboard loads, room under the Pro cap of 5
+    # for portfolio_write); the rest belong to users who never sign in
+    owner_ids = [u["user_id"] for u in client_users for _ in range(CLIENT_PORTFOLIOS)]
+    owner_ids += [owners[i % len(owners)]["user_id"] for i in range(max(0, portfolios - len(owner_ids)))]
+    docs = [portfolio_doc(owner_id, f"bench-{i}") for i, owner_id in enumerate(owner_ids)]
+    db.portfolios.insert_many(docs)
+
+    return {
+        "sessions": [s["session_token"] for s in sessions],
+        "login_emails": [u["email"] for u in logins],
+        "slugs": [d["slug"] for d in docs],
+    }
+
+
+def start_process(args: List[str], cwd: Path, env: Dict[str, str], log_path: Path) -> subprocess.Popen:
+    log = open(log_path, "w")
+    return subprocess.Popen(args, cwd=cwd, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+
+async def wait_ready(url: str, process: subprocess.Popen, timeout: float = 60) -> None:
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise RuntimeError(f"{url} exited with code {process.returncode}")
+            try:
+                if (await client.get(url)).status_code < 500:
+                    return
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"{url} not ready after {timeout}s")
+
+
+def server_env(args, mongo_url: str, db_name: str, fake_url: str) -> Dict[str, str]:
+    return {
+        **os.environ,
+        "MONGO_URL": mongo_url,
+        "DB_NAME": db_name,
+        "FRONTEND_URL": "http://localhost:3000",
+        "OPENROUTER_API_KEY": "bench",
+        "OPENROUTER_BASE_URL": f"{fake_url}/openrouter/api/v1",
+        "GITHUB_API_URL": f"{fake_url}/github",
+        "RESEND_API_KEY": "bench",
+        "RESEND_API_URL": f"{fake_url}/resend",
+        "RAZORPAY_KEY_ID": "bench",
+        "RAZORPAY_KEY_SECRET": "bench",
+        "RAZORPAY_BASE_URL": f"{fake_url}/razorpay",
+        "STORAGE_BACKEND": "cloudinary",
+        "CLOUDINARY_CLOUD_NAME": "bench",
+        "CLOUDINARY_API_KEY": "bench",
+        "CLOUDINARY_API_SECRET": "bench",
+        "CLOUDINARY_UPLOAD_PREFIX": f"{fake_url}/cloudinary",
+        "BCRYPT_ROUNDS": "4",
+        # Measure the service, not the abuse limits
+        "RATE_LIMIT_QUOTAS": json.dumps({"ai_generate": {}, "ai_extract": {}}),
+        "CONTACT_IP_LIMIT": "1000000000",
+        "CONTACT_SLUG_LIMIT": "1000000000",
+        "SESSION_MAX_PER_USER": "0",
+    }
+
+
+# ---------- Workload ----------
+
+class Recorder:
+    def __init__(self):
+        self.timings: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.statuses: Dict[str, Dict[int, int]] = defaultdict(lambda: defaultdict(int))
+        self.enabled = False
+
+    async def request(self, client: httpx.AsyncClient, route: str, method: str, url: str,
+                      ok: Callable[[int], bool] = lambda status: status < 400, **kwargs) -> Optional[httpx.Response]:
+        start = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+            status = response.status_code
+        except httpx.HTTPError:
+            response, status = None, 0
+        elapsed = (time.perf_counter() - start) * 1000
+        if self.enabled:
+            self.timings[route].append(elapsed)
+            self.statuses[route][status] += 1
+            if not ok(status):
+                self.errors[route] += 1
+        return response
+
+
+class Client:
+    """One simulated user: its own session, portfolio owner and ETag memory."""
+
+    def __init__(self, index: int, http: httpx.AsyncClient, recorder: Recorder, data: Dict[str, Any]):
+        self.http = http
+        self.recorder = recorder
+        self.data = data
+        self.auth = {"Authorization": f"Bearer {data['sessions'][index]}"}
+        self.etags: Dict[str, str] = {}
+
+    async def public_view(self):
+        slug = random.choice(self.data["slugs"])
+        headers = {}
+        # Returning visitors revalidate what their browser cached
+        if slug in self.etags and random.random() < 0.5:
+            headers["If-None-Match"] = self.etags[slug]
+        response = await self.recorder.request(
+            self.http, "GET /api/public/portfolio/{slug}", "GET", f"/api/public/portfolio/{slug}",
+            ok=lambda status: status in (200, 304), headers=headers)
+        if response is not None and "etag" in response.headers:
+            self.etags[slug] = response.headers["etag"]
+
+    async def dashboard(self):
+        await self.recorder.request(self.http, "GET /api/auth/me", "GET", "/api/auth/me", headers=self.auth)
+        await self.recorder.request(self.http, "GET /api/portfolios", "GET", "/api/portfolios", headers=self.auth)
+
+    async def login(self):
+        email = random.choice(self.data["login_emails"])
+        await self.recorder.request(self.http, "POST /api/auth/login", "POST", "/api/auth/login",
+                                    json={"email": email, "password": PASSWORD})
+
+    async def ai_generate(self):
+        # Half the requests repeat a common prompt (cacheable), half force a fresh call
+        body = {"type": "about", "context": random.choice(AI_CONTEXTS), "fresh": random.random() < 0.5}
+        await self.recorder.request(self.http, "POST /api/ai/generate", "POST", "/api/ai/generate",
+                                    json=body, headers=self.auth)
+
+    async def ai_stream(self):
+        body = {"type": "about", "context": random.choice(AI_CONTEXTS), "fresh": True}
+        await self.recorder.request(self.http, "POST /api/ai/generate/stream", "POST", "/api/ai/generate/stream",
+                                    json=body, headers=self.auth)
+
+    async def github_import(self):
+        username = random.choice(GITHUB_USERS)
+        await self.recorder.request(self.http, "GET /api/github/repos/{username}", "GET",
+                                    f"/api/github/repos/{username}", headers=self.auth)
+
+    async def contact(self):
+        slug = random.choice(self.data["slugs"])
+        body = {"name": "Bench", "email": "visitor@bench.example.com", "message": f"Hello {uuid.uuid4().hex}"}
+        await self.recorder.request(self.http, "POST /api/public/contact/{slug}", "POST",
+                                    f"/api/public/contact/{slug}", json=body)
+
+    async def portfolio_write(self):
+        portfolio = portfolio_doc("", "")
+        data = {k: portfolio[k] for k in ("name", "bio", "role", "skills", "projects", "education", "experience")}
+        response = await self.recorder.request(
+            self.http, "POST /api/portfolios", "POST", "/api/portfolios", headers=self.auth,
+            data={"data": json.dumps(data)}, files={"profile_image": ("avatar.png", PNG, "image/png")})
+        if response is not None and response.status_code == 200:
+            portfolio_id = response.json()["portfolio_id"]
+            await self.recorder.request(self.http, "DELETE /api/portfolios/{portfolio_id}", "DELETE",
+                                        f"/api/portfolios/{portfolio_id}", headers=self.auth)
+
+    async def checkout(self):
+        await self.recorder.request(self.http, "POST /api/subscription/create-order", "POST",
+                                    "/api/subscription/create-order", json={"amount": 49900}, headers=self.auth)
+
+
+async def run_client(client: Client, mix: Dict[str, int], deadline: float) -> None:
+    scenarios = [getattr(client, name) for name in mix]
+    weights = list(mix.values())
+    while time.monotonic() < deadline:
+        await random.choices(scenarios, weights)[0]()
+
+
+async def run_workload(base_url: str, data: Dict[str, Any], args) -> Dict[str, Any]:
+    recorder = Recorder()
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as http:
+        clients = [Client(i, http, recorder, data) for i in range(args.concurrency)]
+        start = time.monotonic()
+        deadline = start + args.warmup + args.duration
+        tasks = [asyncio.create_task(run_client(c, args.mix, deadline)) for c in clients]
+
+        await asyncio.sleep(args.warmup)
+        recorder.enabled = True
+        measured_from = time.monotonic()
+        await asyncio.gather(*tasks)
+        elapsed = time.monotonic() - measured_from
+
+        stats = await server_stats(http)
+    return {"routes": summarize(recorder, elapsed), "elapsed": round(elapsed, 3), "stats": stats}
+
+
+async def server_stats(http: httpx.AsyncClient) -> Dict[str, Dict[str, float]]:
+    """The server's app_component_stats gauges from /metrics, as {component: {stat: value}}."""
+    token = os.environ.get("METRICS_TOKEN")
+    response = await http.get("/metrics", headers={"Authorization": f"Bearer {token}"} if token else {})
+    response.raise_for_status()
+    stats: Dict[str, Dict[str, float]] = defaultdict(dict)
+    for line in response.text.splitlines():
+        if not line.startswith("app_component_stats{"):
+            continue
+        labels, value = line[len("app_component_stats{"):].rsplit("} ", 1)
+        component, stat = (part.split("=", 1)[1].strip('"') for part in labels.split('",', 1))
+        stats[component][stat] = float(value)
+    return dict(stats)
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    index = min(len(sorted_values) - 1, max(0, int(round(q * (len(sorted_values) - 1)))))
+    return sorted_values[index]
+
+
+def summarize(recorder: Recorder, elapsed: float) -> Dict[str, Dict[str, Any]]:
+    routes = {}
+    for route, timings in sorted(recorder.timings.items()):
+        timings = sorted(timings)
+        routes[route] = {
+            "requests": len(timings),
+            "errors": recorder.errors[route],
+            "rps": round(len(timings) / elapsed, 2),
+            "p50_ms": round(percentile(timings, 0.50), 2),
+            "p95_ms": round(percentile(timings, 0.95), 2),
+            "p99_ms": round(percentile(timings, 0.99), 2),
+            "mean_ms": round(statistics.mean(timings), 2),
+            "max_ms": round(timings[-1], 2),
+            "statuses": {str(k): v for k, v in sorted(recorder.statuses[route].items())},
+        }
+    return routes
+
+
+# ---------- Reporting ----------
+
+def print_table(routes: Dict[str, Dict[str, Any]]) -> None:
+    print(f"{'route':<42} {'reqs':>7} {'err':>5} {'rps':>8} {'p50':>8} {'p95':>8} {'p99':>8}")
+    for route, r in routes.items():
+        print(f"{route:<42} {r['requests']:>7} {r['errors']:>5} {r['rps']:>8.1f} "
+              f"{r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f} {r['p99_ms']:>8.1f}")
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], max_regression: float) -> bool:
+    """Prints p95/RPS deltas per route; returns False if any p95 regressed too far."""
+    ok = True
+    print(f"\n{'route':<42} {'p95 base':>9} {'p95 now':>9} {'change':>8} {'rps change':>11}")
+    for route, now in results["routes"].items():
+        base = baseline.get("routes", {}).get(route)
+        if not base:
+            continue
+        p95_change = (now["p95_ms"] - base["p95_ms"]) / base["p95_ms"] if base["p95_ms"] else 0.0
+        rps_change = (now["rps"] - base["rps"]) / base["rps"] if base["rps"] else 0.0
+        flag = ""
+        if p95_change > max_regression:
+            ok = False
+            flag = "  REGRESSION"
+        print(f"{route:<42} {base['p95_ms']:>9.1f} {now['p95_ms']:>9.1f} {p95_change:>+8.0%} {rps_change:>+11.0%}{flag}")
+    return ok
+
+
+def parse_mix(spec: str) -> Dict[str, int]:
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if not hasattr(Client, name):
+            raise argparse.ArgumentTypeError(f"Unknown scenario: {name}")
+        if int(weight) > 0:
+            mix[name] = int(weight)
+    return mix
+
+
+# ---------- Main ----------
+
+async def main(args) -> int:
+    logs = Path(args.log_dir or tempfile.mkdtemp(prefix="portfolio-bench-"))
+    logs.mkdir(parents=True, exist_ok=True)
+    print(f"Logs in {logs}")
+    processes: List[subprocess.Popen] = []
+    mongod = None
+
+    mongo_url = args.mongo_url
+    if args.inmemory:
+        from pymongo_inmemory import Mongod
+        mongod = Mongod()
+        mongod.start()
+        mongo_url = mongod.connection_string
+
+    db_name = f"portfolio_bench_{os.getpid()}"
+    mongo = MongoClient(mongo_url, tz_aware=True)
+    try:
+        data = seed(mongo[db_name], args.concurrency, args.login_users, args.portfolios)
+
+        fake_port, server_port = free_port(), free_port()
+        fake_url = f"http://127.0.0.1:{fake_port}"
+        base_url = f"http://127.0.0.1:{server_port}"
+
+        fake_env = {**os.environ, "FAKE_LATENCY_MS": str(args.latency_ms)}
+        processes.append(start_process(
+            [sys.executable, "-m", "uvicorn", "fake_upstreams:app", "--port", str(fake_port), "--log-level", "warning"],
+            BENCH_DIR, fake_env, logs / "fake_upstreams.log"))
+        await wait_ready(f"{fake_url}/calls", processes[-1])
+
+        processes.append(start_process(
+            [sys.executable, "-m", "uvicorn", "server:app", "--port", str(server_port),
+             "--workers", str(args.workers), "--log-level", "warning"],
+            BACKEND_DIR, server_env(args, mongo_url, db_name, fake_url), logs / "server.log"))
+        await wait_ready(f"{base_url}/health", processes[-1])
+
+        print(f"{args.concurrency} clients, {args.duration}s (+{args.warmup}s warmup), "
+              f"upstream latency {args.latency_ms}ms, mix {args.mix}")
+        run = await run_workload(base_url, data, args)
+        async with httpx.AsyncClient() as http:
+            upstream_calls = (await http.get(f"{fake_url}/calls")).json()
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait(timeout=10)
+        mongo.drop_database(db_name)
+        mongo.close()
+        if mongod:
+            mongod.stop()
+
+    results = {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "commit": git_commit(),
+        "settings": {
+            "concurrency": args.concurrency,
+            "duration": args.duration,
+            "warmup": args.warmup,
+            "workers": args.workers,
+            "latency_ms": args.latency_ms,
+            "mix": args.mix,
+        },
+        "elapsed": run["elapsed"],
+        "routes": run["routes"],
+        "upstream_calls": upstream_calls,
+        "server_stats": run["stats"],
+    }
+    print_table(results["routes"])
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2))
+        print(f"\nResults written to {args.output}")
+
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text())
+        if not compare(results, baseline, args.max_regression):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mongo-url", default=os.environ.get("BENCH_MONGO_URL", "mongodb://127.0.0.1:27017"))
+    parser.add_argument("--inmemory", action="store_true", help="start a throwaway mongod (needs pymongo_inmemory)")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--warmup", type=float, default=5)
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--latency-ms", type=float, default=50, help="fake upstream latency")
+    parser.add_argument("--mix", type=parse_mix, default=DEFAULT_MIX, help="scenario=weight,...")
+    parser.add_argument("--login-users", type=int, default=100)
+    parser.add_argument("--portfolios", type=int, default=500)
+    parser.add_argument("--output", help="write results as JSON")
+    parser.add_argument("--compare", help="baseline JSON from a previous --output")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="allowed p95 increase, e.g. 0.2 = 20%%")
+    parser.add_argument("--log-dir", help="where to keep server and fake upstream logs (default: a temp dir)")
+    sys.exit(asyncio.run(main(parser.parse_args())))
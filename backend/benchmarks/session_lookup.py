@@ -0,0 +1,107 @@
+"""Micro-benchmark: session -> user in one $lookup vs two find_one calls.
+
+Usage: python benchmarks/session_lookup.py [--sessions N] [--iterations N]
+
+Seeds users and sessions into a scratch database (``<DB_NAME>_bench``
+unless --db is given) on MONGO_URL, runs both lookup paths against
+random tokens, prints p50/p99/mean latency, then drops the database.
+Because of that drop, --db must start with ``bench_``/``test_`` or end
+with ``_bench``/``_test``.
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+import uuid
+from datetime import datetime, timezone, timedelta
+from pathlib import Path
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import db_indexes  # noqa: E402
+from sessions import find_session_then_user, find_session_with_user  # noqa: E402
+
+SCRATCH_PREFIXES = ("bench_", "test_")
+SCRATCH_SUFFIXES = ("_bench", "_test")
+
+
+def is_scratch_db(name: str) -> bool:
+    return name.startswith(SCRATCH_PREFIXES) or name.endswith(SCRATCH_SUFFIXES)
+
+
+async def seed(db, count: int):
+    now = datetime.now(timezone.utc)
+    users, sessions = [], []
+    for i in range(count):
+        user_id = f"user_{uuid.uuid4().hex[:12]}"
+        users.append({
+            "user_id": user_id,
+            "email": f"bench{i}@example.com",
+            "name": f"Bench {i}",
+            "subscription_plan": "free",
+            "created_at": now,
+        })
+        sessions.append({
+            "user_id": user_id,
+            "session_token": f"session_{uuid.uuid4().hex}",
+            "expires_at": now + timedelta(days=7),
+            "created_at": now,
+        })
+    await db.users.insert_many(users)
+    await db.user_sessions.insert_many(sessions)
+    return [s["session_token"] for s in sessions]
+
+
+async def measure(lookup, db, tokens, iterations: int):
+    timings = []
+    for _ in range(iterations):
+        token = random.choice(tokens)
+        start = time.perf_counter()
+        found = await lookup(db, token)
+        timings.append((time.perf_counter() - start) * 1000)
+        assert found and found[1], "lookup returned no user"
+    return timings
+
+
+def summarize(name: str, timings):
+    timings = sorted(timings)
+    p50 = timings[len(timings) // 2]
+    p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+    print(f"{name:<14} p50={p50:.3f}ms  p99={p99:.3f}ms  mean={statistics.mean(timings):.3f}ms")
+
+
+async def main(args):
+    client = AsyncIOMotorClient(os.environ["MONGO_URL"], tz_aware=True)
+    db = client[args.db]
+    try:
+        await db_indexes.ensure_indexes(db)
+        tokens = await seed(db, args.sessions)
+        # Warm up connections and caches before timing
+        await measure(find_session_then_user, db, tokens, 100)
+        await measure(find_session_with_user, db, tokens, 100)
+
+        print(f"{args.sessions} sessions, {args.iterations} lookups each")
+        summarize("two queries", await measure(find_session_then_user, db, tokens, args.iterations))
+        summarize("$lookup", await measure(find_session_with_user, db, tokens, args.iterations))
+    finally:
+        await client.drop_database(args.db)
+        client.close()
+
+
+if __name__ == "__main__":
+    load_dotenv(Path(__file__).resolve().parent.parent / ".env")
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=10000)
+    parser.add_argument("--iterations", type=int, default=5000)
+    parser.add_argument("--db", default=f"{os.environ.get('DB_NAME', 'portfolio')}_bench")
+    args = parser.parse_args()
+    if not is_scratch_db(args.db):
+        parser.error(f"refusing to use (and drop) {args.db!r}: not a bench_/test_ scratch database name")
+    asyncio.run(main(args))
@@ -0,0 +1,106 @@
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+_MISSING = object()
+
+
+class TTLCache:
+    """Bounded in-process LRU cache whose entries also expire after a TTL.
+
+    With ``maxbytes`` the cache is also bounded by the total ``sizeof`` of
+    its values; a value larger than the whole budget is not cached.
+
+    Not thread-safe; it is meant to be used from the event loop only.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 1024,
+        ttl: float = 60.0,
+        clock: Callable[[], float] = time.monotonic,
+        maxbytes: Optional[int] = None,
+        sizeof: Callable[[Any], int] = len,
+    ):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.maxbytes = maxbytes
+        self._sizeof = sizeof
+        self._clock = clock
+        self._data: "OrderedDict[Hashable, Tuple[Any, float]]" = OrderedDict()
+        self._sizes: Dict[Hashable, int] = {}
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._data.get(key, _MISSING)
+        if entry is _MISSING:
+            self.misses += 1
+            return default
+
+        value, expires_at = entry
+        if expires_at <= self._clock():
+            self._discard(key)
+            self.misses += 1
+            return default
+
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        ttl = self.ttl if ttl is None else ttl
+        self._discard(key)
+        if ttl <= 0:
+            return
+
+        if self.maxbytes is not None:
+            size = self._sizeof(value)
+            if size > self.maxbytes:
+                return
+            self._sizes[key] = size
+            self.bytes += size
+
+        self._data[key] = (value, self._clock() + ttl)
+        while len(self._data) > self.maxsize or (self.maxbytes is not None and self.bytes > self.maxbytes):
+            self._discard(next(iter(self._data)))
+            self.evictions += 1
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._discard(key)
+        if entry is _MISSING:
+            return default
+        return entry[0]
+
+    def clear(self) -> None:
+        self._data.clear()
+        self._sizes.clear()
+        self.bytes = 0
+
+    def _discard(self, key: Hashable) -> Any:
+        self.bytes -= self._sizes.pop(key, 0)
+        return self._data.pop(key, _MISSING)
+
+    def __contains__(self, key: Hashable) -> bool:
+        entry = self._data.get(key)
+        return entry is not None and entry[1] > self._clock()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        stats = {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+        if self.maxbytes is not None:
+            stats["bytes"] = self.bytes
+            stats["maxbytes"] = self.maxbytes
+        return stats
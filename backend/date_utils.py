@@ -0,0 +1,17 @@
+from datetime import datetime, timezone
+from typing import Any, Optional
+
+
+def as_datetime(value: Any) -> Optional[datetime]:
+    """Read shim for date fields stored either as BSON dates or ISO strings.
+
+    Always returns an aware UTC datetime (or None). Needed until
+    migrate_datetimes.py has rewritten every legacy string.
+    """
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
@@ -0,0 +1,113 @@
+"""Index declarations for the core collections, plus a query-plan self-check.
+
+Run ``python db_indexes.py`` to create the indexes, or
+``python db_indexes.py --check`` to also explain() every hot query.
+"""
+import asyncio
+import logging
+import os
+from typing import Any, Dict, List, Tuple
+
+from pymongo import ASCENDING, DESCENDING, IndexModel
+
+logger = logging.getLogger(__name__)
+
+DB_INDEX_SELF_CHECK = os.environ.get("DB_INDEX_SELF_CHECK", "").lower() in ("1", "true", "yes")
+
+INDEXES: Dict[str, List[IndexModel]] = {
+    "users": [
+        IndexModel([("email", ASCENDING)], name="email_unique", unique=True),
+        IndexModel([("user_id", ASCENDING)], name="user_id_unique", unique=True),
+        # Removed once the account is verified, hence sparse
+        IndexModel([("verification_token", ASCENDING)], name="verification_token_unique", unique=True, sparse=True),
+    ],
+    "user_sessions": [
+        IndexModel([("session_token", ASCENDING)], name="session_token_unique", unique=True),
+        # Also serves the per-user session cap (newest first)
+        IndexModel([("user_id", ASCENDING), ("created_at", DESCENDING)], name="user_id_created_at"),
+        # MongoDB deletes sessions once expires_at (a BSON date) has passed
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+    ],
+    "portfolios": [
+        IndexModel([("portfolio_id", ASCENDING)], name="portfolio_id_unique", unique=True),
+        IndexModel([("user_id", ASCENDING), ("portfolio_id", ASCENDING)], name="user_id_portfolio_id"),
+        IndexModel(
+            [("slug", ASCENDING)],
+            name="published_slug_unique",
+            unique=True,
+            partialFilterExpression={"is_published": True},
+        ),
+    ],
+}
+
+# (name, collection, filter) for every lookup on a request path
+HOT_QUERIES: List[Tuple[str, str, Dict[str, Any]]] = [
+    ("users by email", "users", {"email": "check@example.com"}),
+    ("users by user_id", "users", {"user_id": "user_check"}),
+    ("users by verification_token", "users", {"verification_token": "check"}),
+    ("sessions by token", "user_sessions", {"session_token": "session_check"}),
+    ("sessions by user", "user_sessions", {"user_id": "user_check"}),
+    ("portfolios by user", "portfolios", {"user_id": "user_check"}),
+    ("portfolio by id and owner", "portfolios", {"portfolio_id": "portfolio_check", "user_id": "user_check"}),
+    ("published portfolio by slug", "portfolios", {"slug": "check", "is_published": True}),
+]
+
+
+async def ensure_indexes(db) -> None:
+    """Create the declared indexes. create_indexes is a no-op for existing ones."""
+    for collection, indexes in INDEXES.items():
+        try:
+            await db[collection].create_indexes(indexes)
+        except Exception:
+            # e.g. duplicate emails blocking a unique index; keep serving, the self-check will flag it
+            logger.exception("Failed to create indexes on %s", collection)
+
+
+def _stages(plan: Dict[str, Any]) -> List[str]:
+    stages = [plan.get("stage", "")]
+    for key in ("inputStage", "queryPlan"):
+        if key in plan:
+            stages += _stages(plan[key])
+    for child in plan.get("inputStages", []):
+        stages += _stages(child)
+    return stages
+
+
+async def check_query_plans(db) -> List[str]:
+    """explain() each hot query; returns the names of those doing a COLLSCAN."""
+    failures = []
+    for name, collection, query in HOT_QUERIES:
+        explain = await db[collection].find(query).explain()
+        stages = _stages(explain["queryPlanner"]["winningPlan"])
+        logger.info("Query plan for %s: %s", name, " <- ".join(stages))
+        if "COLLSCAN" in stages:
+            failures.append(name)
+    return failures
+
+
+async def bootstrap(db, self_check: bool = DB_INDEX_SELF_CHECK) -> None:
+    await ensure_indexes(db)
+    if self_check:
+        failures = await check_query_plans(db)
+        if failures:
+            raise RuntimeError(f"Queries falling back to COLLSCAN: {', '.join(failures)}")
+
+
+if __name__ == "__main__":
+    import sys
+    from pathlib import Path
+
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    load_dotenv(Path(__file__).parent / ".env")
+    logging.basicConfig(level=logging.INFO)
+
+    async def main():
+        client = AsyncIOMotorClient(os.environ["MONGO_URL"])
+        try:
+            await bootstrap(client[os.environ["DB_NAME"]], self_check="--check" in sys.argv)
+        finally:
+            client.close()
+
+    asyncio.run(main())
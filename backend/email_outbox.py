@@ -0,0 +1,283 @@
+import asyncio
+import logging
+import os
+import random
+import uuid
+from datetime import datetime, timezone, timedelta
+from typing import Any, Dict, List, Optional
+
+import resend
+
+from metrics import track_call
+from tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+EMAIL_TRANSPORT = os.environ.get("EMAIL_TRANSPORT", "resend")
+EMAIL_OUTBOX_WORKERS = int(os.environ.get("EMAIL_OUTBOX_WORKERS", "2"))
+# Resend accepts at most 100 emails per batch call
+EMAIL_OUTBOX_BATCH_SIZE = int(os.environ.get("EMAIL_OUTBOX_BATCH_SIZE", "50"))
+EMAIL_OUTBOX_MAX_ATTEMPTS = int(os.environ.get("EMAIL_OUTBOX_MAX_ATTEMPTS", "6"))
+EMAIL_OUTBOX_BACKOFF_BASE = float(os.environ.get("EMAIL_OUTBOX_BACKOFF_BASE", "5"))
+EMAIL_OUTBOX_BACKOFF_MAX = float(os.environ.get("EMAIL_OUTBOX_BACKOFF_MAX", "900"))
+EMAIL_OUTBOX_LEASE_SECONDS = int(os.environ.get("EMAIL_OUTBOX_LEASE_SECONDS", "120"))
+EMAIL_OUTBOX_RETENTION_SECONDS = int(os.environ.get("EMAIL_OUTBOX_RETENTION_SECONDS", str(7 * 24 * 60 * 60)))
+EMAIL_OUTBOX_POLL_INTERVAL = float(os.environ.get("EMAIL_OUTBOX_POLL_INTERVAL", "2"))
+
+
+class ResendTransport:
+    """Sends through Resend, using the batch endpoint for more than one email."""
+
+    def __init__(self, api_key: Optional[str] = None):
+        self.api_key = api_key or os.environ.get("RESEND_API_KEY")
+
+    async def send(self, messages: List[Dict[str, Any]]) -> None:
+        if not self.api_key:
+            raise RuntimeError("RESEND_API_KEY not set")
+        resend.api_key = self.api_key
+        if len(messages) == 1:
+            await asyncio.to_thread(resend.Emails.send, messages[0])
+        else:
+            await asyncio.to_thread(resend.Batch.send, messages)
+
+
+class StubTransport:
+    """Keeps sent emails in memory instead of delivering them (tests, local dev)."""
+
+    def __init__(self):
+        self.sent: List[Dict[str, Any]] = []
+
+    async def send(self, messages: List[Dict[str, Any]]) -> None:
+        for message in messages:
+            logger.info("Stub email to %s: %s", message.get("to"), message.get("subject"))
+        self.sent.extend(messages)
+
+
+def create_transport():
+    if EMAIL_TRANSPORT == "stub":
+        return StubTransport()
+    return ResendTransport()
+
+
+class EmailOutbox:
+    """MongoDB-backed outbox for transactional email.
+
+    Request handlers ``enqueue`` and return; workers claim up to
+    ``batch_size`` due emails under a lease and hand them to the transport
+    in one call. If the batch call fails, each email is sent on its own so
+    one bad address doesn't hold back the rest. Writes are fenced by the
+    claim, so a worker whose lease ran out can't undo the new owner's work. Failed emails are retried
+    with exponential backoff, and emails that fail ``max_attempts`` times
+    are kept with status ``dead`` for inspection. Sent emails expire after
+    ``retention`` seconds.
+    """
+
+    def __init__(
+        self,
+        collection,
+        transport,
+        workers: int = EMAIL_OUTBOX_WORKERS,
+        batch_size: int = EMAIL_OUTBOX_BATCH_SIZE,
+        max_attempts: int = EMAIL_OUTBOX_MAX_ATTEMPTS,
+        backoff_base: float = EMAIL_OUTBOX_BACKOFF_BASE,
+        backoff_max: float = EMAIL_OUTBOX_BACKOFF_MAX,
+        lease_seconds: int = EMAIL_OUTBOX_LEASE_SECONDS,
+        retention: int = EMAIL_OUTBOX_RETENTION_SECONDS,
+        poll_interval: float = EMAIL_OUTBOX_POLL_INTERVAL,
+    ):
+        self.collection = collection
+        self.transport = transport
+        self.workers = workers
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.lease_seconds = lease_seconds
+        self.retention = retention
+        self.poll_interval = poll_interval
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup = asyncio.Event()
+        self.sent = 0
+        self.batches = 0
+        self.failures = 0
+        self.dead_lettered = 0
+
+    async def ensure_indexes(self) -> None:
+        await self.collection.create_index("email_id", unique=True)
+        await self.collection.create_index([("status", 1), ("next_attempt_at", 1)])
+        await self.collection.create_index("claim_id")
+        await self.collection.create_index("expires_at", expireAfterSeconds=0)
+
+    async def enqueue(self, message: Dict[str, Any], kind: str = "generic") -> str:
+        now = datetime.now(timezone.utc)
+        email_id = f"email_{uuid.uuid4().hex[:16]}"
+        await self.collection.insert_one({
+            "email_id": email_id,
+            "kind": kind,
+            "status": "queued",
+            "message": message,
+            "attempts": 0,
+            "next_attempt_at": now,
+            "created_at": now,
+            "updated_at": now,
+            "traceparent": tracer.current_traceparent(),
+        })
+        self._wakeup.set()
+        return email_id
+
+    def start(self) -> None:
+        for i in range(self.workers):
+            self._tasks.append(asyncio.create_task(self._run_worker(), name=f"email-outbox-worker-{i}"))
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "sent": self.sent,
+            "batches": self.batches,
+            "failures": self.failures,
+            "dead_lettered": self.dead_lettered,
+        }
+
+    def _backoff(self, attempts: int) -> float:
+        delay = min(self.backoff_max, self.backoff_base * 2 ** (attempts - 1))
+        return delay * random.uniform(0.5, 1.0)
+
+    async def _claim_batch(self) -> List[Dict[str, Any]]:
+        now = datetime.now(timezone.utc)
+        due = {"$or": [
+            {"status": "queued", "next_attempt_at": {"$lte": now}},
+            {"status": "sending", "lease_expires_at": {"$lt": now}},
+        ]}
+        candidates = await self.collection.find(due, {"_id": 1}) \
+            .sort("next_attempt_at", 1).limit(self.batch_size).to_list(self.batch_size)
+        if not candidates:
+            return []
+
+        # Re-check the filter in the update so two workers never claim the same email
+        claim_id = uuid.uuid4().hex
+        await self.collection.update_many(
+            {"_id": {"$in": [doc["_id"] for doc in candidates]}, **due},
+            {
+                "$set": {
+                    "status": "sending",
+                    "claim_id": claim_id,
+                    "updated_at": now,
+                    "lease_expires_at": now + timedelta(seconds=self.lease_seconds),
+                },
+                "$inc": {"attempts": 1},
+            },
+        )
+        return await self.collection.find({"claim_id": claim_id}).to_list(self.batch_size)
+
+    async def _send_batch(self, emails: List[Dict[str, Any]]) -> None:
+        traceparents = [email["traceparent"] for email in emails if email.get("traceparent")]
+        with tracer.linked_span("email outbox", traceparents, {"email.count": len(emails)}):
+            try:
+                with track_call("email", "send_batch"):
+                    await self.transport.send([email["message"] for email in emails])
+            except Exception as e:
+                if len(emails) == 1:
+                    logger.exception("Failed to send email %s", emails[0]["email_id"])
+                    self.failures += 1
+                    await self._reschedule(emails, str(e))
+                    return
+                # One bad address fails the whole batch call; find it by sending singly
+                logger.warning("Batch of %s emails failed (%s), sending one at a time", len(emails), e)
+                await self._send_each(emails)
+                return
+
+            await self._mark_sent(emails)
+            self.batches += 1
+
+    async def _send_each(self, emails: List[Dict[str, Any]]) -> None:
+        for email in emails:
+            # Sending singly can outlast the lease; renew it, and skip emails another worker has claimed since
+            if not await self._renew_lease(email):
+                logger.warning("Email %s was reclaimed by another worker; not sending it again", email["email_id"])
+                continue
+            try:
+                with track_call("email", "send"):
+                    await self.transport.send([email["message"]])
+            except Exception as e:
+                logger.exception("Failed to send email %s", email["email_id"])
+                self.failures += 1
+                await self._reschedule([email], str(e))
+            else:
+                await self._mark_sent([email])
+
+    def _claimed(self, emails: List[Dict[str, Any]]) -> Dict[str, Any]:
+        # Emails claimed together share a claim_id; a worker whose lease expired no longer matches
+        return {"_id": {"$in": [email["_id"] for email in emails]}, "claim_id": emails[0]["claim_id"]}
+
+    async def _renew_lease(self, email: Dict[str, Any]) -> bool:
+        now = datetime.now(timezone.utc)
+        result = await self.collection.update_one(
+            self._claimed([email]),
+            {"$set": {"lease_expires_at": now + timedelta(seconds=self.lease_seconds), "updated_at": now}},
+        )
+        return result.matched_count > 0
+
+    async def _mark_sent(self, emails: List[Dict[str, Any]]) -> None:
+        now = datetime.now(timezone.utc)
+        result = await self.collection.update_many(
+            self._claimed(emails),
+            {
+                "$set": {
+                    "status": "sent",
+                    "sent_at": now,
+                    "updated_at": now,
+                    "expires_at": now + timedelta(seconds=self.retention),
+                },
+                "$unset": {"lease_expires_at": "", "claim_id": "", "last_error": ""},
+            },
+        )
+        if result.matched_count < len(emails):
+            logger.warning("%s sent emails were reclaimed by another worker", len(emails) - result.matched_count)
+        self.sent += len(emails)
+
+    async def _reschedule(self, emails: List[Dict[str, Any]], error: str) -> None:
+        now = datetime.now(timezone.utc)
+        for email in emails:
+            dead = email["attempts"] >= self.max_attempts
+            if dead:
+                update = {"status": "dead", "updated_at": now, "last_error": error}
+            else:
+                update = {
+                    "status": "queued",
+                    "updated_at": now,
+                    "last_error": error,
+                    "next_attempt_at": now + timedelta(seconds=self._backoff(email["attempts"])),
+                }
+            result = await self.collection.update_one(
+                self._claimed([email]),
+                {"$set": update, "$unset": {"lease_expires_at": "", "claim_id": ""}},
+            )
+            if not result.matched_count:
+                logger.warning("Email %s was reclaimed by another worker; leaving it to them", email["email_id"])
+            elif dead:
+                self.dead_lettered += 1
+                logger.error("Email %s dead-lettered after %s attempts", email["email_id"], email["attempts"])
+
+    async def _run_worker(self) -> None:
+        while True:
+            try:
+                emails = await self._claim_batch()
+                if emails:
+                    await self._send_batch(emails)
+                    continue
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # Leased emails are picked up again once the lease expires
+                logger.exception("Email outbox worker failed")
+
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
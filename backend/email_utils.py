@@ -1,16 +1,10 @@
-import os
-import resend
-from dotenv import load_dotenv
-load_dotenv()
+# Message builders; delivery goes through email_outbox
 
-resend.api_key = os.environ.get("RESEND_API_KEY")
+EMAIL_FROM = "PortfolioAI <no-reply@portfolioai.site>"
 
-async def send_verification_email(to_email: str, verify_link: str):
-    if not resend.api_key:
-        raise RuntimeError("RESEND_API_KEY not set")
-
-    resend.Emails.send({
-        "from": "PortfolioAI <no-reply@portfolioai.site>",  
+def verification_email(to_email: str, verify_link: str):
+    return {
+        "from": EMAIL_FROM,
         "to": [to_email],
         "subject": "Verify your email",
         "html": f"""
@@ -26,19 +20,16 @@ async def send_verification_email(to_email: str, verify_link: str):
           <p>If you didn’t create this account, you can ignore this email.</p>
         </div>
         """
-    })
+    }
 
-async def send_contact_email(
+def contact_email(
     to_email: str,
     sender_name: str,
     sender_email: str,
     message: str
 ):
-    if not resend.api_key:
-        raise RuntimeError("RESEND_API_KEY not set")
-
-    resend.Emails.send({
-        "from": "PortfolioAI <no-reply@portfolioai.site>",
+    return {
+        "from": EMAIL_FROM,
         "to": [to_email],
         "subject": f"New message from {sender_name}",
         "html": f"""
@@ -58,4 +49,4 @@ async def send_contact_email(
           <p>You received this message from your public portfolio.</p>
         </div>
         """
-    })    
\ No newline at end of file
+    }
@@ -0,0 +1,261 @@
+import asyncio
+import json
+import math
+import os
+import re
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from cache_utils import TTLCache
+
+GITHUB_API_URL = os.environ.get("GITHUB_API_URL", "https://api.github.com").rstrip("/")
+GITHUB_CACHE_TTL = int(os.environ.get("GITHUB_CACHE_TTL", "600"))
+GITHUB_ETAG_CACHE_SIZE = int(os.environ.get("GITHUB_ETAG_CACHE_SIZE", "20000"))
+GITHUB_ETAG_CACHE_BYTES = int(os.environ.get("GITHUB_ETAG_CACHE_BYTES", str(32 * 1024 * 1024)))
+GITHUB_MAX_PAGES = int(os.environ.get("GITHUB_MAX_PAGES", "10"))
+GITHUB_MAX_LANGUAGE_REPOS = int(os.environ.get("GITHUB_MAX_LANGUAGE_REPOS", "30"))
+GITHUB_LANGUAGE_CONCURRENCY = int(os.environ.get("GITHUB_LANGUAGE_CONCURRENCY", "8"))
+# Share of the rate-limit window (X-RateLimit-Limit) kept in reserve
+GITHUB_RATE_LIMIT_RESERVE = float(os.environ.get("GITHUB_RATE_LIMIT_RESERVE", "0.1"))
+
+# The only repo fields _import reads; everything else is dropped before caching
+REPO_FIELDS = ("name", "full_name", "description", "language", "html_url", "fork")
+
+USERNAME_RE = re.compile(r"^[A-Za-z0-9](?:[A-Za-z0-9-]{0,38})$")
+LAST_PAGE_RE = re.compile(r'[?&]page=(\d+)[^>]*>;\s*rel="last"')
+
+
+def _slim_repos(repos: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return [{field: repo.get(field) for field in REPO_FIELDS} for repo in repos]
+
+
+def _entry_size(entry: Tuple[str, Any, str]) -> int:
+    etag, data, link = entry
+    return len(etag) + len(json.dumps(data)) + len(link)
+
+
+class GitHubError(Exception):
+    pass
+
+
+class GitHubRateLimited(GitHubError):
+    def __init__(self, retry_after: int):
+        super().__init__("GitHub rate limit nearly exhausted, try again later")
+        self.retry_after = retry_after
+
+
+class GitHubImporter:
+    """Imports a user's public repos as portfolio projects.
+
+    - Repo lists are cached per username for ``cache_ttl`` seconds.
+    - Every GitHub response is kept with its ETag and revalidated with
+      If-None-Match; 304s don't count against the (authenticated) quota.
+      Only the repo fields used here are kept, and the cache is bounded
+      by (approximate) bytes as well as entries.
+    - All pages of the repo list are fetched concurrently once the first
+      page reveals how many there are.
+    - Language breakdowns are fetched with bounded concurrency.
+    - The remaining rate-limit budget is tracked from response headers;
+      once it falls to ``reserve`` (a fraction of the window's limit, so
+      60/hour unauthenticated and 5000/hour with a token both work),
+      language lookups are skipped and new imports are refused until the
+      window resets.
+    """
+
+    def __init__(
+        self,
+        http,
+        token: Optional[str] = None,
+        api_url: str = GITHUB_API_URL,
+        cache_ttl: int = GITHUB_CACHE_TTL,
+        max_pages: int = GITHUB_MAX_PAGES,
+        max_language_repos: int = GITHUB_MAX_LANGUAGE_REPOS,
+        language_concurrency: int = GITHUB_LANGUAGE_CONCURRENCY,
+        reserve: float = GITHUB_RATE_LIMIT_RESERVE,
+        etag_cache_bytes: int = GITHUB_ETAG_CACHE_BYTES,
+    ):
+        self.http = http
+        self.token = token
+        self.api_url = api_url
+        self.max_pages = max_pages
+        self.max_language_repos = max_language_repos
+        self.language_concurrency = language_concurrency
+        self.reserve = reserve
+        self._projects = TTLCache(maxsize=1024, ttl=cache_ttl)
+        self._etags = TTLCache(
+            maxsize=GITHUB_ETAG_CACHE_SIZE,
+            ttl=7 * 24 * 60 * 60,
+            maxbytes=etag_cache_bytes,
+            sizeof=_entry_size,
+        )
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.rate_limit_limit: Optional[int] = None
+        self.rate_limit_remaining: Optional[int] = None
+        self.rate_limit_reset: Optional[int] = None
+        self.requests = 0
+        self.not_modified = 0
+        self.shed = 0
+
+    def _headers(self) -> Dict[str, str]:
+        headers = {
+            "Accept": "application/vnd.github+json",
+            "User-Agent": "PortfolioAI",
+        }
+        if self.token:
+            headers["Authorization"] = f"Bearer {self.token}"
+        return headers
+
+    def _budget_low(self) -> bool:
+        if self.rate_limit_remaining is None or self.rate_limit_reset is None:
+            return False
+        if self.rate_limit_reset <= time.time():
+            return False
+        return self.rate_limit_remaining <= self._reserve_calls()
+
+    def _reserve_calls(self) -> int:
+        if not self.rate_limit_limit:
+            return 0
+        return max(math.ceil(self.rate_limit_limit * self.reserve), 1)
+
+    def _retry_after(self) -> int:
+        return max(int((self.rate_limit_reset or 0) - time.time()), 1)
+
+    async def _get_json(
+        self,
+        path: str,
+        params: Optional[Dict[str, Any]] = None,
+        parse: Callable[[Any], Any] = lambda data: data,
+    ) -> Tuple[Any, str]:
+        """GET a GitHub API path, returning (parse(json), Link header)."""
+        url = f"{self.api_url}{path}"
+        key = (url, tuple(sorted((params or {}).items())))
+        headers = self._headers()
+
+        cached = self._etags.get(key)
+        if cached:
+            headers["If-None-Match"] = cached[0]
+
+        self.requests += 1
+        resp = await self.http.get(url, params=params, headers=headers)
+
+        limit = resp.headers.get("X-RateLimit-Limit")
+        remaining = resp.headers.get("X-RateLimit-Remaining")
+        reset = resp.headers.get("X-RateLimit-Reset")
+        if remaining is not None and reset is not None:
+            self.rate_limit_remaining = int(remaining)
+            self.rate_limit_reset = int(reset)
+            if limit is not None:
+                self.rate_limit_limit = int(limit)
+
+        if resp.status_code == 304 and cached:
+            self.not_modified += 1
+            return cached[1], cached[2]
+
+        if resp.status_code in (403, 429) and self.rate_limit_remaining == 0:
+            raise GitHubRateLimited(self._retry_after())
+
+        resp.raise_for_status()
+        data = parse(resp.json())
+        link = resp.headers.get("Link", "")
+        if resp.headers.get("ETag"):
+            self._etags.set(key, (resp.headers["ETag"], data, link))
+        return data, link
+
+    async def _fetch_repos(self, username: str) -> List[Dict[str, Any]]:
+        path = f"/users/{username}/repos"
+        params = {"sort": "updated", "per_page": 100}
+
+        first, link = await self._get_json(path, {**params, "page": 1}, parse=_slim_repos)
+        match = LAST_PAGE_RE.search(link)
+        last_page = min(int(match.group(1)), self.max_pages) if match else 1
+
+        rest = await asyncio.gather(*(
+            self._get_json(path, {**params, "page": page}, parse=_slim_repos) for page in range(2, last_page + 1)
+        ))
+        repos = list(first)
+        for page, _ in rest:
+            repos.extend(page)
+        return repos
+
+    async def _fetch_languages(self, repos: List[Dict[str, Any]]) -> Dict[str, List[str]]:
+        semaphore = asyncio.Semaphore(self.language_concurrency)
+
+        async def fetch(repo):
+            async with semaphore:
+                if self._budget_low():
+                    self.shed += 1
+                    return repo["full_name"], None
+                try:
+                    languages, _ = await self._get_json(f"/repos/{repo['full_name']}/languages")
+                except Exception:
+                    return repo["full_name"], None
+                # Largest language (by bytes) first
+                return repo["full_name"], sorted(languages, key=languages.get, reverse=True)
+
+        results = await asyncio.gather(*(fetch(repo) for repo in repos[:self.max_language_repos]))
+        return {name: languages for name, languages in results if languages is not None}
+
+    async def _import(self, username: str) -> List[Dict[str, Any]]:
+        repos = [repo for repo in await self._fetch_repos(username) if not repo.get("fork")]  # Skip forked repos
+        languages = await self._fetch_languages(repos)
+
+        projects = []
+        for repo in repos:
+            tech_stack = languages.get(repo.get("full_name"))
+            if tech_stack is None:
+                tech_stack = [repo.get("language")] if repo.get("language") else []
+            projects.append({
+                "title": repo["name"],
+                "description": repo["description"] or "No description",
+                "tech_stack": tech_stack,
+                "link": repo["html_url"],
+                "github_link": repo["html_url"],
+            })
+        return projects
+
+    async def import_projects(self, username: str) -> List[Dict[str, Any]]:
+        if not USERNAME_RE.match(username):
+            raise GitHubError("Invalid GitHub username")
+
+        key = username.lower()
+        projects = self._projects.get(key)
+        if projects is not None:
+            return projects
+
+        if self._budget_low():
+            self.shed += 1
+            raise GitHubRateLimited(self._retry_after())
+
+        # Concurrent imports of the same user share one fetch
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            return await asyncio.shield(inflight)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            projects = await self._import(username)
+            self._projects.set(key, projects)
+            future.set_result(projects)
+            return projects
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark retrieved so an unawaited future doesn't log a warning
+            future.exception()
+            raise
+        finally:
+            del self._inflight[key]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "cache": self._projects.stats(),
+            "requests": self.requests,
+            "not_modified": self.not_modified,
+            "shed": self.shed,
+            "rate_limit_limit": self.rate_limit_limit,
+            "rate_limit_remaining": self.rate_limit_remaining,
+            "rate_limit_reset": self.rate_limit_reset,
+        }
@@ -0,0 +1,127 @@
+import asyncio
+import os
+import time
+from typing import Any, Dict, Optional
+from urllib.parse import urlsplit
+
+import httpx
+
+from metrics import external_call_duration
+from tracing import CLIENT, tracer
+
+HTTP_TIMEOUT = float(os.environ.get("HTTP_TIMEOUT", "10"))
+HTTP_CONNECT_TIMEOUT = float(os.environ.get("HTTP_CONNECT_TIMEOUT", "5"))
+HTTP_RETRIES = int(os.environ.get("HTTP_RETRIES", "2"))
+HTTP_MAX_CONNECTIONS = int(os.environ.get("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE = int(os.environ.get("HTTP_MAX_KEEPALIVE", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.environ.get("HTTP_KEEPALIVE_EXPIRY", "30"))
+# Needs the h2 package (httpx[http2] in requirements.txt)
+HTTP2 = os.environ.get("HTTP2", "true").lower() in ("1", "true", "yes")
+
+# Upstream responses worth retrying for idempotent requests
+RETRY_STATUSES = {502, 503, 504}
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+
+class OutboundHTTP:
+    """Application-scoped httpx client for calls to Google, GitHub, etc.
+
+    httpx keeps a separate keep-alive pool per origin, so one client gives
+    per-host pooling, and HTTP/2 is negotiated with upstreams that offer
+    it (multiplexing requests over one connection). Connection failures are retried by the transport;
+    idempotent requests are also retried on 502/503/504 and timeouts.
+    Latency is recorded per upstream host in ``external_call_duration``.
+    """
+
+    def __init__(
+        self,
+        timeout: float = HTTP_TIMEOUT,
+        connect_timeout: float = HTTP_CONNECT_TIMEOUT,
+        retries: int = HTTP_RETRIES,
+        max_connections: int = HTTP_MAX_CONNECTIONS,
+        max_keepalive: int = HTTP_MAX_KEEPALIVE,
+        keepalive_expiry: float = HTTP_KEEPALIVE_EXPIRY,
+        http2: bool = HTTP2,
+    ):
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self.retries = retries
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.http2 = http2
+        self._client: Optional[httpx.AsyncClient] = None
+        self.requests: Dict[str, int] = {}
+        self.errors: Dict[str, int] = {}
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                http2=self.http2,
+                # With a custom transport, the transport's flag is the one that takes effect
+                transport=httpx.AsyncHTTPTransport(retries=self.retries, limits=self.limits, http2=self.http2),
+            )
+        return self._client
+
+    async def start(self) -> None:
+        self.client
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def request(self, method: str, url: str, **kwargs: Any) -> httpx.Response:
+        upstream = urlsplit(url).hostname or "unknown"
+        attempts = 1 + (self.retries if method.upper() in IDEMPOTENT_METHODS else 0)
+
+        for attempt in range(attempts):
+            started = time.perf_counter()
+            try:
+                with tracer.span(f"HTTP {method.upper()}", CLIENT, {
+                    "http.method": method.upper(), "server.address": upstream, "http.url": url.split("?", 1)[0],
+                }) as span:
+                    response = await self.client.request(method, url, **kwargs)
+                    if span:
+                        span.set_attribute("http.status_code", response.status_code)
+            except httpx.TimeoutException:
+                self._record(upstream, time.perf_counter() - started, error=True)
+                if attempt + 1 >= attempts:
+                    raise
+            except httpx.HTTPError:
+                self._record(upstream, time.perf_counter() - started, error=True)
+                raise
+            else:
+                self._record(upstream, time.perf_counter() - started)
+                if response.status_code not in RETRY_STATUSES or attempt + 1 >= attempts:
+                    return response
+                await response.aclose()
+
+            await asyncio.sleep(0.1 * 2 ** attempt)
+
+    async def get(self, url: str, **kwargs: Any) -> httpx.Response:
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url: str, **kwargs: Any) -> httpx.Response:
+        return await self.request("POST", url, **kwargs)
+
+    def _record(self, upstream: str, seconds: float, error: bool = False) -> None:
+        self.requests[upstream] = self.requests.get(upstream, 0) + 1
+        external_call_duration.observe(seconds, "http", upstream, "error" if error else "ok")
+        if error:
+            self.errors[upstream] = self.errors.get(upstream, 0) + 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "http2": self.http2,
+            "upstreams": {
+                upstream: {"requests": requests, "errors": self.errors.get(upstream, 0)}
+                for upstream, requests in self.requests.items()
+            },
+        }
+
+
+outbound_http = OutboundHTTP()
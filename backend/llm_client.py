@@ -0,0 +1,85 @@
+import asyncio
+import os
+from typing import AsyncIterator, Dict, List, Optional
+
+import httpx
+from openai import AsyncOpenAI
+
+from metrics import track_call
+
+OPENROUTER_API_KEY = os.environ.get("OPENROUTER_API_KEY")
+OPENROUTER_MODEL = os.environ.get("OPENROUTER_MODEL", "openai/gpt-4o-mini")
+OPENROUTER_BASE_URL = os.environ.get("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1")
+
+LLM_TIMEOUT = float(os.environ.get("LLM_TIMEOUT", "60"))
+LLM_MAX_CONCURRENCY = int(os.environ.get("LLM_MAX_CONCURRENCY", "8"))
+LLM_MAX_CONNECTIONS = int(os.environ.get("LLM_MAX_CONNECTIONS", "20"))
+
+
+class LLMClient:
+    """Async chat-completion client with a shared connection pool.
+
+    At most ``max_concurrency`` completions (streamed or not) are in flight;
+    further callers wait for a slot. Every call carries its own timeout.
+    """
+
+    def __init__(
+        self,
+        api_key: Optional[str] = OPENROUTER_API_KEY,
+        base_url: str = OPENROUTER_BASE_URL,
+        model: str = OPENROUTER_MODEL,
+        timeout: float = LLM_TIMEOUT,
+        max_concurrency: int = LLM_MAX_CONCURRENCY,
+        max_connections: int = LLM_MAX_CONNECTIONS,
+    ):
+        self.model = model
+        self.timeout = timeout
+        self._http = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            timeout=httpx.Timeout(timeout, connect=10.0),
+        )
+        self._client = AsyncOpenAI(api_key=api_key, base_url=base_url, http_client=self._http, max_retries=1)
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def complete(
+        self,
+        messages: List[Dict[str, str]],
+        temperature: float,
+        timeout: Optional[float] = None,
+    ) -> str:
+        async with self._semaphore:
+            with track_call("openrouter", "complete"):
+                completion = await self._client.chat.completions.create(
+                    model=self.model,
+                    messages=messages,
+                    temperature=temperature,
+                    timeout=timeout or self.timeout,
+                )
+        return completion.choices[0].message.content
+
+    async def stream(
+        self,
+        messages: List[Dict[str, str]],
+        temperature: float,
+        timeout: Optional[float] = None,
+    ) -> AsyncIterator[str]:
+        async with self._semaphore:
+            with track_call("openrouter", "stream"):
+                response = await self._client.chat.completions.create(
+                    model=self.model,
+                    messages=messages,
+                    temperature=temperature,
+                    timeout=timeout or self.timeout,
+                    stream=True,
+                )
+                async with response:
+                    async for chunk in response:
+                        if chunk.choices and chunk.choices[0].delta.content:
+                            yield chunk.choices[0].delta.content
+
+    async def aclose(self) -> None:
+        await self._client.close()
+        await self._http.aclose()
+
+
+llm_client = LLMClient()
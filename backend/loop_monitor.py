@@ -0,0 +1,159 @@
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from metrics import REGISTRY, Counter, Histogram, active_routes
+
+logger = logging.getLogger(__name__)
+
+LOOP_MONITOR = os.environ.get("LOOP_MONITOR", "").lower() in ("1", "true", "yes")
+LOOP_LAG_INTERVAL = float(os.environ.get("LOOP_LAG_INTERVAL", "0.05"))
+LOOP_STALL_THRESHOLD = float(os.environ.get("LOOP_STALL_THRESHOLD", "0.1"))
+LOOP_STALL_RECENT = int(os.environ.get("LOOP_STALL_RECENT", "50"))
+LOOP_STALL_STACK_DEPTH = int(os.environ.get("LOOP_STALL_STACK_DEPTH", "25"))
+
+LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+event_loop_lag = REGISTRY.register(Histogram(
+    "event_loop_lag_seconds", "How late the event loop heartbeat ran.", buckets=LAG_BUCKETS))
+event_loop_stalls = REGISTRY.register(Counter(
+    "event_loop_stalls_total", "Event loop stalls longer than the threshold.", ("route",)))
+
+
+class LoopMonitor:
+    """Measures event-loop lag and captures the stack of long stalls.
+
+    A heartbeat task wakes every ``interval`` and records how late it ran.
+    A watchdog thread watches the heartbeat: once it is ``threshold``
+    seconds overdue the loop is blocked, so the watchdog snapshots the loop
+    thread's stack and the route (or named background task) that is
+    running. The stall's duration is filled in when the heartbeat resumes.
+    """
+
+    def __init__(
+        self,
+        interval: float = LOOP_LAG_INTERVAL,
+        threshold: float = LOOP_STALL_THRESHOLD,
+        max_recent: int = LOOP_STALL_RECENT,
+        stack_depth: int = LOOP_STALL_STACK_DEPTH,
+    ):
+        self.interval = interval
+        self.threshold = threshold
+        self.stack_depth = stack_depth
+        self._lock = threading.Lock()
+        self._beat = 0.0
+        self._pending: Optional[Dict[str, Any]] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+        self.max_lag = 0.0
+        self.stalls = 0
+        self.groups: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self.recent: Deque[Dict[str, Any]] = deque(maxlen=max_recent)
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    def start(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self._beat = time.monotonic()
+        self._stopped.clear()
+        self._task = asyncio.create_task(self._heartbeat(), name="loop-monitor")
+        self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._thread.start()
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        self._stopped.set()
+        if self._thread:
+            self._thread.join(timeout=1)
+            self._thread = None
+
+    async def _heartbeat(self) -> None:
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag = max(0.0, now - expected)
+            event_loop_lag.observe(lag)
+            self.max_lag = max(self.max_lag, lag)
+            with self._lock:
+                self._beat = now
+                stall, self._pending = self._pending, None
+            if stall:
+                self._record(stall, lag)
+
+    def _watch(self) -> None:
+        while not self._stopped.wait(self.threshold / 4):
+            with self._lock:
+                overdue = time.monotonic() - self._beat - self.interval
+                if overdue >= self.threshold and self._pending is None:
+                    self._pending = self._capture()
+
+    def _capture(self) -> Dict[str, Any]:
+        frame = sys._current_frames().get(self._loop_thread)
+        stack = traceback.extract_stack(frame, limit=self.stack_depth) if frame else []
+        # Read from another thread: fine for a diagnostic, the loop is stuck anyway
+        task = asyncio.current_task(self._loop)
+        if task is None:
+            route = "loop callback"
+        else:
+            route = active_routes.get(task) or f"task {task.get_name()}"
+        return {
+            "route": route,
+            "stack": [f"{fs.filename}:{fs.lineno} in {fs.name}" for fs in stack],
+            "at": datetime.now(timezone.utc).isoformat(),
+        }
+
+    def _record(self, stall: Dict[str, Any], duration: float) -> None:
+        stall["duration_ms"] = round(duration * 1000, 1)
+        self.stalls += 1
+        self.recent.append(stall)
+        event_loop_stalls.inc(stall["route"])
+
+        frame = stall["stack"][-1] if stall["stack"] else ""
+        group = self.groups.get((stall["route"], frame))
+        if group is None:
+            group = self.groups[(stall["route"], frame)] = {
+                "route": stall["route"], "frame": frame, "count": 0, "total_ms": 0.0, "max_ms": 0.0,
+            }
+        group["count"] += 1
+        group["total_ms"] = round(group["total_ms"] + stall["duration_ms"], 1)
+        group["max_ms"] = max(group["max_ms"], stall["duration_ms"])
+        group["last_at"] = stall["at"]
+        group["stack"] = stall["stack"]
+        logger.warning("Event loop blocked for %.0f ms in %s at %s", stall["duration_ms"], stall["route"], frame)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self.running,
+            "max_lag_ms": round(self.max_lag * 1000, 1),
+            "stalls": self.stalls,
+        }
+
+    def report(self) -> Dict[str, Any]:
+        groups: List[Dict[str, Any]] = sorted(self.groups.values(), key=lambda g: g["total_ms"], reverse=True)
+        return {
+            **self.stats(),
+            "threshold_ms": self.threshold * 1000,
+            "blocked_now": self._pending,
+            "by_route": groups,
+            "recent": list(self.recent),
+        }
+
+
+loop_monitor = LoopMonitor()
@@ -0,0 +1,264 @@
+"""In-process metrics with Prometheus text exposition.
+
+Counters, gauges and histograms keyed by label values, cheap enough to
+stay on in production (a dict lookup and a lock per observation). Served
+by the /metrics route; see ``render``.
+"""
+import asyncio
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Sequence, Tuple
+
+from pymongo import monitoring
+from starlette.routing import Match
+
+from tracing import CLIENT, tracer
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: LabelValues, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    type = ""
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        # pymongo listeners call in from driver threads
+        self._lock = threading.Lock()
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"] + self._samples()
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        super().__init__(name, help, labels)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_labels(self.label_names, labels)} {value}" for labels, value in items]
+
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def dec(self, *labels: str, amount: float = 1) -> None:
+        self.inc(*labels, amount=-amount)
+
+    def set(self, *labels: str, value: float) -> None:
+        with self._lock:
+            self._values[labels] = value
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+        # label values -> [per-bucket counts..., +Inf count, sum]
+        self._values: Dict[LabelValues, List[float]] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(labels)
+            if series is None:
+                series = self._values[labels] = [0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = [(labels, list(series)) for labels, series in self._values.items()]
+        lines = []
+        for labels, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{bound!r}"'
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, labels)} {series[-1]}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, labels)} {cumulative}")
+        return lines
+
+
+def _flatten(stats: Dict[str, Any], prefix: str = "") -> Iterator[Tuple[str, float]]:
+    for key, value in stats.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            yield from _flatten(value, f"{name}.")
+        elif isinstance(value, bool):
+            yield name, int(value)
+        elif isinstance(value, (int, float)):
+            yield name, value
+
+
+class StatsGauge(_Metric):
+    """Numeric fields of components' ``stats()`` dicts, read at scrape time.
+
+    Nested keys are joined with dots, e.g. ``stat="upstreams.api.github.com.errors"``.
+    """
+    type = "gauge"
+
+    def __init__(self, name: str, help: str):
+        super().__init__(name, help, ("component", "stat"))
+        self._sources: Dict[str, Callable[[], Dict[str, Any]]] = {}
+
+    def add(self, component: str, stats: Callable[[], Dict[str, Any]]) -> None:
+        self._sources[component] = stats
+
+    def _samples(self) -> List[str]:
+        return [
+            f"{self.name}{_labels(self.label_names, (component, stat))} {value}"
+            for component, stats in self._sources.items()
+            for stat, value in _flatten(stats())
+        ]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines += metric.render()
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+http_requests = REGISTRY.register(Counter(
+    "http_requests_total", "HTTP requests handled.", ("method", "route", "status")))
+http_request_duration = REGISTRY.register(Histogram(
+    "http_request_duration_seconds", "Time to the end of the HTTP response.", ("method", "route")))
+http_requests_in_flight = REGISTRY.register(Gauge(
+    "http_requests_in_flight", "HTTP requests currently being handled.", ("method", "route")))
+mongodb_command_duration = REGISTRY.register(Histogram(
+    "mongodb_command_duration_seconds", "MongoDB command round trips.", ("command", "collection")))
+mongodb_command_failures = REGISTRY.register(Counter(
+    "mongodb_command_failures_total", "MongoDB commands that failed.", ("command", "collection")))
+external_call_duration = REGISTRY.register(Histogram(
+    "external_call_duration_seconds", "Calls to third-party services.", ("service", "operation", "outcome")))
+component_stats = REGISTRY.register(StatsGauge(
+    "app_component_stats", "Internal counters of caches, queues and background workers."))
+
+# Task serving each in-flight request -> "METHOD /route/template", for the diagnostics tools
+active_routes: Dict[asyncio.Task, str] = {}
+
+
+def render() -> str:
+    return REGISTRY.render()
+
+
+@contextmanager
+def track_call(service: str, operation: str) -> Iterator[None]:
+    """Times and traces a call to an external service (LLM, Cloudinary, email)."""
+    start = time.perf_counter()
+    outcome = "error"
+    try:
+        with tracer.span(f"{service} {operation}", CLIENT, {"peer.service": service}):
+            yield
+        outcome = "ok"
+    finally:
+        external_call_duration.observe(time.perf_counter() - start, service, operation, outcome)
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """Times every command the driver sends; pass to the client as an event listener."""
+
+    def __init__(self):
+        self._collections: Dict[Tuple[object, int], str] = {}
+
+    def started(self, event):
+        collection = event.command.get(event.command_name)
+        self._collections[(event.connection_id, event.request_id)] = collection if isinstance(collection, str) else ""
+
+    def succeeded(self, event):
+        collection = self._collections.pop((event.connection_id, event.request_id), "")
+        mongodb_command_duration.observe(event.duration_micros / 1e6, event.command_name, collection)
+
+    def failed(self, event):
+        collection = self._collections.pop((event.connection_id, event.request_id), "")
+        mongodb_command_duration.observe(event.duration_micros / 1e6, event.command_name, collection)
+        mongodb_command_failures.inc(event.command_name, collection)
+
+
+def route_template(router, scope) -> str:
+    """The path template of the route serving ``scope``, e.g. /api/portfolios/{portfolio_id}."""
+    partial = None
+    for route in router.routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return route.path
+        if match == Match.PARTIAL and partial is None:
+            partial = route.path
+    return partial or "unmatched"
+
+
+class MetricsMiddleware:
+    """Counts and times HTTP requests per route template (not per raw path)."""
+
+    def __init__(self, app, router, exclude: Sequence[str] = ()):
+        self.app = app
+        self.router = router
+        self.exclude = set(exclude)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.exclude:
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        route = route_template(self.router, scope)
+        status = "500"
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = str(message["status"])
+            await send(message)
+
+        task = asyncio.current_task()
+        active_routes[task] = f"{method} {route}"
+        http_requests_in_flight.inc(method, route)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            active_routes.pop(task, None)
+            http_request_duration.observe(time.perf_counter() - start, method, route)
+            http_requests.inc(method, route, status)
+            http_requests_in_flight.dec(method, route)
@@ -0,0 +1,106 @@
+"""One-time migration of ISO-string dates to native BSON dates.
+
+Usage: python migrate_datetimes.py [--batch-size N] [--dry-run] [--restart]
+
+Documents are processed in _id order, in batches. After each batch the
+last _id is saved in the ``migrations`` collection, so an interrupted
+run resumes where it stopped, and a later run only looks at documents
+inserted since. Use --restart to rescan everything.
+"""
+import argparse
+import asyncio
+import logging
+import os
+from datetime import datetime, timezone
+from pathlib import Path
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import UpdateOne
+
+from date_utils import as_datetime
+
+logger = logging.getLogger("migrate_datetimes")
+
+MIGRATION_ID = "datetimes_v1"
+
+DATE_FIELDS = {
+    "users": ["created_at"],
+    "user_sessions": ["created_at", "expires_at"],
+    "portfolios": ["created_at", "updated_at"],
+}
+
+
+async def migrate_collection(db, name: str, fields, batch_size: int, dry_run: bool) -> int:
+    checkpoint_id = f"{MIGRATION_ID}:{name}"
+    checkpoint = await db.migrations.find_one({"_id": checkpoint_id})
+
+    query = {"$or": [{field: {"$type": "string"}} for field in fields]}
+    last_id = checkpoint.get("last_id") if checkpoint else None
+    migrated = checkpoint.get("migrated", 0) if checkpoint else 0
+
+    while True:
+        batch_query = {**query, "_id": {"$gt": last_id}} if last_id is not None else query
+        docs = await db[name].find(batch_query, {field: 1 for field in fields}) \
+            .sort("_id", 1).limit(batch_size).to_list(batch_size)
+        if not docs:
+            break
+
+        ops = []
+        for doc in docs:
+            update = {
+                field: as_datetime(doc[field])
+                for field in fields
+                if isinstance(doc.get(field), str)
+            }
+            # Guard on the original values so concurrent writes aren't clobbered
+            ops.append(UpdateOne(
+                {"_id": doc["_id"], **{field: doc[field] for field in update}},
+                {"$set": update},
+            ))
+
+        if not dry_run:
+            await db[name].bulk_write(ops, ordered=False)
+
+        last_id = docs[-1]["_id"]
+        migrated += len(docs)
+        if not dry_run:
+            await db.migrations.update_one(
+                {"_id": checkpoint_id},
+                {"$set": {"last_id": last_id, "migrated": migrated, "updated_at": datetime.now(timezone.utc)}},
+                upsert=True,
+            )
+        logger.info("%s: %s documents migrated", name, migrated)
+
+    if not dry_run:
+        await db.migrations.update_one(
+            {"_id": checkpoint_id},
+            {"$set": {"done": True, "migrated": migrated, "updated_at": datetime.now(timezone.utc)}},
+            upsert=True,
+        )
+    return migrated
+
+
+async def main(batch_size: int, dry_run: bool, restart: bool) -> None:
+    client = AsyncIOMotorClient(os.environ["MONGO_URL"], tz_aware=True)
+    db = client[os.environ["DB_NAME"]]
+    try:
+        if restart:
+            await db.migrations.delete_many({"_id": {"$regex": f"^{MIGRATION_ID}:"}})
+        for name, fields in DATE_FIELDS.items():
+            await migrate_collection(db, name, fields, batch_size, dry_run)
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    load_dotenv(Path(__file__).parent / ".env")
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--dry-run", action="store_true", help="count documents without writing")
+    parser.add_argument("--restart", action="store_true", help="ignore saved checkpoints")
+    args = parser.parse_args()
+
+    asyncio.run(main(args.batch_size, args.dry_run, args.restart))
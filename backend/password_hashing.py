@@ -0,0 +1,66 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+
+BCRYPT_ROUNDS = int(os.environ.get("BCRYPT_ROUNDS", "12"))
+PASSWORD_HASH_WORKERS = int(os.environ.get("PASSWORD_HASH_WORKERS", "4"))
+PASSWORD_HASH_MAX_PENDING = int(os.environ.get("PASSWORD_HASH_MAX_PENDING", "64"))
+
+
+class PasswordHasherBusy(Exception):
+    """Raised when too many hash/verify calls are already queued."""
+
+
+class PasswordHasher:
+    """Runs bcrypt on a dedicated thread pool so it never blocks the event loop.
+
+    bcrypt releases the GIL while hashing, so threads give real parallelism.
+    At most ``max_workers`` hashes run at once; once ``max_pending`` calls are
+    running or queued, new calls fail fast with PasswordHasherBusy.
+    """
+
+    def __init__(
+        self,
+        rounds: int = BCRYPT_ROUNDS,
+        max_workers: int = PASSWORD_HASH_WORKERS,
+        max_pending: int = PASSWORD_HASH_MAX_PENDING,
+    ):
+        self.rounds = rounds
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="bcrypt")
+        self._pending = 0
+
+    async def _run(self, fn, *args):
+        if self._pending >= self.max_pending:
+            raise PasswordHasherBusy("Password hashing queue is full")
+
+        self._pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+        finally:
+            self._pending -= 1
+
+    async def hash(self, password: str) -> str:
+        hashed = await self._run(bcrypt.hashpw, password.encode("utf-8"), bcrypt.gensalt(self.rounds))
+        return hashed.decode("utf-8")
+
+    async def verify(self, password: str, hashed: str) -> bool:
+        return await self._run(bcrypt.checkpw, password.encode("utf-8"), hashed.encode("utf-8"))
+
+    def needs_rehash(self, hashed: str) -> bool:
+        # bcrypt hashes look like $2b$12$<salt+hash>
+        try:
+            return int(hashed.split("$")[2]) != self.rounds
+        except (IndexError, ValueError):
+            return True
+
+    def stats(self) -> dict:
+        return {"pending": self._pending, "max_pending": self.max_pending, "rounds": self.rounds}
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+password_hasher = PasswordHasher()
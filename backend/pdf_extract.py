@@ -0,0 +1,125 @@
+import asyncio
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from PyPDF2 import PdfReader
+
+logger = logging.getLogger(__name__)
+
+PDF_WORKER_PROCESSES = int(os.environ.get("PDF_WORKER_PROCESSES", "2"))
+PDF_MAX_BYTES = int(os.environ.get("PDF_MAX_BYTES", str(5 * 1024 * 1024)))
+PDF_MAX_PAGES = int(os.environ.get("PDF_MAX_PAGES", "20"))
+PDF_MAX_CHARS = int(os.environ.get("PDF_MAX_CHARS", "20000"))  # enough for the LLM prompt
+PDF_PAGES_PER_TASK = int(os.environ.get("PDF_PAGES_PER_TASK", "2"))
+
+_executor: Optional[ProcessPoolExecutor] = None
+
+
+@dataclass
+class PdfExtraction:
+    text: str
+    page_count: int
+    pages_extracted: int
+    truncated: bool
+    seconds: float
+    page_timings: List[Dict[str, Any]] = field(default_factory=list)
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "page_count": self.page_count,
+            "pages_extracted": self.pages_extracted,
+            "truncated": self.truncated,
+            "seconds": round(self.seconds, 4),
+            "page_timings": self.page_timings,
+        }
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=PDF_WORKER_PROCESSES)
+    return _executor
+
+
+# ---- process pool workers (must be top-level so they can be pickled) ----
+
+def _count_pages(path: str) -> int:
+    return len(PdfReader(path).pages)
+
+
+def _extract_pages(path: str, start: int, end: int) -> List[Tuple[int, str, float]]:
+    reader = PdfReader(path)
+    results = []
+    for number in range(start, end):
+        started = time.perf_counter()
+        text = reader.pages[number].extract_text() or ""
+        results.append((number, text, time.perf_counter() - started))
+    return results
+
+
+# ---- async API ----
+
+async def extract_file(
+    path: str,
+    max_pages: int = PDF_MAX_PAGES,
+    max_chars: int = PDF_MAX_CHARS,
+    pages_per_task: int = PDF_PAGES_PER_TASK,
+) -> PdfExtraction:
+    """Extract text from a PDF on disk, a few pages per process-pool task.
+
+    Pages are submitted in waves of one task per worker process; once the
+    text gathered so far reaches ``max_chars`` no further waves are sent.
+    """
+    loop = asyncio.get_running_loop()
+    executor = _get_executor()
+    started = time.perf_counter()
+
+    page_count = await loop.run_in_executor(executor, _count_pages, path)
+    last_page = min(page_count, max_pages)
+    ranges = [(start, min(start + pages_per_task, last_page)) for start in range(0, last_page, pages_per_task)]
+
+    pages: List[Tuple[int, str, float]] = []
+    chars = 0
+    wave_size = max(PDF_WORKER_PROCESSES, 1)
+    for i in range(0, len(ranges), wave_size):
+        wave = ranges[i:i + wave_size]
+        results = await asyncio.gather(*(
+            loop.run_in_executor(executor, _extract_pages, path, start, end) for start, end in wave
+        ))
+        for batch in results:
+            pages.extend(batch)
+            chars += sum(len(text) for _, text, _ in batch)
+        if chars >= max_chars:
+            break
+
+    pages.sort(key=lambda p: p[0])
+    text = "\n".join(text for _, text, _ in pages)
+    truncated = len(pages) < page_count or len(text) > max_chars
+
+    extraction = PdfExtraction(
+        text=text[:max_chars],
+        page_count=page_count,
+        pages_extracted=len(pages),
+        truncated=truncated,
+        seconds=time.perf_counter() - started,
+        page_timings=[
+            {"page": number + 1, "seconds": round(seconds, 4), "chars": len(text)}
+            for number, text, seconds in pages
+        ],
+    )
+    logger.info(
+        "Extracted %s/%s PDF pages (%s chars) in %.3fs",
+        extraction.pages_extracted, page_count, len(extraction.text), extraction.seconds,
+    )
+    return extraction
+
+
+def shutdown() -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
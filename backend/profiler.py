@@ -0,0 +1,99 @@
+import asyncio
+import collections
+import os
+import sys
+import threading
+from typing import Dict, List, Optional
+
+from metrics import active_routes
+
+PROFILE_MAX_SECONDS = int(os.environ.get("PROFILE_MAX_SECONDS", "60"))
+PROFILE_MAX_HZ = int(os.environ.get("PROFILE_MAX_HZ", "250"))
+
+
+class ProfilerBusy(Exception):
+    pass
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    path = code.co_filename
+    if "site-packages" in path:
+        path = path.split("site-packages", 1)[1].lstrip("/\\")
+    else:
+        path = os.path.basename(path)
+    return f"{code.co_name} ({path}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """Statistical profiler for the running process.
+
+    A sampler thread snapshots every thread's stack ``hz`` times a second,
+    so it needs no cooperation from the event loop and also sees code that
+    blocks it. Output is collapsed stacks (``frame;frame;frame count`` per
+    line), which flamegraph.pl and speedscope read directly. With
+    ``by_route`` the loop thread's stacks are rooted at the route being
+    served. One profile runs at a time.
+    """
+
+    def __init__(self, max_seconds: int = PROFILE_MAX_SECONDS, max_hz: int = PROFILE_MAX_HZ):
+        self.max_seconds = max_seconds
+        self.max_hz = max_hz
+        self._lock = threading.Lock()
+        self.profiles = 0
+
+    @property
+    def running(self) -> bool:
+        return self._lock.locked()
+
+    async def profile(self, seconds: float, hz: int = 100, by_route: bool = False) -> str:
+        if not self._lock.acquire(blocking=False):
+            raise ProfilerBusy()
+        try:
+            counts: Dict[str, int] = collections.Counter()
+            stopped = threading.Event()
+            sampler = threading.Thread(
+                target=self._sample,
+                args=(counts, stopped, 1 / hz, asyncio.get_running_loop(), threading.get_ident(), by_route),
+                name="sampling-profiler",
+                daemon=True,
+            )
+            sampler.start()
+            try:
+                await asyncio.sleep(seconds)
+            finally:
+                stopped.set()
+                await asyncio.to_thread(sampler.join)
+            self.profiles += 1
+        finally:
+            self._lock.release()
+        return "".join(f"{stack} {count}\n" for stack, count in counts.most_common())
+
+    def _sample(self, counts, stopped: threading.Event, interval: float, loop, loop_thread: int, by_route: bool) -> None:
+        me = threading.get_ident()
+        while not stopped.wait(interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                frames: List[str] = []
+                while frame is not None:
+                    frames.append(_frame_label(frame))
+                    frame = frame.f_back
+                root = [names.get(ident, f"thread-{ident}")]
+                if by_route and ident == loop_thread:
+                    root.append(self._route(loop))
+                counts[";".join(root + frames[::-1])] += 1
+
+    @staticmethod
+    def _route(loop) -> str:
+        task: Optional[asyncio.Task] = asyncio.current_task(loop)
+        if task is None:
+            return "(idle)"
+        return active_routes.get(task) or f"task {task.get_name()}"
+
+    def stats(self) -> Dict[str, object]:
+        return {"running": self.running, "profiles": self.profiles}
+
+
+sampling_profiler = SamplingProfiler()
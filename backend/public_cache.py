@@ -0,0 +1,60 @@
+import hashlib
+import json
+import os
+from typing import Any, Dict, Optional, Tuple
+
+from fastapi.encoders import jsonable_encoder
+
+from cache_utils import TTLCache
+
+PUBLIC_CACHE_SIZE = int(os.environ.get("PUBLIC_CACHE_SIZE", "5000"))
+PUBLIC_CACHE_TTL = int(os.environ.get("PUBLIC_CACHE_TTL", "300"))
+
+# Browsers always revalidate (cheap 304s); shared caches/CDNs may keep a copy briefly
+PUBLIC_CACHE_CONTROL = os.environ.get(
+    "PUBLIC_CACHE_CONTROL",
+    "public, max-age=0, s-maxage=60, stale-while-revalidate=300",
+)
+
+
+def make_etag(slug: str, updated_at: Any) -> str:
+    digest = hashlib.sha256(f"{slug}:{updated_at}".encode("utf-8")).hexdigest()
+    return f'"{digest[:32]}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    # If-None-Match uses weak comparison, so W/"x" matches "x"
+    return "*" in candidates or etag in (tag[2:] if tag.startswith("W/") else tag for tag in candidates)
+
+
+class PublicPortfolioCache:
+    """Slug -> pre-serialized JSON body and ETag of a published portfolio.
+
+    Entries are dropped explicitly when the portfolio changes; the TTL
+    bounds staleness on other workers.
+    """
+
+    def __init__(self, maxsize: int = PUBLIC_CACHE_SIZE, ttl: int = PUBLIC_CACHE_TTL):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    def get(self, slug: str) -> Optional[Tuple[bytes, str]]:
+        return self._cache.get(slug)
+
+    def put(self, slug: str, portfolio: Dict[str, Any]) -> Tuple[bytes, str]:
+        body = json.dumps(jsonable_encoder(portfolio), separators=(",", ":")).encode("utf-8")
+        entry = (body, make_etag(slug, portfolio.get("updated_at")))
+        self._cache.set(slug, entry)
+        return entry
+
+    def invalidate(self, slug: Optional[str]) -> None:
+        if slug:
+            self._cache.pop(slug)
+
+    def stats(self) -> Dict[str, Any]:
+        return self._cache.stats()
+
+
+public_portfolio_cache = PublicPortfolioCache()
@@ -0,0 +1,323 @@
+import asyncio
+import json
+import math
+import os
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime, timezone, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from pymongo import ReturnDocument
+from starlette.requests import Request
+
+from cache_utils import TTLCache
+
+RATE_LIMIT_BACKEND = os.environ.get("RATE_LIMIT_BACKEND", "memory")
+RATE_LIMIT_MEMORY_KEYS = int(os.environ.get("RATE_LIMIT_MEMORY_KEYS", "100000"))
+# Reverse proxies in front of the app that append to X-Forwarded-For. Set it to
+# 1 behind Render's proxy: with 0, the header is ignored and every visitor shares
+# the proxy's address, and so one per-IP budget (e.g. CONTACT_IP_LIMIT).
+# TRUST_PROXY_HEADERS=true is the older spelling of one hop.
+TRUST_PROXY_HEADERS = os.environ.get("TRUST_PROXY_HEADERS", "").lower() in ("1", "true", "yes")
+TRUSTED_PROXY_HOPS = int(os.environ.get("TRUSTED_PROXY_HOPS", "1" if TRUST_PROXY_HEADERS else "0"))
+
+
+def client_ip(request: Request, trusted_hops: Optional[int] = None) -> str:
+    hops = TRUSTED_PROXY_HOPS if trusted_hops is None else trusted_hops
+    if hops > 0:
+        forwarded = [part.strip() for part in request.headers.get("x-forwarded-for", "").split(",") if part.strip()]
+        if forwarded:
+            # Each trusted proxy appends the address it saw; entries left of those are client-supplied
+            return forwarded[-min(hops, len(forwarded))]
+    return request.client.host if request.client else "unknown"
+
+
+@dataclass
+class Decision:
+    allowed: bool
+    remaining: int
+    retry_after: int
+
+
+class MemoryBucketStore:
+    """Token buckets in process memory. Per worker, so limits are per worker too."""
+
+    def __init__(self, maxsize: int = RATE_LIMIT_MEMORY_KEYS, clock: Callable[[], float] = time.monotonic):
+        self._clock = clock
+        # Idle buckets fall out once they would be full again anyway
+        self._buckets = TTLCache(maxsize=maxsize, ttl=3600, clock=clock)
+
+    async def take(self, key: str, rate: float, capacity: int, cost: float = 1) -> Tuple[bool, float]:
+        now = self._clock()
+        tokens, updated = self._buckets.get(key) or (capacity, now)
+        tokens = min(capacity, tokens + (now - updated) * rate)
+        allowed = tokens >= cost
+        if allowed:
+            tokens -= cost
+        self._buckets.set(key, (tokens, now), ttl=(capacity - tokens) / rate + 1)
+        return allowed, tokens
+
+
+class MongoBucketStore:
+    """Token buckets shared by every API worker, updated atomically in MongoDB."""
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def ensure_indexes(self) -> None:
+        await self.collection.create_index("expires_at", expireAfterSeconds=0)
+
+    async def take(self, key: str, rate: float, capacity: int, cost: float = 1) -> Tuple[bool, float]:
+        now = datetime.now(timezone.utc)
+        refilled = {"$min": [capacity, {"$add": [
+            {"$ifNull": ["$tokens", capacity]},
+            {"$multiply": [rate, {"$divide": [{"$subtract": [now, {"$ifNull": ["$updated_at", now]}]}, 1000]}]},
+        ]}]}
+        doc = await self.collection.find_one_and_update(
+            {"_id": key},
+            [
+                {"$set": {"tokens": refilled}},
+                {"$set": {
+                    "allowed": {"$gte": ["$tokens", cost]},
+                    "tokens": {"$cond": [{"$gte": ["$tokens", cost]}, {"$subtract": ["$tokens", cost]}, "$tokens"]},
+                    "updated_at": now,
+                    "expires_at": now + timedelta(seconds=capacity / rate + 60),
+                }},
+            ],
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        return doc["allowed"], doc["tokens"]
+
+
+def create_bucket_store(db=None):
+    if RATE_LIMIT_BACKEND == "mongo" and db is not None:
+        return MongoBucketStore(db.rate_limits)
+    return MemoryBucketStore()
+
+
+class RateLimitMetrics:
+    """Allowed/throttled/collapsed counts per limiter, for /metrics."""
+
+    def __init__(self):
+        self._counts: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+
+    def record(self, name: str, outcome: str) -> None:
+        self._counts[name][outcome] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {name: dict(counts) for name, counts in self._counts.items()}
+
+
+rate_limit_metrics = RateLimitMetrics()
+
+
+class TokenBucketLimiter:
+    """Allows ``capacity`` requests in a burst, refilled evenly over ``per_seconds``."""
+
+    def __init__(self, name: str, capacity: int, per_seconds: float, store,
+                 metrics: Optional[RateLimitMetrics] = None):
+        self.name = name
+        self.capacity = capacity
+        self.rate = capacity / per_seconds
+        self.store = store
+        self.metrics = metrics or rate_limit_metrics
+
+    async def hit(self, key: str) -> Decision:
+        allowed, tokens = await self.store.take(f"{self.name}:{key}", self.rate, self.capacity)
+        self.metrics.record(self.name, "allowed" if allowed else "throttled")
+        retry_after = 0 if allowed else math.ceil((1 - tokens) / self.rate)
+        return Decision(allowed=allowed, remaining=int(tokens), retry_after=retry_after)
+
+
+# Per route group and plan: "N/unit" windows separated by ";". A plan
+# without an entry is not limited here (the route decides if it has access).
+PLAN_QUOTAS = {
+    "ai_generate": {"pro": "20/minute;500/day"},
+    "ai_extract": {"pro": "5/minute;50/day"},
+}
+PLAN_QUOTAS.update(json.loads(os.environ.get("RATE_LIMIT_QUOTAS", "{}")))
+
+_UNITS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+
+
+def parse_quota(spec: str) -> List[Tuple[int, int]]:
+    """"20/minute;500/day" -> [(20, 60), (500, 86400)]"""
+    windows = []
+    for part in spec.split(";"):
+        limit, unit = part.strip().split("/")
+        windows.append((int(limit), _UNITS[unit.strip()]))
+    return windows
+
+
+@dataclass
+class QuotaResult:
+    allowed: bool
+    limit: int
+    remaining: int
+    reset: int
+    policy: str
+
+    def headers(self) -> Dict[str, str]:
+        return {
+            "RateLimit-Limit": str(self.limit),
+            "RateLimit-Remaining": str(self.remaining),
+            "RateLimit-Reset": str(self.reset),
+            "RateLimit-Policy": self.policy,
+        }
+
+
+class MemoryWindowStore:
+    """Sliding-window counters in process memory (single node).
+
+    Each key keeps the current and previous fixed window's counts; the
+    estimate weights the previous count by how much of it still overlaps
+    the sliding window.
+    """
+
+    def __init__(self, maxsize: int = RATE_LIMIT_MEMORY_KEYS, clock: Callable[[], float] = time.time):
+        self._clock = clock
+        self._windows = TTLCache(maxsize=maxsize, ttl=86400, clock=time.monotonic)
+
+    def _counts(self, key: str, window: int, start: float) -> Tuple[int, int]:
+        entry = self._windows.get((key, window))
+        if entry is None:
+            return 0, 0
+        entry_start, previous, current = entry
+        if entry_start == start:
+            return previous, current
+        if entry_start == start - window:
+            return current, 0
+        return 0, 0
+
+    async def hit(self, key: str, windows: List[Tuple[int, int]]) -> List[Tuple[float, float]]:
+        """Counts the request in every window, unless one of them is full.
+
+        Returns (estimate before this request, seconds to window end) per window.
+        """
+        now = self._clock()
+        results, updates, allowed = [], [], True
+        for limit, window in windows:
+            start = now - now % window
+            previous, current = self._counts(key, window, start)
+            estimate = previous * (1 - (now - start) / window) + current
+            allowed = allowed and estimate + 1 <= limit
+            results.append((estimate, start + window - now))
+            updates.append(((key, window), (start, previous, current + 1), 2 * window))
+        if allowed:
+            for cache_key, entry, ttl in updates:
+                self._windows.set(cache_key, entry, ttl=ttl)
+        return results
+
+
+class MongoWindowStore:
+    """Sliding-window counters shared by every API node.
+
+    One document per key and fixed window; the increment is undone when
+    the request turns out to be over a limit.
+    """
+
+    def __init__(self, collection, clock: Callable[[], float] = time.time):
+        self.collection = collection
+        self._clock = clock
+
+    async def ensure_indexes(self) -> None:
+        await self.collection.create_index("expires_at", expireAfterSeconds=0)
+
+    async def _hit_window(self, key: str, limit: int, window: int, now: float):
+        start = int(now - now % window)
+        expires_at = datetime.fromtimestamp(start + 2 * window, timezone.utc)
+        current, previous = await asyncio.gather(
+            self.collection.find_one_and_update(
+                {"_id": f"{key}:{window}:{start}"},
+                {"$inc": {"count": 1}, "$setOnInsert": {"expires_at": expires_at}},
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
+            ),
+            self.collection.find_one({"_id": f"{key}:{window}:{start - window}"}),
+        )
+        previous_count = previous["count"] if previous else 0
+        estimate = previous_count * (1 - (now - start) / window) + current["count"] - 1
+        return current["_id"], estimate, start + window - now
+
+    async def hit(self, key: str, windows: List[Tuple[int, int]]) -> List[Tuple[float, float]]:
+        now = self._clock()
+        hits = await asyncio.gather(*(self._hit_window(key, limit, window, now) for limit, window in windows))
+        if any(estimate + 1 > limit for (limit, _), (_, estimate, _) in zip(windows, hits)):
+            await self.collection.update_many({"_id": {"$in": [doc_id for doc_id, _, _ in hits]}}, {"$inc": {"count": -1}})
+        return [(estimate, reset) for _, estimate, reset in hits]
+
+
+def create_window_store(db=None):
+    if RATE_LIMIT_BACKEND == "mongo" and db is not None:
+        return MongoWindowStore(db.rate_limit_windows)
+    return MemoryWindowStore()
+
+
+class PlanRateLimiter:
+    """Per-user quotas for a route group, chosen by subscription plan."""
+
+    def __init__(self, store, quotas: Dict[str, Dict[str, str]] = PLAN_QUOTAS,
+                 metrics: Optional[RateLimitMetrics] = None):
+        self.store = store
+        self.quotas = {
+            route: {plan: parse_quota(spec) for plan, spec in plans.items()}
+            for route, plans in quotas.items()
+        }
+        self.metrics = metrics or rate_limit_metrics
+
+    async def check(self, route: str, plan: str, user_id: str) -> Optional[QuotaResult]:
+        windows = self.quotas.get(route, {}).get(plan)
+        if not windows:
+            return None
+
+        results = await self.store.hit(f"{route}:{user_id}", windows)
+        allowed = all(estimate + 1 <= limit for (limit, _), (estimate, _) in zip(windows, results))
+        self.metrics.record(f"{route}:{plan}", "allowed" if allowed else "throttled")
+
+        # Report the window closest to running out
+        remaining, limit, reset = min(
+            (limit - estimate - (1 if allowed else 0), limit, reset)
+            for (limit, _), (estimate, reset) in zip(windows, results)
+        )
+        return QuotaResult(
+            allowed=allowed,
+            limit=limit,
+            remaining=max(0, int(remaining)),
+            reset=math.ceil(reset),
+            policy=", ".join(f"{limit};w={window}" for limit, window in windows),
+        )
+
+
+class RateLimitHeadersMiddleware:
+    """Adds RateLimit-* headers for a QuotaResult left in ``request.state.rate_limit``.
+
+    Works for every response type, including streamed ones, where headers
+    set through an injected Response would be lost.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        state = scope.setdefault("state", {})
+
+        async def send_with_headers(message):
+            result = state.get("rate_limit")
+            if message["type"] == "http.response.start" and result is not None:
+                headers = list(message.get("headers", []))
+                existing = {name.lower() for name, _ in headers}
+                headers += [
+                    (name.lower().encode(), value.encode())
+                    for name, value in result.headers().items()
+                    if name.lower().encode() not in existing
+                ]
+                message = {**message, "headers": headers}
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
@@ -0,0 +1,239 @@
+import asyncio
+import logging
+import os
+import tempfile
+import uuid
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone, timedelta
+from typing import Any, AsyncIterator, Awaitable, BinaryIO, Callable, Dict, List, Optional
+
+from gridfs.errors import NoFile
+from pymongo import ReturnDocument
+
+logger = logging.getLogger(__name__)
+
+RESUME_JOB_WORKERS = int(os.environ.get("RESUME_JOB_WORKERS", "2"))
+RESUME_JOB_LEASE_SECONDS = int(os.environ.get("RESUME_JOB_LEASE_SECONDS", "300"))
+RESUME_JOB_MAX_ATTEMPTS = int(os.environ.get("RESUME_JOB_MAX_ATTEMPTS", "3"))
+RESUME_JOB_RETENTION_SECONDS = int(os.environ.get("RESUME_JOB_RETENTION_SECONDS", str(24 * 60 * 60)))
+RESUME_JOB_POLL_INTERVAL = float(os.environ.get("RESUME_JOB_POLL_INTERVAL", "2"))
+
+# Fields never returned to clients
+_PRIVATE_FIELDS = {"_id": 0, "pdf": 0, "pdf_file_id": 0, "lease_expires_at": 0, "lease_id": 0}
+
+JobHandler = Callable[[Dict[str, Any], Callable[[str], Awaitable[None]]], Awaitable[Dict[str, Any]]]
+
+
+class ResumeJobQueue:
+    """MongoDB-backed queue for resume extraction jobs.
+
+    A job is claimed by setting a lease. Jobs whose worker died (crash,
+    restart, redeploy) become claimable again once the lease runs out, so
+    jobs survive restarts and several API nodes can share the queue. A
+    job that keeps failing is marked failed after ``max_attempts`` claims.
+    Finished jobs are kept for ``retention`` seconds (TTL index).
+
+    The uploaded PDF is streamed into GridFS (``files``) rather than the job
+    document, and workers read it back to a temp file via ``pdf_path``.
+    """
+
+    def __init__(
+        self,
+        collection,
+        handler: JobHandler,
+        files,
+        workers: int = RESUME_JOB_WORKERS,
+        lease_seconds: int = RESUME_JOB_LEASE_SECONDS,
+        max_attempts: int = RESUME_JOB_MAX_ATTEMPTS,
+        retention: int = RESUME_JOB_RETENTION_SECONDS,
+        poll_interval: float = RESUME_JOB_POLL_INTERVAL,
+    ):
+        self.collection = collection
+        self.handler = handler
+        self.files = files
+        self.workers = workers
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.retention = retention
+        self.poll_interval = poll_interval
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup = asyncio.Event()
+
+    async def ensure_indexes(self) -> None:
+        await self.collection.create_index("job_id", unique=True)
+        await self.collection.create_index([("status", 1), ("created_at", 1)])
+        await self.collection.create_index("expires_at", expireAfterSeconds=0)
+
+    async def enqueue(self, user_id: str, pdf: BinaryIO, filename: Optional[str] = None, **fields: Any) -> Dict[str, Any]:
+        now = datetime.now(timezone.utc)
+        job_id = f"job_{uuid.uuid4().hex[:16]}"
+        file_id = await self.files.upload_from_stream(
+            filename or "resume.pdf", pdf, metadata={"job_id": job_id, "user_id": user_id},
+        )
+        job = {
+            "job_id": job_id,
+            "user_id": user_id,
+            "status": "queued",
+            "progress": "queued",
+            "attempts": 0,
+            "pdf_file_id": file_id,
+            "filename": filename,
+            "created_at": now,
+            "updated_at": now,
+            **fields,
+        }
+        await self.collection.insert_one(job)
+        self._wakeup.set()
+        return {k: v for k, v in job.items() if k not in _PRIVATE_FIELDS}
+
+    async def insert_completed(self, user_id: str, result: Dict[str, Any]) -> Dict[str, Any]:
+        """Record a job whose result is already known (e.g. a cache hit)."""
+        now = datetime.now(timezone.utc)
+        job = {
+            "job_id": f"job_{uuid.uuid4().hex[:16]}",
+            "user_id": user_id,
+            "status": "completed",
+            "progress": "completed",
+            "attempts": 0,
+            "result": result,
+            "created_at": now,
+            "updated_at": now,
+            "finished_at": now,
+            "expires_at": now + timedelta(seconds=self.retention),
+        }
+        await self.collection.insert_one(job)
+        return {k: v for k, v in job.items() if k not in _PRIVATE_FIELDS}
+
+    async def get(self, job_id: str, user_id: str) -> Optional[Dict[str, Any]]:
+        return await self.collection.find_one({"job_id": job_id, "user_id": user_id}, _PRIVATE_FIELDS)
+
+    def start(self) -> None:
+        for i in range(self.workers):
+            self._tasks.append(asyncio.create_task(self._run_worker(), name=f"resume-job-worker-{i}"))
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+
+    async def _claim(self) -> Optional[Dict[str, Any]]:
+        now = datetime.now(timezone.utc)
+        return await self.collection.find_one_and_update(
+            {"$or": [
+                {"status": "queued"},
+                {"status": "running", "lease_expires_at": {"$lt": now}},
+            ]},
+            {
+                "$set": {
+                    "status": "running",
+                    # Identifies this claim; writes from an older, expired claim are ignored
+                    "lease_id": uuid.uuid4().hex,
+                    "started_at": now,
+                    "updated_at": now,
+                    "lease_expires_at": now + timedelta(seconds=self.lease_seconds),
+                },
+                "$inc": {"attempts": 1},
+            },
+            sort=[("created_at", 1)],
+            return_document=ReturnDocument.AFTER,
+        )
+
+    @asynccontextmanager
+    async def pdf_path(self, job: Dict[str, Any]) -> AsyncIterator[str]:
+        """The job's PDF, copied chunk by chunk to a temp file for the parser."""
+        fd, path = tempfile.mkstemp(suffix=".pdf")
+        try:
+            with os.fdopen(fd, "wb") as out:
+                if "pdf" in job:
+                    # Queued before PDFs moved to GridFS
+                    await asyncio.to_thread(out.write, job["pdf"])
+                else:
+                    stream = await self.files.open_download_stream(job["pdf_file_id"])
+                    while chunk := await stream.readchunk():
+                        await asyncio.to_thread(out.write, chunk)
+            yield path
+        finally:
+            os.unlink(path)
+
+    async def _delete_pdf(self, job: Dict[str, Any]) -> None:
+        if job.get("pdf_file_id") is None:
+            return
+        try:
+            await self.files.delete(job["pdf_file_id"])
+        except NoFile:
+            pass
+
+    def _leased(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        return {"job_id": job["job_id"], "lease_id": job["lease_id"]}
+
+    async def _finish(self, job: Dict[str, Any], status: str, **fields: Any) -> None:
+        now = datetime.now(timezone.utc)
+        result = await self.collection.update_one(
+            self._leased(job),
+            {
+                "$set": {
+                    "status": status,
+                    "progress": status,
+                    "updated_at": now,
+                    "finished_at": now,
+                    "expires_at": now + timedelta(seconds=self.retention),
+                    **fields,
+                },
+                "$unset": {"pdf": "", "pdf_file_id": "", "lease_expires_at": "", "lease_id": ""},
+            },
+        )
+        if not result.matched_count:
+            logger.warning("Resume job %s was reclaimed by another worker; dropping %s result", job["job_id"], status)
+            return
+        await self._delete_pdf(job)
+
+    async def _process(self, job: Dict[str, Any]) -> None:
+        if job["attempts"] > self.max_attempts:
+            await self._finish(job, "failed", error="Resume extraction failed: too many attempts")
+            return
+
+        async def report_progress(stage: str) -> None:
+            await self.collection.update_one(
+                self._leased(job),
+                {"$set": {"progress": stage, "updated_at": datetime.now(timezone.utc)}},
+            )
+
+        try:
+            result = await self.handler(job, report_progress)
+        except Exception as e:
+            logger.exception("Resume job %s failed (attempt %s)", job["job_id"], job["attempts"])
+            error = f"Resume extraction failed: {str(e)}"
+            if job["attempts"] >= self.max_attempts:
+                await self._finish(job, "failed", error=error)
+            else:
+                await self.collection.update_one(
+                    self._leased(job),
+                    {
+                        "$set": {"status": "queued", "progress": "queued", "error": error,
+                                 "updated_at": datetime.now(timezone.utc)},
+                        "$unset": {"lease_expires_at": "", "lease_id": ""},
+                    },
+                )
+            return
+
+        await self._finish(job, "completed", result=result)
+
+    async def _run_worker(self) -> None:
+        while True:
+            try:
+                job = await self._claim()
+                if job is not None:
+                    await self._process(job)
+                    continue
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # A job left running is claimed again once its lease expires
+                logger.exception("Resume job worker failed")
+
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
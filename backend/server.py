@@ -1,44 +1,85 @@
 from fastapi import FastAPI, APIRouter, HTTPException, Depends, Request, Response, UploadFile, File
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse, PlainTextResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorGridFSBucket
 import os
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field, ConfigDict, EmailStr
 from typing import List, Optional, Dict, Any
 import uuid
+import asyncio
+import hashlib
+import hmac
 from datetime import datetime, timezone, timedelta
-import bcrypt
-import httpx
 import razorpay
-from PyPDF2 import PdfReader
-import io
-from openai import OpenAI
 import json
 import os
-from email_utils import send_verification_email
+
+# Load .env before importing local modules, which read their settings at import time
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / '.env')
+
+from email_utils import verification_email, contact_email
+from email_outbox import EmailOutbox, create_transport
 import cloudinary
-import cloudinary.uploader
 from fastapi import Form
 from fastapi.responses import RedirectResponse
+from fastapi.staticfiles import StaticFiles
 from urllib.parse import urlencode
-from email_utils import send_contact_email
+from session_cache import session_cache
+from sessions import find_session_with_user
+from session_lifecycle import SessionLifecycle
+from auth_tokens import AUTH_MODE, AccessTokens, TokenDenylist, InvalidAccessToken, looks_like_access_token, session_id
+from password_hashing import password_hasher, PasswordHasherBusy
+from llm_client import llm_client
+from ai_cache import ResponseCache, make_cache_key
+from resume_jobs import ResumeJobQueue
+import pdf_extract
+from http_client import outbound_http
+from github_import import GitHubImporter, GitHubRateLimited
+from public_cache import public_portfolio_cache, etag_matches, PUBLIC_CACHE_CONTROL
+import db_indexes
+from date_utils import as_datetime
+from storage import storage, LocalStorage, UPLOAD_KINDS, InvalidUploadSignature, InvalidAsset, direct_upload_id
+from rate_limit import (
+    TokenBucketLimiter, MongoBucketStore, create_bucket_store, client_ip, rate_limit_metrics,
+    PlanRateLimiter, MongoWindowStore, create_window_store, RateLimitHeadersMiddleware,
+)
+from cache_utils import TTLCache
+from upload_guard import guard_upload, UploadRejected, BodySizeLimitMiddleware, IMAGE_TYPES, PDF_TYPES
+import metrics
+from metrics import MetricsMiddleware, MongoCommandMetrics
+from loop_monitor import LOOP_MONITOR, loop_monitor
+from profiler import sampling_profiler, ProfilerBusy
+from tracing import tracer, MongoCommandTracer, TracingMiddleware
 
 GOOGLE_AUTH_URL = "https://accounts.google.com/o/oauth2/v2/auth"
 GOOGLE_TOKEN_URL = "https://oauth2.googleapis.com/token"
 GOOGLE_USERINFO_URL = "https://www.googleapis.com/oauth2/v2/userinfo"
 
+# /metrics exposes per-route traffic and internal counters. Scrapers must send
+# "Authorization: Bearer <METRICS_TOKEN>"; without a token configured it is only
+# served to loopback clients (local runs, the load test), so set it in production.
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN")
+LOOPBACK_HOSTS = {"127.0.0.1", "::1"}
 
-ROOT_DIR = Path(__file__).parent
-load_dotenv(ROOT_DIR / '.env')
+# Accounts allowed to use the /api/admin diagnostics routes
+ADMIN_EMAILS = {e.strip().lower() for e in os.environ.get("ADMIN_EMAILS", "").split(",") if e.strip()}
 
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+client = AsyncIOMotorClient(mongo_url, tz_aware=True, event_listeners=[MongoCommandMetrics(), MongoCommandTracer(tracer)])
 db = client[os.environ['DB_NAME']]
 
+# AI response cache (memory + MongoDB)
+ai_generate_cache = ResponseCache("ai_generate", db.ai_generate_cache)
+resume_extract_cache = ResponseCache("resume_extract", db.resume_extract_cache)
+
+# Transactional email, sent by background workers
+email_outbox = EmailOutbox(db.email_outbox, create_transport())
+
 cloudinary.config(
     cloud_name=os.environ.get("CLOUDINARY_CLOUD_NAME"),
     api_key=os.environ.get("CLOUDINARY_API_KEY"),
@@ -47,15 +88,9 @@ cloudinary.config(
 
 
 # Razorpay client
-razorpay_client = razorpay.Client(auth=(os.environ.get('RAZORPAY_KEY_ID', ''), os.environ.get('RAZORPAY_KEY_SECRET', '')))
-
-# OpenAI client
-OPENROUTER_API_KEY = os.environ.get("OPENROUTER_API_KEY")
-OPENROUTER_MODEL = os.environ.get("OPENROUTER_MODEL", "openai/gpt-4o-mini")
-
-client_llm = OpenAI(
-    api_key=OPENROUTER_API_KEY,
-    base_url="https://openrouter.ai/api/v1"
+razorpay_client = razorpay.Client(
+    auth=(os.environ.get('RAZORPAY_KEY_ID', ''), os.environ.get('RAZORPAY_KEY_SECRET', '')),
+    base_url=os.environ.get('RAZORPAY_BASE_URL', razorpay.Client.DEFAULTS['base_url']),
 )
 
 app = FastAPI()
@@ -170,12 +205,16 @@ class PortfolioUpdate(BaseModel):
 class AIGenerateRequest(BaseModel):
     context: str
     type: str  # about, project, skills
+    fresh: bool = False  # skip the cache and ask for a new variant
 
 class ContactMessage(BaseModel):
     name: str
     email: EmailStr
     message: str
 
+class UploadSignRequest(BaseModel):
+    kind: str  # profile_image, resume
+
 class RazorpayOrder(BaseModel):
     amount: int  # in paise
 
@@ -190,49 +229,181 @@ class RazorpayVerify(BaseModel):
 def health():
     return {"status": "ok"}
 
+
+@app.get("/metrics")
+async def get_metrics(request: Request):
+    # Rendered on the event loop: the component stats read loop-owned state
+    if METRICS_TOKEN:
+        if not hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {METRICS_TOKEN}"):
+            raise HTTPException(status_code=401, detail="Not authenticated")
+    elif not request.client or request.client.host not in LOOPBACK_HOSTS:
+        raise HTTPException(status_code=401, detail="Set METRICS_TOKEN to scrape /metrics")
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 # ============ AUTH HELPERS ============
 
-def hash_password(password: str) -> str:
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+async def hash_password(password: str) -> str:
+    try:
+        return await password_hasher.hash(password)
+    except PasswordHasherBusy:
+        raise HTTPException(status_code=503, detail="Server busy, please try again", headers={"Retry-After": "1"})
 
-def verify_password(password: str, hashed: str) -> bool:
-    return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+async def verify_password(password: str, hashed: str) -> bool:
+    try:
+        return await password_hasher.verify(password, hashed)
+    except PasswordHasherBusy:
+        raise HTTPException(status_code=503, detail="Server busy, please try again", headers={"Retry-After": "1"})
 
-async def get_current_user(request: Request) -> User:
+def get_session_token(request: Request) -> Optional[str]:
     # Check cookie first, then Authorization header
     session_token = request.cookies.get('session_token')
     if not session_token:
         auth_header = request.headers.get('Authorization')
         if auth_header and auth_header.startswith('Bearer '):
             session_token = auth_header.split(' ')[1]
+    return session_token
+
+def get_access_token(request: Request) -> Optional[str]:
+    token = request.cookies.get('access_token')
+    if not token:
+        auth_header = request.headers.get('Authorization')
+        if auth_header and auth_header.startswith('Bearer '):
+            token = auth_header.split(' ')[1]
+    return token if token and looks_like_access_token(token) else None
+
+def get_user_from_access_token(request: Request) -> User:
+    # AUTH_MODE=token: no I/O, the signed token carries the user
+    token = get_access_token(request)
+    if not token:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+
+    try:
+        claims = access_tokens.verify(token)
+    except InvalidAccessToken as e:
+        raise HTTPException(status_code=401, detail=str(e))
+
+    if token_denylist.is_revoked(claims):
+        raise HTTPException(status_code=401, detail="Access token revoked")
+
+    return User(
+        user_id=claims["sub"],
+        email=claims["email"],
+        name=claims["name"],
+        picture=claims.get("picture"),
+        subscription_plan=claims["plan"],
+        created_at=claims["created_at"],
+    )
+
+async def get_current_user(request: Request) -> User:
+    if AUTH_MODE == "token":
+        return get_user_from_access_token(request)
+
+    session_token = get_session_token(request)
     
     if not session_token:
         raise HTTPException(status_code=401, detail="Not authenticated")
     
-    # Find session
-    session_doc = await db.user_sessions.find_one({"session_token": session_token}, {"_id": 0})
-    if not session_doc:
+    cached = session_cache.get(session_token)
+    if cached:
+        return cached[0]
+    
+    # Session and user in one round trip
+    found = await find_session_with_user(db, session_token)
+    if not found:
         raise HTTPException(status_code=401, detail="Invalid session")
+    session_doc, user_doc = found
     
-    # Check expiry
-    expires_at = session_doc["expires_at"]
-    if isinstance(expires_at, str):
-        expires_at = datetime.fromisoformat(expires_at)
-    if expires_at.tzinfo is None:
-        expires_at = expires_at.replace(tzinfo=timezone.utc)
+    # Check expiry (the TTL index removes expired sessions lazily)
+    expires_at = as_datetime(session_doc["expires_at"])
     if expires_at < datetime.now(timezone.utc):
         raise HTTPException(status_code=401, detail="Session expired")
     
-    # Get user
-    user_doc = await db.users.find_one({"user_id": session_doc["user_id"]}, {"_id": 0})
     if not user_doc:
         raise HTTPException(status_code=401, detail="User not found")
     
-    # Convert datetime fields
-    if isinstance(user_doc.get('created_at'), str):
-        user_doc['created_at'] = datetime.fromisoformat(user_doc['created_at'])
-    
-    return User(**user_doc)
+    user = User(**user_doc)
+    session_cache.set(session_token, user, expires_at)
+    return user
+
+async def require_admin(current_user: User = Depends(get_current_user)) -> User:
+    if current_user.email.lower() not in ADMIN_EMAILS:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return current_user
+
+SESSION_TTL = timedelta(days=7)
+
+access_tokens = AccessTokens()
+token_denylist = TokenDenylist(db.token_denylist)
+
+def set_auth_cookie(response: Response, key: str, value: str, max_age: int):
+    response.set_cookie(
+        key=key,
+        value=value,
+        httponly=True,
+        secure=True,
+        samesite="none",
+        path="/",
+        max_age=max_age
+    )
+
+async def evict_sessions(session_tokens: List[str]):
+    for session_token in session_tokens:
+        session_cache.invalidate(session_token)
+        if AUTH_MODE == "token":
+            await token_denylist.revoke_session(session_token)
+
+session_lifecycle = SessionLifecycle(db.user_sessions, on_evict=evict_sessions)
+
+async def start_session(response: Response, user_doc: Dict[str, Any], session_token: Optional[str] = None) -> Dict[str, Any]:
+    """Creates a session and sets the auth cookies; returns the token fields for the response body."""
+    session_token = session_token or f"session_{uuid.uuid4().hex}"
+    now = datetime.now(timezone.utc)
+    # Upsert: an externally issued token (Emergent) may be exchanged more than once
+    result = await db.user_sessions.update_one(
+        {"session_token": session_token},
+        {
+            "$set": {"expires_at": now + SESSION_TTL},
+            "$setOnInsert": {"user_id": user_doc["user_id"], "created_at": now},
+        },
+        upsert=True,
+    )
+    if result.upserted_id is not None:
+        session_lifecycle.record_created()
+        await session_lifecycle.enforce_cap(user_doc["user_id"])
+    set_auth_cookie(response, "session_token", session_token, int(SESSION_TTL.total_seconds()))
+
+    tokens = {"session_token": session_token}
+    if AUTH_MODE == "token":
+        tokens.update(issue_access_token(response, user_doc, session_token))
+    return tokens
+
+def issue_access_token(response: Response, user_doc: Dict[str, Any], session_token: str) -> Dict[str, Any]:
+    access_token = access_tokens.issue(user_doc, session_token)
+    set_auth_cookie(response, "access_token", access_token, access_tokens.ttl)
+    return {"access_token": access_token, "token_type": "bearer", "expires_in": access_tokens.ttl}
+
+async def invalidate_user_auth(user_id: str):
+    """Drop cached sessions and, in token mode, force a refresh (e.g. after a plan change)."""
+    session_cache.invalidate_user(user_id)
+    if AUTH_MODE == "token":
+        await token_denylist.revoke_user(user_id)
+
+# Per-user, per-plan quotas on expensive routes (see rate_limit.PLAN_QUOTAS)
+plan_rate_limiter = PlanRateLimiter(create_window_store(db))
+
+def plan_rate_limit(route: str):
+    async def enforce(request: Request, current_user: User = Depends(get_current_user)):
+        result = await plan_rate_limiter.check(route, current_user.subscription_plan, current_user.user_id)
+        if result is None:
+            return
+        request.state.rate_limit = result
+        if not result.allowed:
+            raise HTTPException(
+                status_code=429,
+                detail="Rate limit exceeded, please slow down",
+                headers={**result.headers(), "Retry-After": str(result.reset)},
+            )
+    return enforce
 
 # ============ AUTH ROUTES ============
 
@@ -248,21 +419,21 @@ async def signup(user_data: UserSignup):
     user_doc = {
         "user_id": user_id,
         "email": user_data.email,
-        "password_hash": hash_password(user_data.password),
+        "password_hash": await hash_password(user_data.password),
         "name": user_data.name,
         "picture": None,
         "subscription_plan": "free",
         "is_verified": False,
         "verification_token": verification_token,
-        "created_at": datetime.now(timezone.utc).isoformat()
+        "created_at": datetime.now(timezone.utc)
     }
 
     await db.users.insert_one(user_doc)
 
     verify_link = f"{os.environ.get('FRONTEND_URL')}/verify?token={verification_token}"
 
-    # Send email
-    await send_verification_email(user_data.email, verify_link)
+    # Delivered in the background by the outbox workers
+    await email_outbox.enqueue(verification_email(user_data.email, verify_link), kind="verification")
 
     return {"message": "Account created. Please check your email to verify your account."}
 
@@ -291,37 +462,30 @@ async def verify_email(token: str):
 @api_router.post("/auth/login")
 async def login(credentials: UserLogin, response: Response):
     user_doc = await db.users.find_one({"email": credentials.email})
-    if not user_doc or not verify_password(credentials.password, user_doc["password_hash"]):
+    if not user_doc or not await verify_password(credentials.password, user_doc["password_hash"]):
         raise HTTPException(status_code=401, detail="Invalid credentials")
 
     if not user_doc.get("is_verified"):
         raise HTTPException(status_code=403, detail="Please verify your email before logging in")
 
-    # Create session
-    session_token = f"session_{uuid.uuid4().hex}"
-    session_doc = {
-        "user_id": user_doc["user_id"],
-        "session_token": session_token,
-        "expires_at": (datetime.now(timezone.utc) + timedelta(days=7)).isoformat(),
-        "created_at": datetime.now(timezone.utc).isoformat()
-    }
-    await db.user_sessions.insert_one(session_doc)
+    # Upgrade hashes created with an outdated bcrypt cost; best effort, the password is already verified
+    if password_hasher.needs_rehash(user_doc["password_hash"]):
+        try:
+            new_hash = await password_hasher.hash(credentials.password)
+        except PasswordHasherBusy:
+            new_hash = None
+        if new_hash:
+            await db.users.update_one(
+                {"user_id": user_doc["user_id"], "password_hash": user_doc["password_hash"]},
+                {"$set": {"password_hash": new_hash}}
+            )
 
-    response.set_cookie(
-        key="session_token",
-        value=session_token,
-        httponly=True,
-        secure=True,
-        samesite="none",
-        path="/",
-        max_age=7*24*60*60
-    )
+    # Create session
+    tokens = await start_session(response, user_doc)
 
     user_response = {k: v for k, v in user_doc.items() if k not in ["_id", "password_hash", "verification_token"]}
-    if isinstance(user_response.get('created_at'), str):
-        user_response['created_at'] = datetime.fromisoformat(user_response['created_at'])
 
-    return {"user": User(**user_response), "session_token": session_token}
+    return {"user": User(**user_response), **tokens}
 
 @api_router.get("/auth/google/login")
 async def google_login():
@@ -340,18 +504,17 @@ async def google_login():
 @api_router.get("/auth/google/callback")
 async def google_callback(code: str):
     # 1. Exchange code for token
-    async with httpx.AsyncClient() as client_http:
-        token_resp = await client_http.post(
-            GOOGLE_TOKEN_URL,
-            data={
-                "client_id": os.getenv("GOOGLE_CLIENT_ID"),
-                "client_secret": os.getenv("GOOGLE_CLIENT_SECRET"),
-                "code": code,
-                "grant_type": "authorization_code",
-                "redirect_uri": os.getenv("GOOGLE_REDIRECT_URI"),
-            },
-            headers={"Content-Type": "application/x-www-form-urlencoded"},
-        )
+    token_resp = await outbound_http.post(
+        GOOGLE_TOKEN_URL,
+        data={
+            "client_id": os.getenv("GOOGLE_CLIENT_ID"),
+            "client_secret": os.getenv("GOOGLE_CLIENT_SECRET"),
+            "code": code,
+            "grant_type": "authorization_code",
+            "redirect_uri": os.getenv("GOOGLE_REDIRECT_URI"),
+        },
+        headers={"Content-Type": "application/x-www-form-urlencoded"},
+    )
 
     token_data = token_resp.json()
     access_token = token_data.get("access_token")
@@ -360,11 +523,10 @@ async def google_callback(code: str):
         raise HTTPException(status_code=400, detail="Failed to get access token from Google")
 
     # 2. Get user info
-    async with httpx.AsyncClient() as client_http:
-        userinfo_resp = await client_http.get(
-            GOOGLE_USERINFO_URL,
-            headers={"Authorization": f"Bearer {access_token}"}
-        )
+    userinfo_resp = await outbound_http.get(
+        GOOGLE_USERINFO_URL,
+        headers={"Authorization": f"Bearer {access_token}"}
+    )
 
     userinfo = userinfo_resp.json()
 
@@ -384,6 +546,8 @@ async def google_callback(code: str):
             {"user_id": user_id},
             {"$set": {"name": name, "picture": picture}}
         )
+        user_doc.update(name=name, picture=picture)
+        session_cache.invalidate_user(user_id)
     else:
         user_id = f"user_{uuid.uuid4().hex[:12]}"
         user_doc = {
@@ -393,49 +557,29 @@ async def google_callback(code: str):
             "picture": picture,
             "subscription_plan": "free",
             "is_verified": True,
-            "created_at": datetime.now(timezone.utc).isoformat()
+            "created_at": datetime.now(timezone.utc)
         }
         await db.users.insert_one(user_doc)
 
-    # 4. Create session
-    session_token = f"session_{uuid.uuid4().hex}"
-    session_doc = {
-        "user_id": user_id,
-        "session_token": session_token,
-        "expires_at": (datetime.now(timezone.utc) + timedelta(days=7)).isoformat(),
-        "created_at": datetime.now(timezone.utc).isoformat()
-    }
-    await db.user_sessions.insert_one(session_doc)
-
-    # 5. Redirect + set cookie ON THE REDIRECT RESPONSE
+    # 4. Redirect, with the session cookies ON THE REDIRECT RESPONSE
     frontend_url = os.getenv("FRONTEND_URL", "http://localhost:3000").rstrip("/")
     redirect = RedirectResponse(f"{frontend_url}/dashboard", status_code=302)
-
-    redirect.set_cookie(
-        key="session_token",
-        value=session_token,
-        httponly=True,
-        secure=True,
-        samesite="none",  
-        path="/",
-        max_age=7 * 24 * 60 * 60
-    )
+    await start_session(redirect, user_doc)
 
     return redirect
 
 @api_router.post("/auth/session")
 async def exchange_session(data: SessionExchange, response: Response):
     # Call Emergent Auth API
-    async with httpx.AsyncClient() as http_client:
-        try:
-            resp = await http_client.get(
-                "https://demobackend.emergentagent.com/auth/v1/env/oauth/session-data",
-                headers={"X-Session-ID": data.session_id}
-            )
-            resp.raise_for_status()
-            session_data = resp.json()
-        except Exception as e:
-            raise HTTPException(status_code=400, detail=f"Failed to exchange session: {str(e)}")
+    try:
+        resp = await outbound_http.get(
+            "https://demobackend.emergentagent.com/auth/v1/env/oauth/session-data",
+            headers={"X-Session-ID": data.session_id}
+        )
+        resp.raise_for_status()
+        session_data = resp.json()
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Failed to exchange session: {str(e)}")
     
     # Check if user exists
     user_doc = await db.users.find_one({"email": session_data["email"]}, {"_id": 0})
@@ -450,6 +594,7 @@ async def exchange_session(data: SessionExchange, response: Response):
             }}
         )
         user_id = user_doc["user_id"]
+        session_cache.invalidate_user(user_id)
     else:
         # Create new user
         user_id = f"user_{uuid.uuid4().hex[:12]}"
@@ -460,76 +605,136 @@ async def exchange_session(data: SessionExchange, response: Response):
             "picture": session_data.get("picture"),
             "subscription_plan": "free",
             "is_verified": True,
-            "created_at": datetime.now(timezone.utc).isoformat()
+            "created_at": datetime.now(timezone.utc)
         }
         await db.users.insert_one(user_doc)
     
     # Create session with Emergent's session_token
-    session_token = session_data["session_token"]
-    session_doc = {
-        "user_id": user_id,
-        "session_token": session_token,
-        "expires_at": (datetime.now(timezone.utc) + timedelta(days=7)).isoformat(),
-        "created_at": datetime.now(timezone.utc).isoformat()
-    }
-    await db.user_sessions.insert_one(session_doc)
-    
-    # Set httpOnly cookie
-    response.set_cookie(
-         key="session_token",
-    value=session_token,
-    httponly=True,
-    secure=True,        # ✅ allow on http
-    samesite="none",      # ✅ works on cross-site
-    path="/",
-    max_age=7*24*60*60
-    )
-    
     user_response = await db.users.find_one({"user_id": user_id}, {"_id": 0, "password_hash": 0})
-    if isinstance(user_response.get('created_at'), str):
-        user_response['created_at'] = datetime.fromisoformat(user_response['created_at'])
-    
-    return {"user": User(**user_response), "session_token": session_token}
+    tokens = await start_session(response, user_response, session_token=session_data["session_token"])
+
+    return {"user": User(**user_response), **tokens}
 
 @api_router.get("/auth/me")
 async def get_me(current_user: User = Depends(get_current_user)):
     return current_user
 
+@api_router.post("/auth/refresh")
+async def refresh_access_token(request: Request, response: Response):
+    # AUTH_MODE=token: trade the long-lived session token for a fresh access token
+    if AUTH_MODE != "token":
+        raise HTTPException(status_code=404, detail="Not found")
+
+    session_token = request.cookies.get('session_token') or get_session_token(request)
+    if not session_token or looks_like_access_token(session_token):
+        raise HTTPException(status_code=401, detail="Not authenticated")
+
+    found = await find_session_with_user(db, session_token)
+    if not found:
+        raise HTTPException(status_code=401, detail="Invalid session")
+    session_doc, user_doc = found
+
+    if as_datetime(session_doc["expires_at"]) < datetime.now(timezone.utc):
+        raise HTTPException(status_code=401, detail="Session expired")
+    if not user_doc:
+        raise HTTPException(status_code=401, detail="User not found")
+
+    return issue_access_token(response, user_doc, session_token)
+
 @api_router.post("/auth/logout")
 async def logout(request: Request, response: Response):
-    session_token = request.cookies.get('session_token')
-    if session_token:
+    session_token = request.cookies.get('session_token') or get_session_token(request)
+    if session_token and not looks_like_access_token(session_token):
         await db.user_sessions.delete_one({"session_token": session_token})
+        session_cache.invalidate(session_token)
+        if AUTH_MODE == "token":
+            await token_denylist.revoke_session(session_token)
+    elif AUTH_MODE == "token" and get_access_token(request):
+        # Only the access token was sent: revoke its session via the sid claim
+        try:
+            claims = access_tokens.verify(get_access_token(request))
+        except InvalidAccessToken:
+            claims = None
+        if claims and claims.get("sid"):
+            await token_denylist.revoke_sid(claims["sid"])
+            sessions = await db.user_sessions.find({"user_id": claims["sub"]}, {"session_token": 1}).to_list(None)
+            tokens = [doc["session_token"] for doc in sessions if session_id(doc["session_token"]) == claims["sid"]]
+            if tokens:
+                await db.user_sessions.delete_many({"session_token": {"$in": tokens}})
     response.delete_cookie(key="session_token", path="/")
+    response.delete_cookie(key="access_token", path="/")
     return {"message": "Logged out"}
 
 # ============ PORTFOLIO ROUTES ============
 
-@api_router.post("/public/contact/{slug}")
-async def send_contact(slug: str, data: ContactMessage):
-
-    # 1️⃣ Find portfolio
-    portfolio = await db.portfolios.find_one(
-        {"slug": slug, "is_published": True}
+# Public contact form throttling: per sender IP and per portfolio
+CONTACT_IP_LIMIT = int(os.environ.get("CONTACT_IP_LIMIT", "5"))
+CONTACT_IP_WINDOW = int(os.environ.get("CONTACT_IP_WINDOW", "600"))
+CONTACT_SLUG_LIMIT = int(os.environ.get("CONTACT_SLUG_LIMIT", "20"))
+CONTACT_SLUG_WINDOW = int(os.environ.get("CONTACT_SLUG_WINDOW", "3600"))
+CONTACT_DUPLICATE_WINDOW = int(os.environ.get("CONTACT_DUPLICATE_WINDOW", "600"))
+CONTACT_OWNER_CACHE_TTL = int(os.environ.get("CONTACT_OWNER_CACHE_TTL", "300"))
+
+rate_limit_store = create_bucket_store(db)
+contact_ip_limiter = TokenBucketLimiter("contact_ip", CONTACT_IP_LIMIT, CONTACT_IP_WINDOW, rate_limit_store)
+contact_slug_limiter = TokenBucketLimiter("contact_slug", CONTACT_SLUG_LIMIT, CONTACT_SLUG_WINDOW, rate_limit_store)
+# slug -> owner email of a published portfolio
+contact_owner_cache = TTLCache(maxsize=10000, ttl=CONTACT_OWNER_CACHE_TTL)
+recent_contact_messages = TTLCache(maxsize=10000, ttl=CONTACT_DUPLICATE_WINDOW)
+
+def raise_throttled(retry_after: int):
+    raise HTTPException(
+        status_code=429,
+        detail="Too many messages, please try again later",
+        headers={"Retry-After": str(retry_after)},
     )
 
+async def get_contact_owner_email(slug: str) -> str:
+    owner_email = contact_owner_cache.get(slug)
+    if owner_email:
+        return owner_email
+
+    portfolio = await db.portfolios.find_one({"slug": slug, "is_published": True}, {"user_id": 1})
     if not portfolio:
         raise HTTPException(status_code=404, detail="Portfolio not found")
 
-    # 2️⃣ Find portfolio owner
-    owner = await db.users.find_one(
-        {"user_id": portfolio["user_id"]}
-    )
-
+    owner = await db.users.find_one({"user_id": portfolio["user_id"]}, {"email": 1})
     if not owner:
         raise HTTPException(status_code=404, detail="Owner not found")
 
-    # 3️⃣ Send email to owner
-    await send_contact_email(
-        to_email=owner["email"],
-        sender_name=data.name,
-        sender_email=data.email,
-        message=data.message
+    contact_owner_cache.set(slug, owner["email"])
+    return owner["email"]
+
+@api_router.post("/public/contact/{slug}")
+async def send_contact(slug: str, data: ContactMessage, request: Request):
+
+    # 1️⃣ Cheapest checks first: sender IP, then repeats of the same message
+    decision = await contact_ip_limiter.hit(client_ip(request))
+    if not decision.allowed:
+        raise_throttled(decision.retry_after)
+
+    message_key = make_cache_key(slug, data.email.lower(), data.message.strip())
+    if message_key in recent_contact_messages:
+        rate_limit_metrics.record("contact_duplicate", "collapsed")
+        return {"message": "Message sent successfully"}
+
+    # 2️⃣ Find portfolio owner
+    owner_email = await get_contact_owner_email(slug)
+
+    decision = await contact_slug_limiter.hit(slug)
+    if not decision.allowed:
+        raise_throttled(decision.retry_after)
+
+    # 3️⃣ Queue email to owner
+    recent_contact_messages.set(message_key, True)
+    await email_outbox.enqueue(
+        contact_email(
+            to_email=owner_email,
+            sender_name=data.name,
+            sender_email=data.email,
+            message=data.message
+        ),
+        kind="contact",
     )
 
     return {"message": "Message sent successfully"}
@@ -537,11 +742,6 @@ async def send_contact(slug: str, data: ContactMessage):
 @api_router.get("/portfolios", response_model=List[Portfolio])
 async def get_portfolios(current_user: User = Depends(get_current_user)):
     portfolios = await db.portfolios.find({"user_id": current_user.user_id}, {"_id": 0}).to_list(100)
-    for p in portfolios:
-        if isinstance(p.get('created_at'), str):
-            p['created_at'] = datetime.fromisoformat(p['created_at'])
-        if isinstance(p.get('updated_at'), str):
-            p['updated_at'] = datetime.fromisoformat(p['updated_at'])
     return portfolios
 
 
@@ -573,20 +773,20 @@ async def create_portfolio(
     now = datetime.now(timezone.utc)
     
     # ================= IMAGE FILE =================
-    image_url = None
+    uploads = {}
+
+    try:
+        if profile_image:
+            image = await guard_upload(profile_image, UPLOAD_KINDS["profile_image"]["max_bytes"], IMAGE_TYPES, "Image")
+        if resume_file:
+            resume = await guard_upload(resume_file, UPLOAD_KINDS["resume"]["max_bytes"], PDF_TYPES, "Resume")
+    except UploadRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
 
     if profile_image:
-         # ✅ Read file
-        contents = await profile_image.read()
-
-        # ✅ Size check (1 MB max)
-        MAX_SIZE = 1 * 1024 * 1024  # 1 MB
-        if len(contents) > MAX_SIZE:
-            raise HTTPException(status_code=400, detail="Image too large. Max size is 1MB.")
-         
-        # ✅ Upload to Cloudinary (optionally limit dimensions too)
-        upload_result = cloudinary.uploader.upload(
-            contents,
+        # ✅ Upload (optionally limit dimensions too)
+        uploads["profile_image"] = storage.upload(
+            image.file,
             folder="portfolio_profiles",
             public_id=portfolio_id,
             overwrite=True,
@@ -597,34 +797,28 @@ async def create_portfolio(
             quality="auto",
             fetch_format="auto"
         )
-        image_url = upload_result.get("secure_url")
      
 # ================= RESUME FILE =================
-    resume_url = None
-
     if resume_file:
-    
-        # Check size (1MB max)
-        resume_file.file.seek(0, 2)
-        size = resume_file.file.tell()
-        MAX_SIZE = 1 * 1024 * 1024
-    
-        if size > MAX_SIZE:
-            raise HTTPException(status_code=400, detail="Resume too large. Max 1MB.")
-    
-        resume_file.file.seek(0)
-    
-        # Upload to Cloudinary
-        upload_result = cloudinary.uploader.upload(
-            resume_file.file,
+        uploads["resume_url"] = storage.upload(
+            resume.file,
             folder="portfolio_resumes",
             public_id=portfolio_id + "_resume.pdf",
             resource_type="raw",
             overwrite=True
         )
-    
-        # ✅ Just use secure_url
-        resume_url = upload_result["secure_url"]
+
+    # Both uploads run concurrently, off the event loop
+    urls = dict(zip(uploads, await asyncio.gather(*uploads.values())))
+
+    # Files uploaded directly by the browser (see /uploads/sign) arrive as URLs
+    for field in DIRECT_UPLOAD_FIELDS:
+        if field not in urls and portfolio_data.get(field):
+            await check_direct_upload(field, portfolio_data[field], current_user.user_id)
+            urls[field] = portfolio_data[field]
+
+    image_url = urls.get("profile_image")
+    resume_url = urls.get("resume_url")
 
     portfolio_doc = {
         **portfolio_data,
@@ -634,15 +828,12 @@ async def create_portfolio(
         "resume_url": resume_url,  # MUST be here
         "is_published": False,
         "slug": None,
-        "created_at": now.isoformat(),
-        "updated_at": now.isoformat()
+        "created_at": now,
+        "updated_at": now
     }
 
     await db.portfolios.insert_one(portfolio_doc)
 
-    portfolio_doc["created_at"] = now
-    portfolio_doc["updated_at"] = now
-
     return Portfolio(**portfolio_doc)
 
 
@@ -655,11 +846,6 @@ async def get_portfolio(portfolio_id: str, current_user: User = Depends(get_curr
     if not portfolio:
         raise HTTPException(status_code=404, detail="Portfolio not found")
     
-    if isinstance(portfolio.get('created_at'), str):
-        portfolio['created_at'] = datetime.fromisoformat(portfolio['created_at'])
-    if isinstance(portfolio.get('updated_at'), str):
-        portfolio['updated_at'] = datetime.fromisoformat(portfolio['updated_at'])
-    
     return Portfolio(**portfolio)
 
 @api_router.put("/portfolios/{portfolio_id}", response_model=Portfolio)
@@ -678,28 +864,32 @@ async def update_portfolio(
     
     # Update
     update_data = {k: v for k, v in portfolio_data.model_dump().items() if v is not None}
-    update_data["updated_at"] = datetime.now(timezone.utc).isoformat()
+    for field in DIRECT_UPLOAD_FIELDS:
+        if update_data.get(field) and update_data[field] != existing.get(field):
+            await check_direct_upload(field, update_data[field], current_user.user_id)
+    update_data["updated_at"] = datetime.now(timezone.utc)
     
     await db.portfolios.update_one(
         {"portfolio_id": portfolio_id},
         {"$set": update_data}
     )
+    public_portfolio_cache.invalidate(existing.get("slug"))
+    contact_owner_cache.pop(existing.get("slug"), None)
     
     updated = await db.portfolios.find_one({"portfolio_id": portfolio_id}, {"_id": 0})
-    if isinstance(updated.get('created_at'), str):
-        updated['created_at'] = datetime.fromisoformat(updated['created_at'])
-    if isinstance(updated.get('updated_at'), str):
-        updated['updated_at'] = datetime.fromisoformat(updated['updated_at'])
     
     return Portfolio(**updated)
 
 @api_router.delete("/portfolios/{portfolio_id}")
 async def delete_portfolio(portfolio_id: str, current_user: User = Depends(get_current_user)):
-    result = await db.portfolios.delete_one(
-        {"portfolio_id": portfolio_id, "user_id": current_user.user_id}
+    deleted = await db.portfolios.find_one_and_delete(
+        {"portfolio_id": portfolio_id, "user_id": current_user.user_id},
+        projection={"_id": 0, "slug": 1}
     )
-    if result.deleted_count == 0:
+    if deleted is None:
         raise HTTPException(status_code=404, detail="Portfolio not found")
+    public_portfolio_cache.invalidate(deleted.get("slug"))
+    contact_owner_cache.pop(deleted.get("slug"), None)
     return {"message": "Portfolio deleted"}
 
 @api_router.post("/portfolios/{portfolio_id}/publish")
@@ -717,123 +907,263 @@ async def publish_portfolio(portfolio_id: str, current_user: User = Depends(get_
     
     await db.portfolios.update_one(
         {"portfolio_id": portfolio_id},
-        {"$set": {"is_published": True, "slug": slug, "updated_at": datetime.now(timezone.utc).isoformat()}}
+        {"$set": {"is_published": True, "slug": slug, "updated_at": datetime.now(timezone.utc)}}
     )
+    # Republishing issues a new slug; the old link must stop resolving
+    public_portfolio_cache.invalidate(portfolio.get("slug"))
+    contact_owner_cache.pop(portfolio.get("slug"), None)
+    public_portfolio_cache.invalidate(slug)
     
     return {"message": "Portfolio published", "slug": slug}
 
+# ============ UPLOAD ROUTES ============
+
+# Portfolio field -> upload kind, for files the browser uploads directly
+DIRECT_UPLOAD_FIELDS = {"profile_image": "profile_image", "resume_url": "resume"}
+
+async def check_direct_upload(field: str, url: str, user_id: str) -> None:
+    kind = DIRECT_UPLOAD_FIELDS[field]
+    # Only files signed for this user, under their own path
+    if not storage.owns_url(url, kind, user_id):
+        raise HTTPException(status_code=400, detail=f"Invalid {field} URL")
+    try:
+        await storage.verify_asset(url, kind)
+    except InvalidAsset as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@api_router.post("/uploads/sign")
+async def sign_upload(data: UploadSignRequest, current_user: User = Depends(get_current_user)):
+    if data.kind not in UPLOAD_KINDS:
+        raise HTTPException(status_code=400, detail="Invalid upload kind")
+
+    public_id = direct_upload_id(current_user.user_id, uuid.uuid4().hex[:12])
+    if data.kind == "resume":
+        public_id += "_resume.pdf"
+    return storage.sign_upload(data.kind, public_id)
+
+@api_router.post("/uploads/local")
+async def local_upload(
+    file: UploadFile = File(...),
+    folder: str = Form(...),
+    public_id: str = Form(...),
+    timestamp: int = Form(...),
+    signature: str = Form(...)
+):
+    # Stand-in for Cloudinary's upload API when STORAGE_BACKEND=local
+    if not isinstance(storage, LocalStorage):
+        raise HTTPException(status_code=404, detail="Not found")
+
+    try:
+        storage.verify_upload(folder, public_id, timestamp, signature)
+    except InvalidUploadSignature as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    kind = next((k for k, spec in UPLOAD_KINDS.items() if spec["folder"] == folder), None)
+    if kind is None:
+        raise HTTPException(status_code=400, detail="Invalid upload folder")
+
+    try:
+        upload = await guard_upload(file, UPLOAD_KINDS[kind]["max_bytes"], UPLOAD_KINDS[kind]["mime_types"])
+        url = await storage.save(upload.file, folder, public_id)
+    except UploadRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return {"secure_url": url, "public_id": public_id}
+
 # ============ AI ROUTES ============
 
-@api_router.post("/ai/generate")
+AI_WRITER_SYSTEM_PROMPT = "You are a professional portfolio content writer. Create compelling, concise, and recruiter-friendly content."
+
+def build_generate_messages(request: AIGenerateRequest) -> List[Dict[str, str]]:
+    if request.type == "about":
+        prompt = f"Write a professional 'About Me' section for a portfolio based on this context: {request.context}. Make it 2-3 paragraphs, highlighting skills and passion."
+    elif request.type == "project":
+        prompt = f"Rewrite this project description professionally and concisely: {request.context}. Focus on impact and technologies used."
+    elif request.type == "skills":
+        prompt = f"Create a compelling skills summary based on these skills: {request.context}. Make it one paragraph highlighting expertise."
+    else:
+        raise HTTPException(status_code=400, detail="Invalid type")
+
+    return [
+        {"role": "system", "content": AI_WRITER_SYSTEM_PROMPT},
+        {"role": "user", "content": prompt}
+    ]
+
+@api_router.post("/ai/generate", dependencies=[Depends(plan_rate_limit("ai_generate"))])
 async def generate_ai_content(request: AIGenerateRequest, current_user: User = Depends(get_current_user)):
     if current_user.subscription_plan == "free":
         raise HTTPException(status_code=403, detail="AI features require Pro subscription")
 
-    try:
-        if request.type == "about":
-            prompt = f"Write a professional 'About Me' section for a portfolio based on this context: {request.context}. Make it 2-3 paragraphs, highlighting skills and passion."
-        elif request.type == "project":
-            prompt = f"Rewrite this project description professionally and concisely: {request.context}. Focus on impact and technologies used."
-        elif request.type == "skills":
-            prompt = f"Create a compelling skills summary based on these skills: {request.context}. Make it one paragraph highlighting expertise."
-        else:
-            raise HTTPException(status_code=400, detail="Invalid type")
-
-        completion = client_llm.chat.completions.create(
-            model=OPENROUTER_MODEL,
-            messages=[
-                {"role": "system", "content": "You are a professional portfolio content writer. Create compelling, concise, and recruiter-friendly content."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.7
-        )
+    messages = build_generate_messages(request)
+    cache_key = make_cache_key(llm_client.model, messages, 0.7)
+
+    if not request.fresh:
+        cached = await ai_generate_cache.get(cache_key)
+        if cached:
+            ai_generate_cache.record_saving("llm_calls")
+            return {"content": cached["content"], "cached": True}
 
-        content = completion.choices[0].message.content
-        return {"content": content}
+    try:
+        content = await llm_client.complete(messages, temperature=0.7)
+        await ai_generate_cache.set(cache_key, {"content": content})
+        return {"content": content, "cached": False}
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"AI generation failed: {str(e)}")
 
-@api_router.post("/ai/extract-resume")
-async def extract_resume(
-    file: UploadFile = File(...),
-    current_user: User = Depends(get_current_user)
-):
+@api_router.post("/ai/generate/stream", dependencies=[Depends(plan_rate_limit("ai_generate"))])
+async def stream_ai_content(request: AIGenerateRequest, current_user: User = Depends(get_current_user)):
     if current_user.subscription_plan == "free":
-        raise HTTPException(status_code=403, detail="Resume parsing requires Pro subscription")
+        raise HTTPException(status_code=403, detail="AI features require Pro subscription")
 
-    try:
-        content = await file.read()
-        pdf_file = io.BytesIO(content)
-        reader = PdfReader(pdf_file)
+    messages = build_generate_messages(request)
+    cache_key = make_cache_key(llm_client.model, messages, 0.7)
+    cached = None if request.fresh else await ai_generate_cache.get(cache_key)
 
-        text = ""
-        for page in reader.pages:
-            text += page.extract_text() or ""
+    # Server-sent events: one "data" event per chunk, then "done" (or "error")
+    async def events():
+        if cached:
+            ai_generate_cache.record_saving("llm_calls")
+            yield f"data: {json.dumps({'content': cached['content']})}\n\n"
+            yield f"event: done\ndata: {json.dumps({'cached': True})}\n\n"
+            return
 
-        prompt = f"""Extract from this resume:
+        try:
+            chunks = []
+            async for chunk in llm_client.stream(messages, temperature=0.7):
+                chunks.append(chunk)
+                yield f"data: {json.dumps({'content': chunk})}\n\n"
+            await ai_generate_cache.set(cache_key, {"content": "".join(chunks)})
+            yield f"event: done\ndata: {json.dumps({'cached': False})}\n\n"
+        except Exception as e:
+            yield f"event: error\ndata: {json.dumps({'detail': f'AI generation failed: {str(e)}'})}\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def resume_cache_keys(user_id: str, pdf_hash: str):
+    # Re-uploads of the same PDF by the same user are served from the cache
+    text_key = make_cache_key("resume_text", user_id, pdf_hash)
+    structured_key = make_cache_key("resume_structured", user_id, pdf_hash, llm_client.model)
+    return text_key, structured_key
+
+async def get_cached_resume_data(structured_key: str) -> Optional[Dict[str, Any]]:
+    cached = await resume_extract_cache.get(structured_key)
+    if not cached:
+        return None
+
+    resume_extract_cache.record_saving("pdf_parses")
+    resume_extract_cache.record_saving("llm_calls")
+    resume_extract_cache.record_saving("llm_prompt_chars", len(cached["extracted_text"]))
+    return {**cached, "cached": True}
+
+async def extract_resume_data(user_id: str, sha256: str, pdf_path: str, report_progress=None) -> Dict[str, Any]:
+    text_key, structured_key = resume_cache_keys(user_id, sha256)
+
+    cached = await get_cached_resume_data(structured_key)
+    if cached:
+        return cached
+
+    cached_text = await resume_extract_cache.get(text_key)
+    if cached_text:
+        resume_extract_cache.record_saving("pdf_parses")
+        text = cached_text["text"]
+    else:
+        if report_progress:
+            await report_progress("extracting_text")
+        extraction = await pdf_extract.extract_file(pdf_path)
+        text = extraction.text
+        await resume_extract_cache.set(text_key, {"text": text, "extraction": extraction.summary()})
+
+    prompt = f"""Extract from this resume:
 {text}
 
 Return JSON with: name, role, bio (2 sentences), skills (array), projects (array with title, description), education (array with degree, institution, year), experience (array with title, company, duration, description)."""
 
-        completion = client_llm.chat.completions.create(
-            model=OPENROUTER_MODEL,
-            messages=[
-                {"role": "system", "content": "Extract structured portfolio data from resume text. Return JSON format."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.2
-        )
+    if report_progress:
+        await report_progress("structuring")
+    result = await llm_client.complete(
+        [
+            {"role": "system", "content": "Extract structured portfolio data from resume text. Return JSON format."},
+            {"role": "user", "content": prompt}
+        ],
+        temperature=0.2
+    )
 
-        result = completion.choices[0].message.content
+    extracted = {
+        "extracted_text": text,
+        "structured_data": result
+    }
+    await resume_extract_cache.set(structured_key, extracted)
+    return {**extracted, "cached": False}
+
+async def process_resume_job(job: Dict[str, Any], report_progress) -> Dict[str, Any]:
+    sha256 = job.get("pdf_sha256") or hashlib.sha256(job["pdf"]).hexdigest()
+    async with resume_job_queue.pdf_path(job) as path:
+        return await extract_resume_data(job["user_id"], sha256, path, report_progress)
+
+resume_job_queue = ResumeJobQueue(
+    db.resume_jobs,
+    process_resume_job,
+    AsyncIOMotorGridFSBucket(db, bucket_name="resume_pdfs"),
+)
 
-        return {
-            "extracted_text": text,
-            "structured_data": result
-        }
+@api_router.post(
+    "/ai/extract-resume",
+    status_code=202,
+    dependencies=[Depends(plan_rate_limit("ai_extract"))],
+)
+async def extract_resume(
+    file: UploadFile = File(...),
+    current_user: User = Depends(get_current_user)
+):
+    if current_user.subscription_plan == "free":
+        raise HTTPException(status_code=403, detail="Resume parsing requires Pro subscription")
 
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Resume extraction failed: {str(e)}")
+    try:
+        pdf = await guard_upload(file, pdf_extract.PDF_MAX_BYTES, PDF_TYPES, "Resume")
+    except UploadRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+
+    # Known PDFs complete immediately; everything else goes to the workers
+    _, structured_key = resume_cache_keys(current_user.user_id, pdf.sha256)
+    cached = await get_cached_resume_data(structured_key)
+    if cached:
+        job = await resume_job_queue.insert_completed(current_user.user_id, cached)
+    else:
+        # Streamed from the spooled upload into GridFS, never held in memory whole
+        job = await resume_job_queue.enqueue(
+            current_user.user_id, pdf.file, filename=file.filename, size=pdf.size, pdf_sha256=pdf.sha256,
+        )
+
+    return {"job_id": job["job_id"], "status": job["status"], "progress": job["progress"]}
+
+@api_router.get("/ai/jobs/{job_id}")
+async def get_resume_job(job_id: str, current_user: User = Depends(get_current_user)):
+    job = await resume_job_queue.get(job_id, current_user.user_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
 
 
 
 # ============ GITHUB ROUTES ============
 
+github_importer = GitHubImporter(outbound_http, token=os.getenv("GITHUB_TOKEN"))
+
 @api_router.get("/github/repos/{username}")
 async def get_github_repos(username: str, current_user: User = Depends(get_current_user)):
     try:
-        headers = {
-            "Accept": "application/vnd.github+json",
-            "User-Agent": "PortfolioAI",
-        }
-
-        github_token = os.getenv("GITHUB_TOKEN")
-        if github_token:
-            headers["Authorization"] = f"Bearer {github_token}"
-
-        async with httpx.AsyncClient() as http_client:
-            resp = await http_client.get(
-                f"https://api.github.com/users/{username}/repos",
-                params={"sort": "updated", "per_page": 10},
-                headers=headers
-            )
-            resp.raise_for_status()
-            repos = resp.json()
-            
-            # Format for portfolio
-            projects = []
-            for repo in repos:
-                if not repo.get('fork'):  # Skip forked repos
-                    projects.append({
-                        "title": repo["name"],
-                        "description": repo["description"] or "No description",
-                        "tech_stack": [repo.get("language")] if repo.get("language") else [],
-                        "link": repo["html_url"],
-                        "github_link": repo["html_url"],
-                    })
-            
-            return {"projects": projects}
+        projects = await github_importer.import_projects(username)
+        return {"projects": projects}
 
+    except GitHubRateLimited as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Failed to fetch GitHub repos: {str(e)}")
 
@@ -855,7 +1185,7 @@ async def razorpay_webhook(request: Request):
 
         data = json.loads(payload)
 
-        print("📩 Webhook received:", data.get("event"))
+        logger.info("Razorpay webhook received: %s", data.get("event"))
 
         if data.get("event") == "payment.captured":
             payment = data["payload"]["payment"]["entity"]
@@ -865,19 +1195,18 @@ async def razorpay_webhook(request: Request):
             order = razorpay_client.order.fetch(order_id)
             user_id = order.get("notes", {}).get("user_id")
 
-            print("👤 User ID from order notes:", user_id)
-
             if user_id:
                 result = await db.users.update_one(
                     {"user_id": user_id},
                     {"$set": {"subscription_plan": "pro"}}
                 )
-                print("📝 DB update result:", result.raw_result)
+                await invalidate_user_auth(user_id)
+                logger.info("Upgraded user %s to pro (matched %s)", user_id, result.matched_count)
 
         return {"status": "ok"}
 
     except Exception as e:
-        print("❌ Webhook verification failed:", str(e))
+        logger.warning("Razorpay webhook rejected: %s", e)
         raise HTTPException(status_code=400, detail="Invalid webhook")
     
 
@@ -893,7 +1222,7 @@ async def create_subscription_order(order_data: RazorpayOrder, current_user: Use
             }
         })
 
-        print("✅ Order created:", razor_order.get("id"))
+        logger.info("Razorpay order %s created for user %s", razor_order.get("id"), current_user.user_id)
         return razor_order
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Order creation failed: {str(e)}")
@@ -912,6 +1241,7 @@ async def verify_subscription_payment(verify_data: RazorpayVerify, current_user:
             {"user_id": current_user.user_id},
             {"$set": {"subscription_plan": "pro"}}
         )
+        await invalidate_user_auth(current_user.user_id)
         
         return {"message": "Payment verified, subscription upgraded to Pro"}
     except Exception as e:
@@ -922,28 +1252,71 @@ async def verify_subscription_payment(verify_data: RazorpayVerify, current_user:
 async def get_subscription_status(current_user: User = Depends(get_current_user)):
     return {"plan": current_user.subscription_plan}
 
+# ============ ADMIN ROUTES ============
+
+@api_router.get("/admin/diagnostics/loop")
+async def get_loop_report(admin: User = Depends(require_admin)):
+    if not loop_monitor.running:
+        raise HTTPException(status_code=404, detail="Loop monitor is off (set LOOP_MONITOR=1)")
+    return loop_monitor.report()
+
+@api_router.get("/admin/diagnostics/profile")
+async def get_cpu_profile(seconds: float = 10, hz: int = 100, by_route: bool = False,
+                          admin: User = Depends(require_admin)):
+    """Samples the process for ``seconds`` and returns collapsed stacks for a flamegraph."""
+    if not 0 < seconds <= sampling_profiler.max_seconds:
+        raise HTTPException(status_code=400, detail=f"seconds must be between 0 and {sampling_profiler.max_seconds}")
+    if not 1 <= hz <= sampling_profiler.max_hz:
+        raise HTTPException(status_code=400, detail=f"hz must be between 1 and {sampling_profiler.max_hz}")
+    try:
+        collapsed = await sampling_profiler.profile(seconds, hz, by_route)
+    except ProfilerBusy:
+        raise HTTPException(status_code=409, detail="A profile is already running")
+    filename = f"profile-{datetime.now(timezone.utc):%Y%m%dT%H%M%S}.collapsed"
+    return PlainTextResponse(collapsed, headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
 # ============ PUBLIC ROUTES ============
 
 @api_router.get("/public/portfolio/{slug}")
-async def get_public_portfolio(slug: str):
-    portfolio = await db.portfolios.find_one(
-        {"slug": slug, "is_published": True},
-        {"_id": 0, "user_id": 0}
-    )
-    if not portfolio:
-        raise HTTPException(status_code=404, detail="Portfolio not found")
-    
-    if isinstance(portfolio.get('created_at'), str):
-        portfolio['created_at'] = datetime.fromisoformat(portfolio['created_at'])
-    if isinstance(portfolio.get('updated_at'), str):
-        portfolio['updated_at'] = datetime.fromisoformat(portfolio['updated_at'])
-    
-    return portfolio
+async def get_public_portfolio(slug: str, request: Request):
+    cached = public_portfolio_cache.get(slug)
+    if cached is None:
+        portfolio = await db.portfolios.find_one(
+            {"slug": slug, "is_published": True},
+            {"_id": 0, "user_id": 0}
+        )
+        if not portfolio:
+            raise HTTPException(status_code=404, detail="Portfolio not found")
+        cached = public_portfolio_cache.put(slug, portfolio)
+
+    body, etag = cached
+    headers = {"ETag": etag, "Cache-Control": PUBLIC_CACHE_CONTROL}
+    if etag_matches(request.headers.get("If-None-Match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    return Response(content=body, media_type="application/json", headers=headers)
 
 # ============ APP SETUP ============
 
 app.include_router(api_router)
 
+if isinstance(storage, LocalStorage):
+    storage.directory.mkdir(parents=True, exist_ok=True)
+    app.mount("/uploads", StaticFiles(directory=storage.directory), name="uploads")
+
+app.add_middleware(RateLimitHeadersMiddleware)
+
+# Reject oversized uploads while they stream in, before multipart parsing buffers them
+MULTIPART_OVERHEAD = 64 * 1024
+app.add_middleware(
+    BodySizeLimitMiddleware,
+    limits={
+        ("POST", "/api/portfolios"): UPLOAD_KINDS["profile_image"]["max_bytes"] + UPLOAD_KINDS["resume"]["max_bytes"] + MULTIPART_OVERHEAD,
+        ("POST", "/api/ai/extract-resume"): pdf_extract.PDF_MAX_BYTES + MULTIPART_OVERHEAD,
+        ("POST", "/api/uploads/local"): max(spec["max_bytes"] for spec in UPLOAD_KINDS.values()) + MULTIPART_OVERHEAD,
+    },
+)
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
@@ -957,6 +1330,35 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+app.add_middleware(
+    TracingMiddleware,
+    tracer=tracer,
+    route_name=lambda scope: metrics.route_template(app.router, scope),
+    exclude=("/metrics", "/health"),
+)
+
+# Outermost, so the timings include every other middleware
+app.add_middleware(MetricsMiddleware, router=app.router, exclude=("/metrics", "/health"))
+
+# Internal counters, scraped from /metrics rather than exposed on /health
+for component, stats in {
+    "session_cache": session_cache.stats,
+    "ai_generate_cache": ai_generate_cache.stats,
+    "resume_extract_cache": resume_extract_cache.stats,
+    "outbound_http": outbound_http.stats,
+    "github_import": github_importer.stats,
+    "public_portfolio_cache": public_portfolio_cache.stats,
+    "email_outbox": email_outbox.stats,
+    "rate_limits": rate_limit_metrics.stats,
+    "contact_owner_cache": contact_owner_cache.stats,
+    "token_denylist": token_denylist.stats,
+    "sessions": session_lifecycle.stats,
+    "event_loop": loop_monitor.stats,
+    "profiler": sampling_profiler.stats,
+    "tracing": tracer.stats,
+}.items():
+    metrics.component_stats.add(component, stats)
+
 
 logging.basicConfig(
     level=logging.INFO,
@@ -964,6 +1366,66 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@app.on_event("startup")
+async def ensure_db_indexes():
+    await db_indexes.bootstrap(db)
+
+@app.on_event("startup")
+async def start_outbound_http():
+    await outbound_http.start()
+
+@app.on_event("startup")
+async def ensure_cache_indexes():
+    await ai_generate_cache.ensure_indexes()
+    await resume_extract_cache.ensure_indexes()
+    if isinstance(rate_limit_store, MongoBucketStore):
+        await rate_limit_store.ensure_indexes()
+    if isinstance(plan_rate_limiter.store, MongoWindowStore):
+        await plan_rate_limiter.store.ensure_indexes()
+
+@app.on_event("startup")
+async def start_resume_job_workers():
+    await resume_job_queue.ensure_indexes()
+    resume_job_queue.start()
+
+@app.on_event("startup")
+async def start_email_outbox():
+    await email_outbox.ensure_indexes()
+    email_outbox.start()
+
+@app.on_event("startup")
+async def start_token_denylist():
+    if AUTH_MODE == "token":
+        if not access_tokens.secret:
+            raise RuntimeError("AUTH_MODE=token requires AUTH_TOKEN_SECRET")
+        await token_denylist.ensure_indexes()
+        await token_denylist.reload()
+        token_denylist.start()
+
+@app.on_event("startup")
+async def start_session_reaper():
+    session_lifecycle.start()
+
+@app.on_event("startup")
+async def start_tracing():
+    if tracer.enabled:
+        tracer.start()
+
+@app.on_event("startup")
+async def start_loop_monitor():
+    if LOOP_MONITOR:
+        loop_monitor.start()
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
-    client.close()
\ No newline at end of file
+    client.close()
+    password_hasher.shutdown()
+    await resume_job_queue.stop()
+    await email_outbox.stop()
+    await token_denylist.stop()
+    await session_lifecycle.stop()
+    await loop_monitor.stop()
+    await tracer.stop()
+    pdf_extract.shutdown()
+    await llm_client.aclose()
+    await outbound_http.aclose()
\ No newline at end of file
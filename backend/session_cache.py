@@ -0,0 +1,77 @@
+import os
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional, Set, Tuple
+
+from cache_utils import TTLCache
+
+SESSION_CACHE_SIZE = int(os.environ.get("SESSION_CACHE_SIZE", "10000"))
+SESSION_CACHE_TTL = float(os.environ.get("SESSION_CACHE_TTL", "60"))
+
+
+class SessionCache:
+    """Maps session tokens to the resolved user and the session expiry.
+
+    Entries never outlive the session itself. Every token is also indexed
+    by user_id so that a change to the user (plan upgrade, profile update)
+    drops all of that user's cached sessions at once.
+    """
+
+    def __init__(self, maxsize: int = SESSION_CACHE_SIZE, ttl: float = SESSION_CACHE_TTL):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._tokens_by_user: Dict[str, Set[str]] = {}
+        self.invalidations = 0
+
+    def get(self, session_token: str) -> Optional[Tuple[Any, datetime]]:
+        entry = self._cache.get(session_token)
+        if entry is None:
+            return None
+
+        user, expires_at = entry
+        if expires_at < datetime.now(timezone.utc):
+            self.invalidate(session_token)
+            return None
+        return entry
+
+    def set(self, session_token: str, user: Any, expires_at: datetime) -> None:
+        remaining = (expires_at - datetime.now(timezone.utc)).total_seconds()
+        self._cache.set(session_token, (user, expires_at), ttl=min(self._cache.ttl, remaining))
+        if session_token in self._cache:
+            self._tokens_by_user.setdefault(user.user_id, set()).add(session_token)
+        if len(self._tokens_by_user) > 2 * self._cache.maxsize:
+            self._prune_index()
+
+    def invalidate(self, session_token: str) -> None:
+        entry = self._cache.pop(session_token)
+        if entry is None:
+            return
+
+        self.invalidations += 1
+        tokens = self._tokens_by_user.get(entry[0].user_id)
+        if tokens is not None:
+            tokens.discard(session_token)
+            if not tokens:
+                del self._tokens_by_user[entry[0].user_id]
+
+    def invalidate_user(self, user_id: str) -> None:
+        for session_token in self._tokens_by_user.pop(user_id, set()):
+            if self._cache.pop(session_token) is not None:
+                self.invalidations += 1
+
+    def clear(self) -> None:
+        self._cache.clear()
+        self._tokens_by_user.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self._cache.stats(), "invalidations": self.invalidations}
+
+    def _prune_index(self) -> None:
+        # Tokens evicted by the LRU leave stale entries in the user index
+        for user_id in list(self._tokens_by_user):
+            live = {t for t in self._tokens_by_user[user_id] if t in self._cache}
+            if live:
+                self._tokens_by_user[user_id] = live
+            else:
+                del self._tokens_by_user[user_id]
+
+
+session_cache = SessionCache()
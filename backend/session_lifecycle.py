@@ -0,0 +1,124 @@
+import asyncio
+import logging
+import os
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from date_utils import as_datetime
+
+logger = logging.getLogger(__name__)
+
+SESSION_MAX_PER_USER = int(os.environ.get("SESSION_MAX_PER_USER", "10"))
+SESSION_REAPER_INTERVAL = float(os.environ.get("SESSION_REAPER_INTERVAL", "3600"))
+SESSION_REAPER_BATCH_SIZE = int(os.environ.get("SESSION_REAPER_BATCH_SIZE", "1000"))
+
+EvictCallback = Callable[[List[str]], Awaitable[None]]
+
+
+class SessionLifecycle:
+    """Keeps user_sessions bounded.
+
+    The TTL index on expires_at removes expired sessions in the background;
+    the reaper also catches the ones it cannot (legacy string dates) and
+    measures the table. ``enforce_cap`` runs after each login and evicts
+    a user's oldest sessions beyond ``max_per_user``. ``on_evict`` receives
+    the evicted tokens so caches and access tokens can be dropped too.
+    """
+
+    def __init__(
+        self,
+        collection,
+        on_evict: Optional[EvictCallback] = None,
+        max_per_user: int = SESSION_MAX_PER_USER,
+        interval: float = SESSION_REAPER_INTERVAL,
+        batch_size: int = SESSION_REAPER_BATCH_SIZE,
+    ):
+        self.collection = collection
+        self.on_evict = on_evict
+        self.max_per_user = max_per_user
+        self.interval = interval
+        self.batch_size = batch_size
+        self._task: Optional[asyncio.Task] = None
+        self.created = 0
+        self.evicted = 0
+        self.reaped = 0
+        self.size: Optional[int] = None
+        self.last_reap_at: Optional[datetime] = None
+
+    def record_created(self) -> None:
+        self.created += 1
+
+    async def enforce_cap(self, user_id: str) -> int:
+        if self.max_per_user <= 0:
+            return 0
+        extra = await self.collection.find({"user_id": user_id}, {"_id": 1, "session_token": 1}) \
+            .sort("created_at", -1).skip(self.max_per_user).to_list(None)
+        if not extra:
+            return 0
+
+        await self.collection.delete_many({"_id": {"$in": [doc["_id"] for doc in extra]}})
+        self.evicted += len(extra)
+        if self.on_evict:
+            await self.on_evict([doc["session_token"] for doc in extra])
+        return len(extra)
+
+    async def _delete_batches(self, query: Dict[str, Any], expired: Callable[[Dict[str, Any]], bool]) -> int:
+        deleted = 0
+        last_id = None
+        while True:
+            batch_query = {**query, "_id": {"$gt": last_id}} if last_id is not None else query
+            docs = await self.collection.find(batch_query, {"_id": 1, "expires_at": 1}) \
+                .sort("_id", 1).limit(self.batch_size).to_list(self.batch_size)
+            if not docs:
+                return deleted
+            last_id = docs[-1]["_id"]
+            ids = [doc["_id"] for doc in docs if expired(doc)]
+            if ids:
+                result = await self.collection.delete_many({"_id": {"$in": ids}})
+                deleted += result.deleted_count
+            # Yield between batches so a large backlog doesn't hog the loop
+            await asyncio.sleep(0)
+
+    async def reap(self) -> int:
+        now = datetime.now(timezone.utc)
+        deleted = await self._delete_batches({"expires_at": {"$lt": now}}, lambda doc: True)
+        # String dates are invisible to the TTL index and to the $lt above
+        deleted += await self._delete_batches(
+            {"expires_at": {"$type": "string"}},
+            lambda doc: as_datetime(doc["expires_at"]) < now,
+        )
+        self.reaped += deleted
+        self.size = await self.collection.estimated_document_count()
+        self.last_reap_at = now
+        if deleted:
+            logger.info("Reaped %s expired sessions, %s remain", deleted, self.size)
+        return deleted
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run(), name="session-reaper")
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "size": self.size,
+            "created": self.created,
+            "evicted": self.evicted,
+            "reaped": self.reaped,
+            "max_per_user": self.max_per_user,
+            "last_reap_at": self.last_reap_at.isoformat() if self.last_reap_at else None,
+        }
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.reap()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Session reaper failed")
+            await asyncio.sleep(self.interval)
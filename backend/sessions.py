@@ -0,0 +1,51 @@
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional, Tuple
+
+
+def live_session_filter(session_token: str) -> Dict[str, Any]:
+    """Unexpired sessions only; legacy string expiries are left to the caller's check."""
+    return {
+        "session_token": session_token,
+        "$or": [
+            {"expires_at": {"$gt": datetime.now(timezone.utc)}},
+            {"expires_at": {"$type": "string"}},
+        ],
+    }
+
+
+def session_user_pipeline(session_token: str):
+    """Session and its user in one round trip; the join uses the users.user_id index."""
+    return [
+        {"$match": live_session_filter(session_token)},
+        {"$limit": 1},
+        {"$lookup": {
+            "from": "users",
+            "localField": "user_id",
+            "foreignField": "user_id",
+            "as": "user",
+        }},
+        {"$project": {
+            "_id": 0,
+            "expires_at": 1,
+            "user": {"$arrayElemAt": ["$user", 0]},
+        }},
+        {"$project": {"user._id": 0}},
+    ]
+
+
+async def find_session_with_user(db, session_token: str) -> Optional[Tuple[Dict[str, Any], Optional[Dict[str, Any]]]]:
+    """Returns (session, user or None), or None if there is no such live session."""
+    docs = await db.user_sessions.aggregate(session_user_pipeline(session_token)).to_list(1)
+    if not docs:
+        return None
+    doc = docs[0]
+    return doc, doc.pop("user", None)
+
+
+async def find_session_then_user(db, session_token: str) -> Optional[Tuple[Dict[str, Any], Optional[Dict[str, Any]]]]:
+    """The two-query equivalent of find_session_with_user, kept for benchmarks."""
+    session_doc = await db.user_sessions.find_one(live_session_filter(session_token), {"_id": 0})
+    if not session_doc:
+        return None
+    user_doc = await db.users.find_one({"user_id": session_doc["user_id"]}, {"_id": 0})
+    return session_doc, user_doc
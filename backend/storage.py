@@ -0,0 +1,228 @@
+import asyncio
+import hashlib
+import hmac
+import os
+import secrets
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+import cloudinary
+import cloudinary.uploader
+import cloudinary.utils
+
+from metrics import track_call
+from http_client import outbound_http
+from upload_guard import IMAGE_TYPES, PDF_TYPES, sniff_mime_type
+
+STORAGE_BACKEND = os.environ.get("STORAGE_BACKEND", "cloudinary")
+LOCAL_STORAGE_DIR = Path(os.environ.get("LOCAL_STORAGE_DIR", Path(__file__).parent / "uploads"))
+LOCAL_STORAGE_URL = os.environ.get("LOCAL_STORAGE_URL", "http://localhost:8001/uploads").rstrip("/")
+LOCAL_UPLOAD_URL = os.environ.get("LOCAL_UPLOAD_URL", "http://localhost:8001/api/uploads/local")
+SIGNED_UPLOAD_TTL = int(os.environ.get("SIGNED_UPLOAD_TTL", "3600"))
+
+# What the browser may upload directly, and where it goes
+UPLOAD_KINDS = {
+    "profile_image": {
+        "folder": "portfolio_profiles",
+        "resource_type": "image",
+        "transformation": "c_limit,h_1024,w_1024,q_auto",
+        "allowed_formats": "jpg,png,gif,webp",
+        "max_bytes": 1 * 1024 * 1024,
+        "mime_types": IMAGE_TYPES,
+    },
+    "resume": {
+        "folder": "portfolio_resumes",
+        "resource_type": "raw",
+        "allowed_formats": "pdf",
+        "max_bytes": 1 * 1024 * 1024,
+        "mime_types": PDF_TYPES,
+    },
+}
+
+
+# Enough of a file to recognise its type
+SNIFF_BYTES = 64
+
+
+class InvalidUploadSignature(Exception):
+    pass
+
+
+class InvalidAsset(Exception):
+    pass
+
+
+def direct_upload_id(user_id: str, name: str) -> str:
+    """Public id for a browser upload; the user prefix is what ``owns_url`` checks."""
+    return f"{user_id}/{name}"
+
+
+def check_asset(kind: str, head: bytes, size: int) -> None:
+    spec = UPLOAD_KINDS[kind]
+    if size > spec["max_bytes"]:
+        raise InvalidAsset(f"File too large (max {spec['max_bytes'] // (1024 * 1024)}MB)")
+    if sniff_mime_type(head) not in spec["mime_types"]:
+        raise InvalidAsset("Unsupported file type")
+
+
+class CloudinaryStorage:
+    """Cloudinary uploads, run on a worker thread so they don't block the loop."""
+
+    def __init__(self):
+        self.config = cloudinary.config()
+
+    async def upload(self, file: Any, **options: Any) -> str:
+        with track_call("cloudinary", options.get("resource_type", "upload")):
+            result = await asyncio.to_thread(cloudinary.uploader.upload, file, **options)
+        return result["secure_url"]
+
+    def sign_upload(self, kind: str, public_id: str) -> Dict[str, Any]:
+        spec = UPLOAD_KINDS[kind]
+        params = {
+            "folder": spec["folder"],
+            "public_id": public_id,
+            "overwrite": "true",
+            "timestamp": int(time.time()),
+        }
+        if "transformation" in spec:
+            params["transformation"] = spec["transformation"]
+        if "allowed_formats" in spec:
+            params["allowed_formats"] = spec["allowed_formats"]
+        params["signature"] = cloudinary.utils.api_sign_request(params, self.config.api_secret)
+        params["api_key"] = self.config.api_key
+        return {
+            "upload_url": f"https://api.cloudinary.com/v1_1/{self.config.cloud_name}/{spec['resource_type']}/upload",
+            "fields": params,
+        }
+
+    def _parse_url(self, url: str) -> Optional[Tuple[str, str]]:
+        """(resource_type, path) of a delivery URL in this account."""
+        prefix = f"https://res.cloudinary.com/{self.config.cloud_name}/"
+        if not url.startswith(prefix):
+            return None
+        # {resource_type}/upload/[v{version}/]{folder}/{public_id}
+        parts = url[len(prefix):].split("/")
+        if len(parts) < 4 or parts[1] != "upload":
+            return None
+        path = parts[3:] if parts[2][:1] == "v" and parts[2][1:].isdigit() else parts[2:]
+        return parts[0], "/".join(path)
+
+    def owns_url(self, url: str, kind: str, user_id: str) -> bool:
+        spec = UPLOAD_KINDS[kind]
+        parsed = self._parse_url(url)
+        return (
+            parsed is not None
+            and ".." not in parsed[1]
+            and parsed[0] == spec["resource_type"]
+            and parsed[1].startswith(f"{spec['folder']}/{user_id}/")
+        )
+
+    async def verify_asset(self, url: str, kind: str) -> None:
+        """Checks the size and type of a file the browser uploaded directly.
+
+        Signed uploads can't cap the file size, so oversized or mislabelled
+        files are caught (and deleted) here, before a portfolio references them.
+        """
+        response = await outbound_http.get(url, headers={"Range": f"bytes=0-{SNIFF_BYTES - 1}"})
+        if response.status_code not in (200, 206):
+            raise InvalidAsset("Uploaded file not found")
+        content_range = response.headers.get("content-range", "")
+        total = content_range.rsplit("/", 1)[-1]
+        size = int(total) if total.isdigit() else len(response.content)
+        try:
+            check_asset(kind, response.content[:SNIFF_BYTES], size)
+        except InvalidAsset:
+            await self.delete(url)
+            raise
+
+    async def delete(self, url: str) -> None:
+        resource_type, path = self._parse_url(url)
+        # Image public ids exclude the extension; raw ones include it
+        public_id = path.rsplit(".", 1)[0] if resource_type != "raw" else path
+        await asyncio.to_thread(cloudinary.uploader.destroy, public_id, resource_type=resource_type, invalidate=True)
+
+
+class LocalStorage:
+    """Filesystem stand-in for Cloudinary, for offline development and tests.
+
+    Signed uploads are POSTed to the API's /api/uploads/local route, which
+    checks the HMAC signature before calling ``save``.
+    """
+
+    def __init__(self, directory: Path = LOCAL_STORAGE_DIR, base_url: str = LOCAL_STORAGE_URL,
+                 upload_url: str = LOCAL_UPLOAD_URL):
+        self.directory = directory
+        self.base_url = base_url
+        self.upload_url = upload_url
+        self.secret = os.environ.get("LOCAL_STORAGE_SECRET") or secrets.token_hex(16)
+
+    def _path(self, folder: str, public_id: str) -> Path:
+        path = (self.directory / folder / public_id).resolve()
+        if self.directory.resolve() not in path.parents:
+            raise ValueError("Invalid upload path")
+        return path
+
+    def _write(self, path: Path, file: Any) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        data = file if isinstance(file, bytes) else file.read()
+        path.write_bytes(data)
+
+    async def save(self, file: Any, folder: str, public_id: str) -> str:
+        with track_call("local_storage", "save"):
+            await asyncio.to_thread(self._write, self._path(folder, public_id), file)
+        return f"{self.base_url}/{folder}/{public_id}"
+
+    async def upload(self, file: Any, folder: str, public_id: str, **options: Any) -> str:
+        return await self.save(file, folder, public_id)
+
+    def _signature(self, params: Dict[str, Any]) -> str:
+        payload = "&".join(f"{k}={params[k]}" for k in sorted(params))
+        return hmac.new(self.secret.encode(), payload.encode(), hashlib.sha256).hexdigest()
+
+    def sign_upload(self, kind: str, public_id: str) -> Dict[str, Any]:
+        params = {
+            "folder": UPLOAD_KINDS[kind]["folder"],
+            "public_id": public_id,
+            "timestamp": int(time.time()),
+        }
+        return {
+            "upload_url": self.upload_url,
+            "fields": {**params, "signature": self._signature(params)},
+        }
+
+    def verify_upload(self, folder: str, public_id: str, timestamp: int, signature: str) -> None:
+        expected = self._signature({"folder": folder, "public_id": public_id, "timestamp": timestamp})
+        if not hmac.compare_digest(expected, signature):
+            raise InvalidUploadSignature("Invalid upload signature")
+        if timestamp + SIGNED_UPLOAD_TTL < time.time():
+            raise InvalidUploadSignature("Upload signature expired")
+
+    def owns_url(self, url: str, kind: str, user_id: str) -> bool:
+        return url.startswith(f"{self.base_url}/{UPLOAD_KINDS[kind]['folder']}/{user_id}/") and ".." not in url
+
+    def _read_head(self, path: Path) -> Tuple[bytes, int]:
+        with open(path, "rb") as f:
+            return f.read(SNIFF_BYTES), path.stat().st_size
+
+    async def verify_asset(self, url: str, kind: str) -> None:
+        folder, _, public_id = url[len(self.base_url) + 1:].partition("/")
+        try:
+            path = self._path(folder, public_id)
+            head, size = await asyncio.to_thread(self._read_head, path)
+        except (OSError, ValueError):
+            raise InvalidAsset("Uploaded file not found")
+        try:
+            check_asset(kind, head, size)
+        except InvalidAsset:
+            await asyncio.to_thread(path.unlink, True)
+            raise
+
+
+def create_storage():
+    if STORAGE_BACKEND == "local":
+        return LocalStorage()
+    return CloudinaryStorage()
+
+
+storage = create_storage()
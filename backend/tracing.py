@@ -0,0 +1,358 @@
+"""Request tracing with OpenTelemetry-compatible spans.
+
+Each sampled HTTP request gets a server span; Mongo commands, outbound
+HTTP requests, LLM completions, uploads and email sends made while it runs
+become child spans. Spans are exported in batches as OTLP/JSON, either
+POSTed to a collector (TRACE_EXPORTER=otlp) or appended to a file, one
+export request per line (TRACE_EXPORTER=file, readable by the collector's
+otlpjsonfile receiver).
+"""
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Deque, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import httpx
+from pymongo import monitoring
+
+logger = logging.getLogger(__name__)
+
+TRACING = os.environ.get("TRACING", "").lower() in ("1", "true", "yes")
+TRACE_SAMPLE_RATE = float(os.environ.get("TRACE_SAMPLE_RATE", "1.0"))
+TRACE_EXPORTER = os.environ.get("TRACE_EXPORTER", "file")
+TRACE_FILE = os.environ.get("TRACE_FILE", "traces.jsonl")
+TRACE_OTLP_ENDPOINT = os.environ.get("TRACE_OTLP_ENDPOINT", "http://localhost:4318/v1/traces")
+TRACE_SERVICE_NAME = os.environ.get("TRACE_SERVICE_NAME", "portfolio-backend")
+TRACE_EXPORT_INTERVAL = float(os.environ.get("TRACE_EXPORT_INTERVAL", "5"))
+TRACE_EXPORT_BATCH = int(os.environ.get("TRACE_EXPORT_BATCH", "512"))
+TRACE_MAX_QUEUE = int(os.environ.get("TRACE_MAX_QUEUE", "10000"))
+
+# OTLP span kinds
+INTERNAL, SERVER, CLIENT = 1, 2, 3
+
+
+def parse_traceparent(value: Optional[str]) -> Optional[Tuple[str, str, bool]]:
+    """(trace_id, span_id, sampled) from a W3C traceparent header, or None."""
+    parts = (value or "").strip().split("-")
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    try:
+        sampled = bool(int(parts[3], 16) & 1)
+    except ValueError:
+        return None
+    return parts[1], parts[2], sampled
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _otlp_attributes(attributes: Dict[str, Any]) -> List[Dict[str, Any]]:
+    return [{"key": key, "value": _otlp_value(value)} for key, value in attributes.items() if value is not None]
+
+
+class Span:
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "kind", "attributes", "links",
+                 "start_ns", "end_ns", "error")
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str] = None, kind: int = INTERNAL,
+                 attributes: Optional[Dict[str, Any]] = None, links: Optional[List[Tuple[str, str]]] = None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.kind = kind
+        self.attributes = attributes or {}
+        self.links = links or []
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.error: Optional[str] = None
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def set_error(self, message: str) -> None:
+        self.error = message
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def to_otlp(self) -> Dict[str, Any]:
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": _otlp_attributes(self.attributes),
+            "status": {"code": 2, "message": self.error} if self.error else {"code": 1},
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        if self.links:
+            span["links"] = [{"traceId": trace_id, "spanId": span_id} for trace_id, span_id in self.links]
+        return span
+
+
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+class FileExporter:
+    def __init__(self, path: str = TRACE_FILE):
+        self.path = path
+
+    def _write(self, line: str) -> None:
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+    async def export(self, payload: Dict[str, Any]) -> None:
+        await asyncio.to_thread(self._write, json.dumps(payload, separators=(",", ":")))
+
+    async def aclose(self) -> None:
+        pass
+
+
+class OTLPExporter:
+    def __init__(self, endpoint: str = TRACE_OTLP_ENDPOINT):
+        self.endpoint = endpoint
+        self._client = httpx.AsyncClient(timeout=10)
+
+    async def export(self, payload: Dict[str, Any]) -> None:
+        response = await self._client.post(self.endpoint, json=payload)
+        response.raise_for_status()
+
+    async def aclose(self) -> None:
+        await self._client.aclose()
+
+
+def create_exporter():
+    if TRACE_EXPORTER == "otlp":
+        return OTLPExporter()
+    return FileExporter()
+
+
+class Tracer:
+    """Starts spans, decides sampling and exports finished spans in the background.
+
+    Sampling is decided once per trace: by the caller's traceparent when the
+    request has one, otherwise by ``sample_rate`` applied to the trace id.
+    Unsampled requests carry no current span, so every child span is a no-op.
+    """
+
+    def __init__(self, exporter=None, enabled: bool = TRACING, sample_rate: float = TRACE_SAMPLE_RATE,
+                 service_name: str = TRACE_SERVICE_NAME, export_interval: float = TRACE_EXPORT_INTERVAL,
+                 export_batch: int = TRACE_EXPORT_BATCH, max_queue: int = TRACE_MAX_QUEUE):
+        self.exporter = exporter
+        self.enabled = enabled
+        self.sample_rate = sample_rate
+        self.service_name = service_name
+        self.export_interval = export_interval
+        self.export_batch = export_batch
+        self.max_queue = max_queue
+        # Appended from driver threads too; deque appends are thread-safe
+        self._queue: Deque[Span] = deque()
+        self._task: Optional[asyncio.Task] = None
+        self.exported = 0
+        self.dropped = 0
+
+    def _sampled(self, trace_id: str) -> bool:
+        return int(trace_id[:16], 16) < self.sample_rate * 2 ** 64
+
+    def start_root(self, name: str, kind: int = SERVER, attributes: Optional[Dict[str, Any]] = None,
+                   traceparent: Optional[str] = None, links: Optional[List[Tuple[str, str]]] = None) -> Optional[Span]:
+        """A span with no local parent, or None if the trace is not sampled."""
+        if not self.enabled:
+            return None
+        parent = parse_traceparent(traceparent)
+        if parent:
+            trace_id, parent_id, sampled = parent
+        else:
+            trace_id, parent_id = f"{random.getrandbits(128):032x}", None
+            sampled = bool(links) or self._sampled(trace_id)
+        if not sampled:
+            return None
+        return Span(name, trace_id, parent_id, kind, attributes, links)
+
+    def start_child(self, name: str, kind: int = INTERNAL, attributes: Optional[Dict[str, Any]] = None) -> Optional[Span]:
+        parent = _current_span.get()
+        if parent is None:
+            return None
+        return Span(name, parent.trace_id, parent.span_id, kind, attributes)
+
+    @contextmanager
+    def activate(self, span: Optional[Span]) -> Iterator[Optional[Span]]:
+        """Makes ``span`` current for the block and finishes it afterwards."""
+        if span is None:
+            yield None
+            return
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.set_error(type(e).__name__)
+            raise
+        finally:
+            try:
+                _current_span.reset(token)
+            except ValueError:
+                # Async generator closed from another context
+                pass
+            self.finish(span)
+
+    def span(self, name: str, kind: int = INTERNAL, attributes: Optional[Dict[str, Any]] = None):
+        """Child of the current span; does nothing outside a sampled trace."""
+        return self.activate(self.start_child(name, kind, attributes))
+
+    def linked_span(self, name: str, traceparents: List[str], attributes: Optional[Dict[str, Any]] = None):
+        """New trace for background work done on behalf of several traced requests."""
+        links = [parent[:2] for parent in map(parse_traceparent, traceparents) if parent]
+        return self.activate(self.start_root(name, INTERNAL, attributes, links=links) if links else None)
+
+    def current_traceparent(self) -> Optional[str]:
+        span = _current_span.get()
+        return span.traceparent if span else None
+
+    def finish(self, span: Span) -> None:
+        span.end_ns = time.time_ns()
+        if len(self._queue) >= self.max_queue:
+            self.dropped += 1
+            return
+        self._queue.append(span)
+
+    def _payload(self, spans: List[Span]) -> Dict[str, Any]:
+        return {"resourceSpans": [{
+            "resource": {"attributes": _otlp_attributes({"service.name": self.service_name})},
+            "scopeSpans": [{"scope": {"name": "tracing"}, "spans": [span.to_otlp() for span in spans]}],
+        }]}
+
+    async def flush(self) -> None:
+        while self._queue:
+            spans = []
+            while self._queue and len(spans) < self.export_batch:
+                spans.append(self._queue.popleft())
+            try:
+                await self.exporter.export(self._payload(spans))
+                self.exported += len(spans)
+            except Exception:
+                logger.exception("Failed to export %s span(s)", len(spans))
+                self.dropped += len(spans)
+
+    def start(self) -> None:
+        if self.exporter is None:
+            self.exporter = create_exporter()
+        self._task = asyncio.create_task(self._run(), name="trace-exporter")
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+            await self.flush()
+            await self.exporter.aclose()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "sample_rate": self.sample_rate,
+            "queued": len(self._queue),
+            "exported": self.exported,
+            "dropped": self.dropped,
+        }
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.export_interval)
+            await self.flush()
+
+
+class MongoCommandTracer(monitoring.CommandListener):
+    """Child spans for driver commands.
+
+    Motor runs commands on executor threads with a copy of the caller's
+    context, so the current span is visible in ``started``.
+    """
+
+    def __init__(self, tracer: Tracer):
+        self.tracer = tracer
+        self._spans: Dict[Tuple[object, int], Span] = {}
+
+    def started(self, event):
+        collection = event.command.get(event.command_name)
+        span = self.tracer.start_child(f"mongodb {event.command_name}", CLIENT, {
+            "db.system": "mongodb",
+            "db.name": event.database_name,
+            "db.operation": event.command_name,
+            "db.mongodb.collection": collection if isinstance(collection, str) else None,
+        })
+        if span:
+            self._spans[(event.connection_id, event.request_id)] = span
+
+    def succeeded(self, event):
+        span = self._spans.pop((event.connection_id, event.request_id), None)
+        if span:
+            self.tracer.finish(span)
+
+    def failed(self, event):
+        span = self._spans.pop((event.connection_id, event.request_id), None)
+        if span:
+            span.set_error(str(event.failure.get("errmsg", "command failed")))
+            self.tracer.finish(span)
+
+
+class TracingMiddleware:
+    """Root span per request, named after the route template."""
+
+    def __init__(self, app, tracer: Tracer, route_name, exclude: Sequence[str] = ()):
+        self.app = app
+        self.tracer = tracer
+        self.route_name = route_name
+        self.exclude = set(exclude)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.tracer.enabled or scope["path"] in self.exclude:
+            await self.app(scope, receive, send)
+            return
+
+        traceparent = dict(scope["headers"]).get(b"traceparent", b"").decode("latin-1")
+        span = self.tracer.start_root(scope["method"], SERVER, {
+            "http.method": scope["method"],
+            "http.target": scope["path"],
+        }, traceparent=traceparent)
+        if span is None:
+            await self.app(scope, receive, send)
+            return
+
+        route = self.route_name(scope)
+        span.name = f"{scope['method']} {route}"
+        span.set_attribute("http.route", route)
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                span.set_attribute("http.status_code", message["status"])
+                if message["status"] >= 500:
+                    span.set_error(f"HTTP {message['status']}")
+            await send(message)
+
+        with self.tracer.activate(span):
+            await self.app(scope, receive, send_with_status)
+
+
+tracer = Tracer()
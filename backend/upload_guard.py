@@ -0,0 +1,147 @@
+import hashlib
+import json
+from dataclasses import dataclass
+from typing import BinaryIO, Dict, Iterable, Optional, Tuple
+
+from fastapi import UploadFile
+from starlette.exceptions import HTTPException
+
+CHUNK_SIZE = 64 * 1024
+
+# Leading bytes of the file types we accept
+MAGIC_NUMBERS = (
+    (b"%PDF-", "application/pdf"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+)
+
+IMAGE_TYPES = ("image/png", "image/jpeg", "image/gif", "image/webp")
+PDF_TYPES = ("application/pdf",)
+
+
+class UploadRejected(Exception):
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+def sniff_mime_type(head: bytes) -> Optional[str]:
+    for magic, mime_type in MAGIC_NUMBERS:
+        if head.startswith(magic):
+            return mime_type
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    return None
+
+
+@dataclass
+class GuardedUpload:
+    """A validated upload. ``file`` is the request's spooled temp file, rewound."""
+    file: BinaryIO
+    filename: Optional[str]
+    mime_type: str
+    size: int
+    sha256: str
+
+
+async def guard_upload(upload: UploadFile, max_bytes: int, allowed_types: Iterable[str], label: str = "File") -> GuardedUpload:
+    """Check an upload's size and real type without copying it into memory.
+
+    The multipart parser has already spooled the part to a temp file (and
+    BodySizeLimitMiddleware capped how much it could receive); this reads it
+    back in chunks to count and hash it, and sniffs the first bytes.
+    """
+    head = await upload.read(16)
+    mime_type = sniff_mime_type(head)
+    if mime_type not in allowed_types:
+        raise UploadRejected(415, f"{label} must be one of: {', '.join(allowed_types)}")
+
+    digest = hashlib.sha256(head)
+    size = len(head)
+    while chunk := await upload.read(CHUNK_SIZE):
+        size += len(chunk)
+        if size > max_bytes:
+            raise UploadRejected(413, f"{label} too large. Max size is {_format_size(max_bytes)}.")
+        digest.update(chunk)
+
+    await upload.seek(0)
+    return GuardedUpload(
+        file=upload.file,
+        filename=upload.filename,
+        mime_type=mime_type,
+        size=size,
+        sha256=digest.hexdigest(),
+    )
+
+
+def _format_size(n: int) -> str:
+    if n >= 1024 * 1024:
+        return f"{n / (1024 * 1024):g}MB"
+    return f"{n / 1024:g}KB"
+
+
+class _BodyTooLarge(HTTPException):
+    # An HTTPException so that, when raised while the route parses the
+    # body, FastAPI passes it through as a 413 instead of a parse error
+    def __init__(self, limit: int):
+        super().__init__(413, f"Request body too large. Max size is {_format_size(limit)}.")
+
+
+class BodySizeLimitMiddleware:
+    """Caps request bodies per (method, path) before they are parsed.
+
+    Requests announcing a larger Content-Length are refused up front;
+    otherwise the bytes received are counted and the request is cut off
+    with a 413 as soon as the limit is crossed.
+    """
+
+    def __init__(self, app, limits: Dict[Tuple[str, str], int]):
+        self.app = app
+        self.limits = limits
+
+    async def __call__(self, scope, receive, send):
+        limit = self.limits.get((scope.get("method"), scope.get("path"))) if scope["type"] == "http" else None
+        if limit is None:
+            await self.app(scope, receive, send)
+            return
+
+        for name, value in scope["headers"]:
+            if name == b"content-length" and value.isdigit() and int(value) > limit:
+                await self._reject(send, limit)
+                return
+
+        received = 0
+        response_started = False
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    raise _BodyTooLarge(limit)
+            return message
+
+        async def tracking_send(message):
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, tracking_send)
+        except _BodyTooLarge:
+            if not response_started:
+                await self._reject(send, limit)
+
+    async def _reject(self, send, limit: int) -> None:
+        body = json.dumps({"detail": _BodyTooLarge(limit).detail}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 413,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -6,6 +6,41 @@ const AuthContext = createContext();
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
 
+// With AUTH_MODE=token the access token cookie is short-lived: on a 401,
+// trade the session cookie for a new one once and retry the request.
+let refreshing = null;
+function refreshAccessToken() {
+  refreshing = refreshing || axios.post(`${API}/auth/refresh`, {}, { withCredentials: true })
+    .finally(() => { refreshing = null; });
+  return refreshing;
+}
+
+axios.interceptors.response.use(undefined, async (error) => {
+  const config = error.config;
+  const url = config?.url || '';
+  if (error.response?.status !== 401 || config._retried || url.endsWith('/auth/refresh') || url.endsWith('/auth/login')) {
+    throw error;
+  }
+  try {
+    await refreshAccessToken();
+  } catch {
+    throw error;
+  }
+  return axios({ ...config, _retried: true });
+});
+
+// fetch() with the same refresh-and-retry, for streamed responses axios can't read
+export async function fetchWithRefresh(url, options) {
+  const response = await fetch(url, options);
+  if (response.status !== 401) return response;
+  try {
+    await refreshAccessToken();
+  } catch {
+    return response;
+  }
+  return fetch(url, options);
+}
+
 export function AuthProvider({ children }) {
   const [user, setUser] = useState(null);
   const [isAuthenticated, setIsAuthenticated] = useState(null);
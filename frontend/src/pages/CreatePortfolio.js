@@ -20,6 +20,38 @@ import { useDropzone } from "react-dropzone";
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
 
+// Upload a file directly to storage using signed params from the API
+async function directUpload(file, kind) {
+  const { data: signed } = await axios.post(
+    `${API}/uploads/sign`,
+    { kind },
+    { withCredentials: true }
+  );
+
+  const fd = new FormData();
+  Object.entries(signed.fields).forEach(([key, value]) => fd.append(key, value));
+  fd.append("file", file);
+
+  const { data } = await axios.post(signed.upload_url, fd);
+  return data.secure_url;
+}
+
+// Resume parsing runs as a background job; poll until it finishes
+const RESUME_JOB_POLL_MS = 1500;
+const RESUME_JOB_TIMEOUT_MS = 3 * 60 * 1000;
+
+async function waitForResumeJob(jobId) {
+  const deadline = Date.now() + RESUME_JOB_TIMEOUT_MS;
+  while (Date.now() < deadline) {
+    const { data } = await axios.get(`${API}/ai/jobs/${jobId}`, {
+      withCredentials: true,
+    });
+    if (data.status === "completed" || data.status === "failed") return data;
+    await new Promise((resolve) => setTimeout(resolve, RESUME_JOB_POLL_MS));
+  }
+  return { status: "failed", error: "Resume parsing is taking too long. Please try again." };
+}
+
 function safeParseAIJSON(raw) {
   if (!raw) return null;
 
@@ -98,7 +130,13 @@ const MAX_IMAGE_SIZE_BYTES = MAX_IMAGE_SIZE_MB * 1024 * 1024;
       headers: { "Content-Type": "multipart/form-data" },
     });
 
-    const rawAI = response.data?.structured_data;
+    const job = await waitForResumeJob(response.data.job_id);
+    if (job.status === "failed") {
+      toast.error(job.error || "Resume parsing failed");
+      return;
+    }
+
+    const rawAI = job.result?.structured_data;
     const parsed = safeParseAIJSON(rawAI);
 
     if (!parsed) {
@@ -348,15 +386,15 @@ const handleSubmit = async (e) => {
 
     };
 
-    fd.append("data", JSON.stringify(payload));
+    // Files go straight to storage; the API only receives their URLs
+    const [profileImageUrl, resumeUrl] = await Promise.all([
+      profileImage ? directUpload(profileImage, "profile_image") : null,
+      resumeFile ? directUpload(resumeFile, "resume") : null,
+    ]);
+    if (profileImageUrl) payload.profile_image = profileImageUrl;
+    if (resumeUrl) payload.resume_url = resumeUrl;
 
-    if (profileImage) {
-      fd.append("profile_image", profileImage);
-    }
-
-    if (resumeFile) {
-      fd.append("resume_file", resumeFile);
-    }
+    fd.append("data", JSON.stringify(payload));
 
     const response = await axios.post(`${API}/portfolios`, fd, {
       withCredentials: true,
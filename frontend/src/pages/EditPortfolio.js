@@ -1,6 +1,6 @@
 import { useState, useEffect } from "react";
 import { Link, useParams, useNavigate } from "react-router-dom";
-import { useAuth } from "@/context/AuthContext";
+import { useAuth, fetchWithRefresh } from "@/context/AuthContext";
 import { Button } from "@/components/ui/button";
 import { Input } from "@/components/ui/input";
 import { Label } from "@/components/ui/label";
@@ -169,18 +169,52 @@ const removeSkill = (index) => {
         context = formData.skills.join(", ");
       }
 
-      const response = await axios.post(
-        `${API}/ai/generate`,
-        { context, type },
-        { withCredentials: true }
-      );
+      // Stream the completion so text shows up as soon as it's generated
+      const response = await fetchWithRefresh(`${API}/ai/generate/stream`, {
+        method: "POST",
+        credentials: "include",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify({ context, type }),
+      });
 
-      if (type === "about") {
-        setFormData((prev) => ({ ...prev, bio: response.data.content }));
+      if (!response.ok) {
+        const body = await response.json().catch(() => ({}));
+        throw new Error(body.detail || "AI generation failed");
+      }
+
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = "";
+      let content = "";
+
+      while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+
+        buffer += decoder.decode(value, { stream: true });
+        const events = buffer.split("\n\n");
+        buffer = events.pop();
+
+        for (const event of events) {
+          const lines = event.split("\n");
+          const name = lines.find((l) => l.startsWith("event: "))?.slice(7);
+          const data = JSON.parse(
+            lines.find((l) => l.startsWith("data: "))?.slice(6) || "{}"
+          );
+
+          if (name === "error") throw new Error(data.detail);
+          if (data.content) {
+            content += data.content;
+            if (type === "about") {
+              setFormData((prev) => ({ ...prev, bio: content }));
+            }
+          }
+        }
       }
+
       toast.success("AI content generated!");
     } catch (error) {
-      toast.error(error.response?.data?.detail || "AI generation failed");
+      toast.error(error.message || "AI generation failed");
     } finally {
       setAiGenerating(false);
     }
@@ -0,0 +1,95 @@
+import asyncio
+import sys
+import uuid
+from datetime import datetime, timezone, timedelta
+from pathlib import Path
+
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+# The backend modules import each other as top-level modules
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+
+@pytest.fixture
+def db():
+    return AsyncMongoMockClient(tz_aware=True)["test_portfolio"]
+
+
+class FakeClock:
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float) -> None:
+        self.now += seconds
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture(scope="session")
+def server():
+    """backend/server.py, imported with its MongoDB client swapped for mongomock-motor."""
+    import motor.motor_asyncio
+
+    originals = (motor.motor_asyncio.AsyncIOMotorClient, motor.motor_asyncio.AsyncIOMotorGridFSBucket)
+    motor.motor_asyncio.AsyncIOMotorClient = AsyncMongoMockClient
+    # Only the resume job queue uses GridFS; route tests don't reach it
+    motor.motor_asyncio.AsyncIOMotorGridFSBucket = lambda *args, **kwargs: None
+    try:
+        import server
+    finally:
+        motor.motor_asyncio.AsyncIOMotorClient, motor.motor_asyncio.AsyncIOMotorGridFSBucket = originals
+    return server
+
+
+@pytest.fixture
+def app(server):
+    """The app with an empty database and empty in-process caches."""
+
+    async def reset():
+        for name in await server.db.list_collection_names():
+            await server.db.drop_collection(name)
+
+    asyncio.run(reset())
+    server.session_cache.clear()
+    server.public_portfolio_cache._cache.clear()
+    server.contact_owner_cache.clear()
+    return server
+
+
+@pytest.fixture
+def auth_headers(app):
+    """Signs in user_1 (pro plan) with a fresh session; returns the request headers."""
+    now = datetime.now(timezone.utc)
+    token = f"session_{uuid.uuid4().hex}"
+
+    async def seed():
+        await app.db.users.insert_one({
+            "user_id": "user_1", "email": "ada@example.com", "name": "Ada",
+            "subscription_plan": "pro", "is_verified": True, "created_at": now,
+        })
+        await app.db.user_sessions.insert_one({
+            "user_id": "user_1", "session_token": token, "expires_at": now + timedelta(days=1), "created_at": now,
+        })
+
+    asyncio.run(seed())
+    return {"Authorization": f"Bearer {token}"}
+
+
+@pytest.fixture
+def portfolio(app, auth_headers):
+    """An unpublished portfolio owned by user_1."""
+    now = datetime.now(timezone.utc)
+    doc = {
+        "portfolio_id": "portfolio_1", "user_id": "user_1", "name": "Ada Lovelace",
+        "role": "Engineer", "bio": "First", "skills": [], "projects": [], "education": [], "experience": [],
+        "template": "modern", "is_published": False, "created_at": now, "updated_at": now,
+    }
+    asyncio.run(app.db.portfolios.insert_one(dict(doc)))
+    return doc
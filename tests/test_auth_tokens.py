@@ -0,0 +1,89 @@
+import asyncio
+import time
+
+import jwt
+import pytest
+
+from auth_tokens import AccessTokens, InvalidAccessToken, TokenDenylist, looks_like_access_token, session_id
+
+SECRET = "test-secret-at-least-32-bytes-long"
+
+USER = {
+    "user_id": "user_1",
+    "email": "a@example.com",
+    "name": "Ada",
+    "picture": None,
+    "subscription_plan": "pro",
+    "created_at": "2024-01-01T00:00:00+00:00",
+}
+
+
+def test_issued_token_round_trips():
+    tokens = AccessTokens(secret=SECRET, ttl=900)
+    token = tokens.issue(USER, "session_abc")
+    assert looks_like_access_token(token)
+    assert not looks_like_access_token("session_abc")
+
+    claims = tokens.verify(token)
+    assert claims["sub"] == "user_1"
+    assert claims["plan"] == "pro"
+    assert claims["sid"] == session_id("session_abc")
+    assert claims["exp"] - int(claims["iat"]) == 900
+    # The session token itself never appears in the access token
+    assert "session_abc" not in jwt.decode(token, options={"verify_signature": False}).values()
+
+
+def test_expired_token_is_rejected():
+    tokens = AccessTokens(secret=SECRET, ttl=-1)
+    with pytest.raises(InvalidAccessToken, match="expired"):
+        tokens.verify(tokens.issue(USER, "session_abc"))
+
+
+def test_token_signed_with_another_secret_is_rejected():
+    token = AccessTokens(secret=SECRET[::-1]).issue(USER, "session_abc")
+    with pytest.raises(InvalidAccessToken, match="Invalid"):
+        AccessTokens(secret=SECRET).verify(token)
+
+
+def test_token_missing_required_claims_is_rejected():
+    token = jwt.encode({"sub": "user_1", "exp": int(time.time()) + 60}, SECRET, algorithm="HS256")
+    with pytest.raises(InvalidAccessToken):
+        AccessTokens(secret=SECRET).verify(token)
+
+
+def test_missing_secret_is_a_configuration_error():
+    with pytest.raises(RuntimeError):
+        AccessTokens(secret=None).issue(USER, "session_abc")
+
+
+def test_revoked_session_is_denied_on_every_node(db):
+    tokens = AccessTokens(secret=SECRET)
+    claims = tokens.verify(tokens.issue(USER, "session_abc"))
+    other = tokens.verify(tokens.issue(USER, "session_xyz"))
+    node_a = TokenDenylist(db.token_denylist)
+    node_b = TokenDenylist(db.token_denylist)
+
+    async def run():
+        await node_a.revoke_session("session_abc")
+        assert node_a.is_revoked(claims)
+        assert not node_b.is_revoked(claims)
+        await node_b.reload()
+
+    asyncio.run(run())
+    assert node_b.is_revoked(claims)
+    assert not node_b.is_revoked(other)
+    assert node_b.stats() == {"sessions": 1, "users": 0}
+
+
+def test_revoking_a_user_only_denies_earlier_tokens(db):
+    tokens = AccessTokens(secret=SECRET)
+    denylist = TokenDenylist(db.token_denylist)
+    before = tokens.verify(tokens.issue(USER, "session_abc"))
+
+    asyncio.run(denylist.revoke_user("user_1"))
+    time.sleep(0.01)
+    after = tokens.verify(tokens.issue(USER, "session_abc"))
+
+    assert denylist.is_revoked(before)
+    assert not denylist.is_revoked(after)
+    assert not denylist.is_revoked({**before, "sub": "user_2", "sid": "other"})
@@ -0,0 +1,86 @@
+from datetime import datetime, timezone, timedelta
+from types import SimpleNamespace
+
+from cache_utils import TTLCache
+from session_cache import SessionCache
+
+
+def test_entries_expire_after_ttl(clock):
+    cache = TTLCache(maxsize=10, ttl=5, clock=clock)
+    cache.set("a", 1)
+    clock.advance(4.9)
+    assert cache.get("a") == 1
+    clock.advance(0.2)
+    assert cache.get("a") is None
+    assert "a" not in cache
+
+
+def test_per_entry_ttl_overrides_default(clock):
+    cache = TTLCache(maxsize=10, ttl=60, clock=clock)
+    cache.set("short", 1, ttl=1)
+    cache.set("gone", 1, ttl=0)
+    clock.advance(2)
+    assert cache.get("short") is None
+    assert "gone" not in cache
+
+
+def test_least_recently_used_entry_is_evicted(clock):
+    cache = TTLCache(maxsize=2, ttl=60, clock=clock)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert "a" in cache and "c" in cache
+    assert "b" not in cache
+    assert cache.stats()["evictions"] == 1
+
+
+def test_stats_count_hits_and_misses(clock):
+    cache = TTLCache(maxsize=10, ttl=60, clock=clock)
+    cache.set("a", 1)
+    cache.get("a")
+    cache.get("missing")
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["hit_ratio"]) == (1, 1, 0.5)
+
+
+def _user(user_id="user_1"):
+    return SimpleNamespace(user_id=user_id)
+
+
+def test_session_cache_drops_expired_sessions():
+    cache = SessionCache(maxsize=10, ttl=60)
+    expires_at = datetime.now(timezone.utc) + timedelta(hours=1)
+    cache.set("live", _user(), expires_at)
+    assert cache.get("live") == (_user(), expires_at)
+
+    # An expiry in the past is never cached
+    cache.set("expired", _user(), datetime.now(timezone.utc) - timedelta(seconds=1))
+    assert cache.get("expired") is None
+
+
+def test_session_cache_invalidates_every_session_of_a_user():
+    cache = SessionCache(maxsize=10, ttl=60)
+    expires_at = datetime.now(timezone.utc) + timedelta(hours=1)
+    cache.set("one", _user("user_1"), expires_at)
+    cache.set("two", _user("user_1"), expires_at)
+    cache.set("other", _user("user_2"), expires_at)
+
+    cache.invalidate_user("user_1")
+    assert cache.get("one") is None
+    assert cache.get("two") is None
+    assert cache.get("other") is not None
+    assert cache.stats()["invalidations"] == 2
+
+
+def test_session_cache_invalidates_a_single_token():
+    cache = SessionCache(maxsize=10, ttl=60)
+    expires_at = datetime.now(timezone.utc) + timedelta(hours=1)
+    cache.set("one", _user(), expires_at)
+    cache.set("two", _user(), expires_at)
+
+    cache.invalidate("one")
+    cache.invalidate("missing")
+    assert cache.get("one") is None
+    assert cache.get("two") is not None
+    assert cache.stats()["invalidations"] == 1
@@ -0,0 +1,69 @@
+import asyncio
+from datetime import datetime, timezone, timedelta
+
+from date_utils import as_datetime
+from migrate_datetimes import MIGRATION_ID, migrate_collection
+
+UTC = timezone.utc
+
+
+def test_as_datetime_reads_every_stored_form():
+    expected = datetime(2024, 5, 1, 12, 30, tzinfo=UTC)
+    assert as_datetime(None) is None
+    assert as_datetime("2024-05-01T12:30:00+00:00") == expected
+    assert as_datetime("2024-05-01T14:30:00+02:00") == expected
+    # Naive values (old strings, or BSON dates read without tz_aware) are UTC
+    assert as_datetime("2024-05-01T12:30:00") == expected
+    assert as_datetime(datetime(2024, 5, 1, 12, 30)) == expected
+    assert as_datetime(expected.astimezone(timezone(timedelta(hours=-5)))).tzinfo == UTC
+
+
+def _seed(db):
+    now = datetime(2024, 5, 1, tzinfo=UTC)
+    return db.user_sessions.insert_many([
+        {"session_token": "legacy", "created_at": now.isoformat(), "expires_at": (now + timedelta(days=7)).isoformat()},
+        {"session_token": "mixed", "created_at": now, "expires_at": "2024-05-08T00:00:00"},
+        {"session_token": "native", "created_at": now, "expires_at": now + timedelta(days=7)},
+    ])
+
+
+def test_migration_converts_string_dates_and_checkpoints(db):
+    async def run():
+        await _seed(db)
+        migrated = await migrate_collection(db, "user_sessions", ["created_at", "expires_at"], batch_size=1, dry_run=False)
+        docs = {doc["session_token"]: doc async for doc in db.user_sessions.find()}
+        return migrated, docs, await db.migrations.find_one({"_id": f"{MIGRATION_ID}:user_sessions"})
+
+    migrated, docs, checkpoint = asyncio.run(run())
+    assert migrated == 2
+    for doc in docs.values():
+        assert isinstance(doc["created_at"], datetime)
+        assert isinstance(doc["expires_at"], datetime)
+    assert docs["legacy"]["expires_at"] == datetime(2024, 5, 8, tzinfo=UTC)
+    assert docs["mixed"]["expires_at"] == datetime(2024, 5, 8, tzinfo=UTC)
+    assert checkpoint["done"] is True
+    assert checkpoint["migrated"] == 2
+
+
+def test_migration_resumes_after_the_checkpoint(db):
+    async def run():
+        await _seed(db)
+        await migrate_collection(db, "user_sessions", ["created_at", "expires_at"], batch_size=10, dry_run=False)
+        await db.user_sessions.insert_one({"session_token": "later", "created_at": "2024-06-01T00:00:00+00:00"})
+        return await migrate_collection(db, "user_sessions", ["created_at", "expires_at"], batch_size=10, dry_run=False)
+
+    # Only the new document is looked at; the running total is kept
+    assert asyncio.run(run()) == 3
+
+
+def test_dry_run_writes_nothing(db):
+    async def run():
+        await _seed(db)
+        migrated = await migrate_collection(db, "user_sessions", ["created_at", "expires_at"], batch_size=10, dry_run=True)
+        legacy = await db.user_sessions.find_one({"session_token": "legacy"})
+        return migrated, legacy, await db.migrations.count_documents({})
+
+    migrated, legacy, checkpoints = asyncio.run(run())
+    assert migrated == 2
+    assert isinstance(legacy["created_at"], str)
+    assert checkpoints == 0
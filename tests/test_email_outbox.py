@@ -0,0 +1,178 @@
+import asyncio
+from datetime import datetime, timezone, timedelta
+
+from email_outbox import EmailOutbox, StubTransport
+
+
+class FlakyTransport(StubTransport):
+    """Fails any call that includes an email to a bad address."""
+
+    def __init__(self, bad=("bad@example.com",)):
+        super().__init__()
+        self.bad = set(bad)
+        self.calls = []
+
+    async def send(self, messages):
+        self.calls.append([message["to"] for message in messages])
+        if any(message["to"] in self.bad for message in messages):
+            raise RuntimeError("invalid recipient")
+        await super().send(messages)
+
+
+def _message(to):
+    return {"from": "noreply@example.com", "to": to, "subject": "Hi", "html": "<p>Hi</p>"}
+
+
+async def _drain(outbox):
+    while emails := await outbox._claim_batch():
+        await outbox._send_batch(emails)
+
+
+async def _statuses(db):
+    return {doc["message"]["to"]: doc async for doc in db.email_outbox.find()}
+
+
+def test_queued_emails_are_sent_in_one_batch(db):
+    transport = StubTransport()
+    outbox = EmailOutbox(db.email_outbox, transport, batch_size=10)
+
+    async def run():
+        for to in ("a@example.com", "b@example.com"):
+            await outbox.enqueue(_message(to), kind="contact")
+        await _drain(outbox)
+        return await _statuses(db)
+
+    docs = asyncio.run(run())
+    assert [message["to"] for message in transport.sent] == ["a@example.com", "b@example.com"]
+    assert {doc["status"] for doc in docs.values()} == {"sent"}
+    assert all("claim_id" not in doc and doc["expires_at"] > doc["sent_at"] for doc in docs.values())
+    assert outbox.stats() == {"sent": 2, "batches": 1, "failures": 0, "dead_lettered": 0}
+
+
+def test_one_bad_address_does_not_hold_back_the_batch(db):
+    transport = FlakyTransport()
+    outbox = EmailOutbox(db.email_outbox, transport, batch_size=10, backoff_base=60)
+
+    async def run():
+        for to in ("a@example.com", "bad@example.com", "c@example.com"):
+            await outbox.enqueue(_message(to))
+        emails = await outbox._claim_batch()
+        await outbox._send_batch(emails)
+        return await _statuses(db)
+
+    docs = asyncio.run(run())
+    assert transport.calls[0] == ["a@example.com", "bad@example.com", "c@example.com"]
+    assert transport.calls[1:] == [["a@example.com"], ["bad@example.com"], ["c@example.com"]]
+    assert docs["a@example.com"]["status"] == "sent"
+    assert docs["c@example.com"]["status"] == "sent"
+
+    bad = docs["bad@example.com"]
+    assert bad["status"] == "queued"
+    assert bad["attempts"] == 1
+    assert bad["last_error"] == "invalid recipient"
+    # Jittered backoff: between half and all of backoff_base for the first retry
+    delay = (bad["next_attempt_at"] - bad["updated_at"]).total_seconds()
+    assert 30 <= delay <= 60
+
+
+def test_email_is_dead_lettered_after_max_attempts(db):
+    outbox = EmailOutbox(db.email_outbox, FlakyTransport(), max_attempts=3)
+
+    async def run():
+        await outbox.enqueue(_message("bad@example.com"))
+        for _ in range(3):
+            await db.email_outbox.update_many({}, {"$set": {"next_attempt_at": datetime.now(timezone.utc)}})
+            await _drain(outbox)
+        return await _statuses(db)
+
+    dead = asyncio.run(run())["bad@example.com"]
+    assert dead["status"] == "dead"
+    assert dead["attempts"] == 3
+    assert outbox.stats()["dead_lettered"] == 1
+    assert outbox.stats()["failures"] == 3
+
+
+def test_expired_lease_is_claimed_again(db):
+    outbox = EmailOutbox(db.email_outbox, StubTransport(), lease_seconds=60)
+
+    async def run():
+        await outbox.enqueue(_message("a@example.com"))
+        assert len(await outbox._claim_batch()) == 1
+        # Still leased by the first worker
+        assert await outbox._claim_batch() == []
+
+        await db.email_outbox.update_many(
+            {}, {"$set": {"lease_expires_at": datetime.now(timezone.utc) - timedelta(seconds=1)}},
+        )
+        return await outbox._claim_batch()
+
+    reclaimed = asyncio.run(run())
+    assert len(reclaimed) == 1
+    assert reclaimed[0]["attempts"] == 2
+
+
+def test_stale_worker_is_fenced_off_after_a_reclaim(db):
+    transport = StubTransport()
+    outbox = EmailOutbox(db.email_outbox, transport, lease_seconds=60)
+
+    async def run():
+        for to in ("a@example.com", "b@example.com"):
+            await outbox.enqueue(_message(to))
+        stale = await outbox._claim_batch()
+        await db.email_outbox.update_many(
+            {}, {"$set": {"lease_expires_at": datetime.now(timezone.utc) - timedelta(seconds=1)}},
+        )
+        fresh = await outbox._claim_batch()
+        assert {email["claim_id"] for email in fresh} != {email["claim_id"] for email in stale}
+
+        # The first worker finally finishes; none of its writes may land
+        await outbox._mark_sent(stale[:1])
+        await outbox._reschedule(stale[1:], "timed out")
+        await outbox._send_each(stale)
+        reclaimed = await _statuses(db)
+        assert transport.sent == []
+
+        await outbox._send_batch(fresh)
+        return fresh, reclaimed, await _statuses(db)
+
+    fresh, reclaimed, docs = asyncio.run(run())
+    assert {doc["status"] for doc in reclaimed.values()} == {"sending"}
+    assert {doc["claim_id"] for doc in reclaimed.values()} == {fresh[0]["claim_id"]}
+    assert all("last_error" not in doc for doc in reclaimed.values())
+    assert {doc["status"] for doc in docs.values()} == {"sent"}
+    assert [message["to"] for message in transport.sent] == ["a@example.com", "b@example.com"]
+
+
+def test_worker_survives_a_failed_claim(db):
+    class BrokenCollection:
+        """Fails the first claim, like a dropped MongoDB connection."""
+
+        def __init__(self, collection):
+            self.collection = collection
+            self.failed = False
+
+        def __getattr__(self, name):
+            return getattr(self.collection, name)
+
+        def find(self, *args, **kwargs):
+            if not self.failed:
+                self.failed = True
+                raise ConnectionError("connection reset")
+            return self.collection.find(*args, **kwargs)
+
+    transport = StubTransport()
+    outbox = EmailOutbox(BrokenCollection(db.email_outbox), transport, workers=1, poll_interval=0.01)
+
+    async def run():
+        await outbox.enqueue(_message("a@example.com"))
+        outbox.start()
+        try:
+            for _ in range(200):
+                if transport.sent:
+                    return
+                await asyncio.sleep(0.01)
+        finally:
+            await outbox.stop()
+
+    asyncio.run(run())
+    assert [message["to"] for message in transport.sent] == ["a@example.com"]
@@ -0,0 +1,201 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from cache_utils import TTLCache
+from github_import import REPO_FIELDS, GitHubError, GitHubImporter, GitHubRateLimited
+
+
+def test_ttl_cache_byte_budget_evicts_and_skips_oversized_values(clock):
+    cache = TTLCache(maxsize=10, ttl=60, clock=clock, maxbytes=10)
+    cache.set("a", "xxxx")
+    cache.set("b", "yyyy")
+    cache.set("c", "zzzz")
+    assert "a" not in cache
+    assert cache.bytes == 8
+
+    cache.set("big", "x" * 11)
+    assert "big" not in cache
+    cache.pop("b")
+    assert cache.bytes == 4
+    cache.set("c", "zz")
+    assert cache.bytes == 2
+
+
+def _repo(name, language="Python", fork=False):
+    return {
+        "name": name,
+        "full_name": f"octo/{name}",
+        "description": f"{name} description",
+        "language": language,
+        "html_url": f"https://github.com/octo/{name}",
+        "fork": fork,
+        "owner": {"login": "octo", "avatar_url": "https://example.com/a.png"},
+        "topics": ["a", "b"],
+    }
+
+
+class FakeGitHub:
+    """Serves /users/octo/repos and /repos/octo/*/languages with ETags."""
+
+    def __init__(self, repos, limit=5000, remaining=4999, per_page=None):
+        self.repos = repos
+        self.limit = limit
+        self.remaining = remaining
+        self.per_page = per_page
+        self.requests = []
+
+    def rate_headers(self):
+        return {
+            "X-RateLimit-Limit": str(self.limit),
+            "X-RateLimit-Remaining": str(self.remaining),
+            "X-RateLimit-Reset": str(int(time.time()) + 600),
+        }
+
+    def handler(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        path = request.url.path
+        if path.endswith("/languages"):
+            name = path.split("/")[3]
+            etag = f'"lang-{name}"'
+            body = {"Python": 100, "Shell": 900} if name == "tool" else {"Python": 10}
+        else:
+            page = int(request.url.params.get("page", "1"))
+            size = self.per_page or len(self.repos)
+            body = self.repos[(page - 1) * size:page * size]
+            etag = f'"repos-{page}"'
+        # 304s don't count against the quota
+        if request.headers.get("If-None-Match") == etag:
+            return httpx.Response(304, headers={**self.rate_headers(), "ETag": etag})
+        self.remaining -= 1
+        headers = {**self.rate_headers(), "ETag": etag}
+        if not self.per_page or len(self.repos) <= self.per_page or path.endswith("/languages"):
+            return httpx.Response(200, json=body, headers=headers)
+        last = -(-len(self.repos) // self.per_page)
+        link = f'<https://api.github.com/users/octo/repos?page={last}>; rel="last"'
+        return httpx.Response(200, json=body, headers={**headers, "Link": link})
+
+
+def _importer(github, **kwargs):
+    http = httpx.AsyncClient(transport=httpx.MockTransport(github.handler), base_url="https://api.github.com")
+    return GitHubImporter(http, api_url="https://api.github.com", **kwargs)
+
+
+def test_import_skips_forks_and_orders_languages_by_size():
+    github = FakeGitHub([_repo("tool"), _repo("fork", fork=True), _repo("site", language=None)])
+    projects = asyncio.run(_importer(github).import_projects("octo"))
+    assert [p["title"] for p in projects] == ["tool", "site"]
+    assert projects[0]["tech_stack"] == ["Shell", "Python"]
+    assert projects[0]["github_link"] == "https://github.com/octo/tool"
+
+
+def test_all_pages_are_fetched():
+    github = FakeGitHub([_repo(f"r{i}") for i in range(5)], per_page=2)
+    projects = asyncio.run(_importer(github, max_language_repos=0).import_projects("octo"))
+    assert [p["title"] for p in projects] == ["r0", "r1", "r2", "r3", "r4"]
+    pages = sorted(int(r.url.params["page"]) for r in github.requests)
+    assert pages == [1, 2, 3]
+
+
+def test_revalidation_reuses_the_stored_response_on_304():
+    github = FakeGitHub([_repo("tool")])
+    # A zero TTL turns off the per-username project cache, so every import hits GitHub
+    importer = _importer(github, cache_ttl=0)
+
+    async def run():
+        first = await importer.import_projects("octo")
+        second = await importer.import_projects("octo")
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert first == second
+    revalidations = github.requests[2:]
+    assert [r.headers["If-None-Match"] for r in revalidations] == ['"repos-1"', '"lang-tool"']
+    assert importer.not_modified == 2
+    assert github.remaining == 4999 - 2
+
+
+def test_only_used_repo_fields_are_cached():
+    github = FakeGitHub([_repo("tool")])
+    importer = _importer(github, max_language_repos=0)
+    asyncio.run(importer.import_projects("octo"))
+    (etag, repos, link), = [entry for entry, _ in importer._etags._data.values()]
+    assert etag == '"repos-1"'
+    assert set(repos[0]) == set(REPO_FIELDS)
+
+
+def test_etag_cache_is_bounded_by_bytes():
+    github = FakeGitHub([_repo("tool")])
+    importer = _importer(github, cache_ttl=0, etag_cache_bytes=100)
+
+    async def run():
+        await importer.import_projects("octo")
+        await importer.import_projects("octo")
+
+    asyncio.run(run())
+    # The repo page is larger than the whole budget, so it is never revalidated
+    assert importer._etags.bytes <= 100
+    assert all("If-None-Match" not in r.headers for r in github.requests if "/languages" not in r.url.path)
+
+
+@pytest.mark.parametrize("limit, remaining, low", [
+    (60, 7, False),
+    (60, 6, True),      # 10% of an unauthenticated 60/hour window
+    (5000, 501, False),
+    (5000, 500, True),
+    (10, 1, True),      # the reserve is at least one call
+])
+def test_reserve_is_a_fraction_of_the_window(limit, remaining, low):
+    github = FakeGitHub([_repo("tool")], limit=limit, remaining=remaining + 1)
+    importer = _importer(github, max_language_repos=0, reserve=0.1)
+    asyncio.run(importer.import_projects("octo"))
+    assert importer.rate_limit_limit == limit
+    assert importer._budget_low() is low
+
+
+def test_low_budget_sheds_language_lookups_and_new_imports():
+    github = FakeGitHub([_repo("tool"), _repo("site")], limit=60, remaining=7)
+    importer = _importer(github, reserve=0.1, language_concurrency=1)
+
+    async def run():
+        projects = await importer.import_projects("octo")
+        with pytest.raises(GitHubRateLimited) as limited:
+            await importer.import_projects("someone-else")
+        return projects, limited.value
+
+    projects, limited = asyncio.run(run())
+    # The repo list used the budget down to the reserve; languages fell back to the repo's main language
+    assert [p["tech_stack"] for p in projects] == [["Python"], ["Python"]]
+    assert importer.shed == 3
+    assert 0 < limited.retry_after <= 600
+
+
+def test_budget_recovers_once_the_window_resets():
+    github = FakeGitHub([_repo("tool")], limit=60, remaining=1)
+    importer = _importer(github, max_language_repos=0)
+    asyncio.run(importer.import_projects("octo"))
+    assert importer._budget_low()
+    importer.rate_limit_reset = int(time.time()) - 1
+    assert not importer._budget_low()
+
+
+def test_exhausted_quota_is_reported_as_rate_limited():
+    def handler(request):
+        return httpx.Response(403, headers={
+            "X-RateLimit-Limit": "60", "X-RateLimit-Remaining": "0",
+            "X-RateLimit-Reset": str(int(time.time()) + 120),
+        })
+
+    importer = GitHubImporter(httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+    with pytest.raises(GitHubRateLimited) as limited:
+        asyncio.run(importer.import_projects("octo"))
+    assert 100 < limited.value.retry_after <= 120
+
+
+def test_invalid_username_is_rejected_without_a_request():
+    github = FakeGitHub([])
+    with pytest.raises(GitHubError):
+        asyncio.run(_importer(github).import_projects("../admin"))
+    assert github.requests == []
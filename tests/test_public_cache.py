@@ -0,0 +1,85 @@
+import asyncio
+from datetime import datetime, timezone
+
+import httpx
+import pytest
+
+from public_cache import PublicPortfolioCache, etag_matches, make_etag
+
+ETAG = '"abc123"'
+
+
+@pytest.mark.parametrize("if_none_match, matches", [
+    (None, False),
+    ("", False),
+    ('"abc123"', True),
+    ('W/"abc123"', True),            # weak comparison
+    ('"other"', False),
+    ('W/"other"', False),
+    ('"x", "abc123"', True),
+    ('"x",W/"abc123" , "y"', True),
+    ('"x", "y"', False),
+    ("*", True),
+    ('"x", *', True),
+    ("abc123", False),               # unquoted is not the same tag
+])
+def test_etag_matches(if_none_match, matches):
+    assert etag_matches(if_none_match, ETAG) is matches
+
+
+def test_etag_changes_with_the_portfolio_version():
+    first = make_etag("ada", datetime(2024, 1, 1, tzinfo=timezone.utc))
+    assert first == make_etag("ada", datetime(2024, 1, 1, tzinfo=timezone.utc))
+    assert first != make_etag("ada", datetime(2024, 1, 2, tzinfo=timezone.utc))
+    assert first != make_etag("bob", datetime(2024, 1, 1, tzinfo=timezone.utc))
+    assert first.startswith('"') and first.endswith('"')
+
+
+def test_cache_keeps_serialized_body_until_invalidated():
+    cache = PublicPortfolioCache(maxsize=10, ttl=60)
+    body, etag = cache.put("ada", {"name": "Ada", "updated_at": datetime(2024, 1, 1, tzinfo=timezone.utc)})
+    assert body == b'{"name":"Ada","updated_at":"2024-01-01T00:00:00+00:00"}'
+    assert cache.get("ada") == (body, etag)
+    cache.invalidate("ada")
+    cache.invalidate(None)
+    assert cache.get("ada") is None
+
+
+def test_public_route_revalidates_and_is_invalidated_by_changes(app, auth_headers, portfolio):
+    auth = auth_headers
+
+    async def run():
+        transport = httpx.ASGITransport(app=app.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            slug = (await client.post("/api/portfolios/portfolio_1/publish", headers=auth)).json()["slug"]
+            url = f"/api/public/portfolio/{slug}"
+
+            first = await client.get(url)
+            assert first.status_code == 200
+            assert first.json()["bio"] == "First"
+            assert "user_id" not in first.json()
+            etag = first.headers["ETag"]
+            assert first.headers["Cache-Control"] == app.PUBLIC_CACHE_CONTROL
+
+            revalidated = await client.get(url, headers={"If-None-Match": etag})
+            assert revalidated.status_code == 304
+            assert revalidated.content == b""
+            assert revalidated.headers["ETag"] == etag
+            assert (await client.get(url, headers={"If-None-Match": f"W/{etag}"})).status_code == 304
+
+            # An update drops the cached copy, so the old ETag no longer matches
+            await client.put("/api/portfolios/portfolio_1", json={"bio": "Second"}, headers=auth)
+            updated = await client.get(url, headers={"If-None-Match": etag})
+            assert updated.status_code == 200
+            assert updated.json()["bio"] == "Second"
+            assert updated.headers["ETag"] != etag
+
+            # Republishing issues a new slug; the old one stops resolving
+            new_slug = (await client.post("/api/portfolios/portfolio_1/publish", headers=auth)).json()["slug"]
+            assert (await client.get(url)).status_code == 404
+            assert (await client.get(f"/api/public/portfolio/{new_slug}")).status_code == 200
+
+            await client.delete("/api/portfolios/portfolio_1", headers=auth)
+            assert (await client.get(f"/api/public/portfolio/{new_slug}")).status_code == 404
+
+    asyncio.run(run())
@@ -0,0 +1,153 @@
+import asyncio
+
+import pytest
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import StreamingResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from rate_limit import (
+    MemoryBucketStore,
+    MemoryWindowStore,
+    PlanRateLimiter,
+    QuotaResult,
+    RateLimitHeadersMiddleware,
+    RateLimitMetrics,
+    TokenBucketLimiter,
+    client_ip,
+    parse_quota,
+)
+
+
+def test_token_bucket_allows_a_burst_then_refills(clock):
+    limiter = TokenBucketLimiter("login", capacity=3, per_seconds=60,
+                                 store=MemoryBucketStore(clock=clock), metrics=RateLimitMetrics())
+
+    async def run():
+        decisions = [await limiter.hit("1.2.3.4") for _ in range(4)]
+        assert [d.allowed for d in decisions] == [True, True, True, False]
+        assert decisions[2].remaining == 0
+        # One token every 20 seconds
+        assert decisions[3].retry_after == 20
+
+        assert (await limiter.hit("5.6.7.8")).allowed
+
+        clock.advance(20)
+        assert (await limiter.hit("1.2.3.4")).allowed
+        assert not (await limiter.hit("1.2.3.4")).allowed
+
+    asyncio.run(run())
+    assert limiter.metrics.stats() == {"login": {"allowed": 5, "throttled": 2}}
+
+
+def _request(forwarded_for=None):
+    headers = [(b"x-forwarded-for", forwarded_for.encode())] if forwarded_for is not None else []
+    return Request({"type": "http", "headers": headers, "client": ("10.0.0.1", 443)})
+
+
+@pytest.mark.parametrize("forwarded_for, hops, expected", [
+    # Without trusted proxies the header is client-supplied and ignored
+    ("203.0.113.7", 0, "10.0.0.1"),
+    # The proxy appends the address it saw; anything left of it may be spoofed
+    ("198.51.100.9, 203.0.113.7", 1, "203.0.113.7"),
+    ("198.51.100.9, 203.0.113.7, 10.1.1.1", 2, "203.0.113.7"),
+    # More hops than entries: the client connected to the first proxy directly
+    ("203.0.113.7", 3, "203.0.113.7"),
+    ("", 1, "10.0.0.1"),
+    (None, 1, "10.0.0.1"),
+])
+def test_client_ip_trusts_only_the_configured_proxy_hops(forwarded_for, hops, expected):
+    assert client_ip(_request(forwarded_for), trusted_hops=hops) == expected
+
+
+def test_parse_quota():
+    assert parse_quota("20/minute;500/day") == [(20, 60), (500, 86400)]
+    assert parse_quota(" 5 / second ") == [(5, 1)]
+
+
+def test_sliding_window_weights_the_previous_window(clock):
+    clock.now = 1200.0  # start of a minute window
+    store = MemoryWindowStore(clock=clock)
+    windows = [(10, 60)]
+
+    async def allowed():
+        (estimate, _), = await store.hit("user_1", windows)
+        return estimate + 1 <= 10
+
+    async def run():
+        assert [await allowed() for _ in range(11)] == [True] * 10 + [False]
+
+        # Right after the window rolls over, the previous window still counts in full
+        clock.advance(60)
+        assert not await allowed()
+
+        # Halfway through, half of the previous window's 10 requests still count
+        clock.advance(30)
+        assert [await allowed() for _ in range(6)] == [True] * 5 + [False]
+
+    asyncio.run(run())
+
+
+def test_sliding_window_rejection_is_not_counted(clock):
+    clock.now = 1200.0
+    store = MemoryWindowStore(clock=clock)
+
+    async def run():
+        # The minute window is full, so the hour window must not be charged either
+        windows = [(1, 60), (5, 3600)]
+        await store.hit("user_1", windows)
+        await store.hit("user_1", windows)
+        clock.advance(60)
+        results = await store.hit("user_1", [(1, 60), (5, 3600)])
+        return results[1][0]
+
+    assert asyncio.run(run()) == 1
+
+
+def test_plan_quotas_report_the_tightest_window(clock):
+    clock.now = 1200.0
+    limiter = PlanRateLimiter(MemoryWindowStore(clock=clock), {"ai_generate": {"pro": "2/minute;3/day"}},
+                              metrics=RateLimitMetrics())
+
+    async def run():
+        assert await limiter.check("ai_generate", "free", "user_1") is None
+        return [await limiter.check("ai_generate", "pro", "user_1") for _ in range(3)]
+
+    first, second, third = asyncio.run(run())
+    assert first.headers() == {
+        "RateLimit-Limit": "2",
+        "RateLimit-Remaining": "1",
+        "RateLimit-Reset": "60",
+        "RateLimit-Policy": "2;w=60, 3;w=86400",
+    }
+    assert second.allowed and second.remaining == 0
+    assert not third.allowed and third.remaining == 0
+
+
+def _app(result):
+    async def stream(request):
+        request.state.rate_limit = result
+
+        async def body():
+            yield b"chunk"
+
+        return StreamingResponse(body(), headers={"RateLimit-Limit": "99"} if result is None else None)
+
+    return RateLimitHeadersMiddleware(Starlette(routes=[Route("/", stream)]))
+
+
+def test_headers_middleware_adds_headers_to_streamed_responses():
+    result = QuotaResult(allowed=True, limit=20, remaining=19, reset=42, policy="20;w=60")
+    response = TestClient(_app(result)).get("/")
+    assert response.text == "chunk"
+    assert response.headers["ratelimit-limit"] == "20"
+    assert response.headers["ratelimit-remaining"] == "19"
+    assert response.headers["ratelimit-reset"] == "42"
+    assert response.headers["ratelimit-policy"] == "20;w=60"
+
+
+def test_headers_middleware_leaves_unlimited_routes_alone():
+    response = TestClient(_app(None)).get("/")
+    assert response.headers["ratelimit-limit"] == "99"
+    assert "ratelimit-remaining" not in response.headers
@@ -0,0 +1,162 @@
+import asyncio
+import io
+from datetime import datetime, timezone, timedelta
+
+from bson import ObjectId
+from gridfs.errors import NoFile
+
+from resume_jobs import ResumeJobQueue
+
+
+class MemoryBucket:
+    """Just the GridFS bucket calls the queue makes."""
+
+    def __init__(self):
+        self.files = {}
+
+    async def upload_from_stream(self, filename, source, metadata=None):
+        file_id = ObjectId()
+        self.files[file_id] = source.read()
+        return file_id
+
+    async def open_download_stream(self, file_id):
+        data = self.files[file_id]
+
+        class Stream:
+            chunks = [data[i:i + 4] for i in range(0, len(data), 4)]
+
+            async def readchunk(self):
+                return self.chunks.pop(0) if self.chunks else b""
+
+        return Stream()
+
+    async def delete(self, file_id):
+        if self.files.pop(file_id, None) is None:
+            raise NoFile(file_id)
+
+
+def _queue(db, handler, **kwargs):
+    return ResumeJobQueue(db.resume_jobs, handler, MemoryBucket(), **kwargs)
+
+
+async def _read_pdf(queue, job, report_progress):
+    await report_progress("parsing")
+    async with queue.pdf_path(job) as path:
+        with open(path, "rb") as f:
+            return {"text": f.read().decode()}
+
+
+def test_job_is_processed_and_its_pdf_deleted(db):
+    async def run():
+        queue = _queue(db, lambda job, progress: _read_pdf(queue, job, progress))
+        job = await queue.enqueue("user_1", io.BytesIO(b"%PDF-resume"), filename="cv.pdf", pdf_sha256="abc")
+        assert job["status"] == "queued"
+        assert "pdf_file_id" not in job
+
+        claimed = await queue._claim()
+        assert claimed["attempts"] == 1
+        await queue._process(claimed)
+        return queue, await queue.get(job["job_id"], "user_1"), await queue.get(job["job_id"], "user_2")
+
+    queue, done, other_user = asyncio.run(run())
+    assert done["status"] == "completed"
+    assert done["result"] == {"text": "%PDF-resume"}
+    assert done["expires_at"] > datetime.now(timezone.utc)
+    assert "lease_id" not in done and "lease_expires_at" not in done
+    assert queue.files.files == {}
+    assert other_user is None
+
+
+def test_failed_job_is_retried_then_marked_failed(db):
+    async def failing(job, progress):
+        raise ValueError("unreadable PDF")
+
+    async def run():
+        queue = _queue(db, failing, max_attempts=2)
+        job = await queue.enqueue("user_1", io.BytesIO(b"%PDF-"))
+
+        await queue._process(await queue._claim())
+        retried = await db.resume_jobs.find_one({"job_id": job["job_id"]})
+        assert retried["status"] == "queued"
+        assert retried["error"] == "Resume extraction failed: unreadable PDF"
+        assert "lease_id" not in retried
+
+        await queue._process(await queue._claim())
+        assert await queue._claim() is None
+        return queue, await queue.get(job["job_id"], "user_1")
+
+    queue, failed = asyncio.run(run())
+    assert failed["status"] == "failed"
+    assert failed["attempts"] == 2
+    assert queue.files.files == {}
+
+
+def test_expired_lease_is_reclaimed_and_the_stale_worker_is_fenced_off(db):
+    async def run():
+        queue = _queue(db, lambda job, progress: _read_pdf(queue, job, progress), lease_seconds=60)
+        job = await queue.enqueue("user_1", io.BytesIO(b"%PDF-"))
+
+        stale = await queue._claim()
+        # A live lease can't be claimed twice
+        assert await queue._claim() is None
+
+        await db.resume_jobs.update_one(
+            {"job_id": job["job_id"]},
+            {"$set": {"lease_expires_at": datetime.now(timezone.utc) - timedelta(seconds=1)}},
+        )
+        fresh = await queue._claim()
+        assert fresh["attempts"] == 2
+        assert fresh["lease_id"] != stale["lease_id"]
+
+        # The first worker finally gives up; its writes must not land
+        await queue._finish(stale, "failed", error="timed out")
+        current = await queue.get(job["job_id"], "user_1")
+        assert current["status"] == "running"
+
+        await queue._process(fresh)
+        return await queue.get(job["job_id"], "user_1")
+
+    assert asyncio.run(run())["status"] == "completed"
+
+
+def test_job_over_the_attempt_limit_fails_without_running(db):
+    calls = []
+
+    async def handler(job, progress):
+        calls.append(job["job_id"])
+        return {}
+
+    async def run():
+        queue = _queue(db, handler, max_attempts=1, lease_seconds=60)
+        job = await queue.enqueue("user_1", io.BytesIO(b"%PDF-"))
+        await queue._claim()
+        # The worker holding the job died without finishing it
+        await db.resume_jobs.update_one(
+            {"job_id": job["job_id"]},
+            {"$set": {"lease_expires_at": datetime.now(timezone.utc) - timedelta(seconds=1)}},
+        )
+        await queue._process(await queue._claim())
+        return await queue.get(job["job_id"], "user_1")
+
+    failed = asyncio.run(run())
+    assert failed["status"] == "failed"
+    assert failed["error"] == "Resume extraction failed: too many attempts"
+    assert calls == []
+
+
+def test_workers_pick_up_queued_jobs(db):
+    async def run():
+        queue = _queue(db, lambda job, progress: _read_pdf(queue, job, progress), workers=2, poll_interval=0.01)
+        queue.start()
+        try:
+            jobs = [await queue.enqueue("user_1", io.BytesIO(b"%PDF-" + str(i).encode())) for i in range(3)]
+            for _ in range(200):
+                done = [await queue.get(job["job_id"], "user_1") for job in jobs]
+                if all(job["status"] == "completed" for job in done):
+                    return done
+                await asyncio.sleep(0.01)
+        finally:
+            await queue.stop()
+
+    done = asyncio.run(run())
+    assert [job["result"]["text"] for job in done] == ["%PDF-0", "%PDF-1", "%PDF-2"]
@@ -0,0 +1,92 @@
+import asyncio
+from datetime import datetime, timezone, timedelta
+from types import SimpleNamespace
+
+from session_cache import SessionCache
+from session_lifecycle import SessionLifecycle
+
+
+def _session(token, user_id="user_1", created_minutes_ago=0, expires_in=timedelta(days=1)):
+    now = datetime.now(timezone.utc)
+    return {
+        "session_token": token,
+        "user_id": user_id,
+        "created_at": now - timedelta(minutes=created_minutes_ago),
+        "expires_at": now + expires_in,
+    }
+
+
+async def _tokens(db):
+    return sorted([doc["session_token"] async for doc in db.user_sessions.find()])
+
+
+def test_cap_evicts_the_oldest_sessions_and_drops_them_from_the_cache(db):
+    cache = SessionCache()
+
+    async def on_evict(tokens):
+        for token in tokens:
+            cache.invalidate(token)
+
+    lifecycle = SessionLifecycle(db.user_sessions, on_evict=on_evict, max_per_user=2)
+    user = SimpleNamespace(user_id="user_1")
+
+    async def run():
+        await db.user_sessions.insert_many([
+            _session("oldest", created_minutes_ago=30),
+            _session("older", created_minutes_ago=20),
+            _session("newer", created_minutes_ago=10),
+            _session("newest"),
+            _session("someone_else", user_id="user_2", created_minutes_ago=60),
+        ])
+        for token in ("oldest", "older", "newer", "newest"):
+            cache.set(token, user, datetime.now(timezone.utc) + timedelta(days=1))
+
+        evicted = await lifecycle.enforce_cap("user_1")
+        assert await lifecycle.enforce_cap("user_1") == 0
+        return evicted, await _tokens(db)
+
+    evicted, remaining = asyncio.run(run())
+    assert evicted == 2
+    assert remaining == ["newer", "newest", "someone_else"]
+    assert cache.get("oldest") is None and cache.get("older") is None
+    assert cache.get("newest") is not None
+    assert lifecycle.stats()["evicted"] == 2
+
+
+def test_reaper_removes_only_expired_sessions(db):
+    lifecycle = SessionLifecycle(db.user_sessions, batch_size=2)
+    day = timedelta(days=1)
+
+    async def run():
+        await db.user_sessions.insert_many([
+            _session("live"),
+            _session("expired_1", expires_in=-day),
+            _session("expired_2", expires_in=-day),
+            _session("expired_3", expires_in=-timedelta(seconds=1)),
+            # Legacy string dates, which the TTL index never removes
+            {**_session("legacy_live"), "expires_at": (datetime.now(timezone.utc) + day).isoformat()},
+            {**_session("legacy_expired"), "expires_at": (datetime.now(timezone.utc) - day).isoformat()},
+        ])
+        for _ in range(3):
+            lifecycle.record_created()
+        return await lifecycle.reap(), await _tokens(db)
+
+    reaped, remaining = asyncio.run(run())
+    assert reaped == 4
+    assert remaining == ["legacy_live", "live"]
+
+    stats = lifecycle.stats()
+    assert stats["reaped"] == 4
+    assert stats["size"] == 2
+    assert stats["created"] == 3
+    assert stats["last_reap_at"] is not None
+
+
+def test_cap_of_zero_disables_eviction(db):
+    lifecycle = SessionLifecycle(db.user_sessions, max_per_user=0)
+
+    async def run():
+        await db.user_sessions.insert_many([_session(f"s{i}", created_minutes_ago=i) for i in range(3)])
+        return await lifecycle.enforce_cap("user_1"), await db.user_sessions.count_documents({})
+
+    assert asyncio.run(run()) == (0, 3)
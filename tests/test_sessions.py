@@ -0,0 +1,40 @@
+import asyncio
+from datetime import datetime, timezone, timedelta
+
+import pytest
+
+from sessions import find_session_then_user, find_session_with_user
+
+
+async def _seed(db):
+    now = datetime.now(timezone.utc)
+    await db.users.insert_one({"user_id": "user_1", "email": "a@example.com", "plan": "pro"})
+    await db.user_sessions.insert_many([
+        {"session_token": "live", "user_id": "user_1", "expires_at": now + timedelta(days=1)},
+        {"session_token": "expired", "user_id": "user_1", "expires_at": now - timedelta(seconds=1)},
+        {"session_token": "orphan", "user_id": "user_gone", "expires_at": now + timedelta(days=1)},
+        # Sessions written before expiries were stored as dates; the caller checks these
+        {"session_token": "legacy", "user_id": "user_1", "expires_at": (now + timedelta(days=1)).isoformat()},
+    ])
+
+
+@pytest.mark.parametrize("find", [find_session_with_user, find_session_then_user])
+def test_session_lookup(db, find):
+    async def run():
+        await _seed(db)
+        return {token: await find(db, token) for token in ("live", "expired", "orphan", "legacy", "missing")}
+
+    found = asyncio.run(run())
+    session, user = found["live"]
+    assert isinstance(session["expires_at"], datetime)
+    assert user == {"user_id": "user_1", "email": "a@example.com", "plan": "pro"}
+
+    assert found["expired"] is None
+    assert found["missing"] is None
+
+    session, user = found["orphan"]
+    assert session is not None and user is None
+
+    session, user = found["legacy"]
+    assert isinstance(session["expires_at"], str)
+    assert user["user_id"] == "user_1"
@@ -0,0 +1,162 @@
+import asyncio
+
+import cloudinary
+import cloudinary.uploader
+import cloudinary.utils
+import httpx
+import pytest
+
+import storage as storage_module
+from http_client import outbound_http
+from storage import CloudinaryStorage, InvalidAsset, InvalidUploadSignature, LocalStorage, direct_upload_id
+
+PDF = b"%PDF-1.4\n" + b"x" * 100
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 100
+ONE_MB = 1024 * 1024
+
+
+@pytest.fixture
+def local(tmp_path):
+    return LocalStorage(directory=tmp_path, base_url="http://files.test/uploads", upload_url="http://api.test/api/uploads/local")
+
+
+def test_local_signature_covers_the_folder_and_public_id(local):
+    fields = local.sign_upload("resume", direct_upload_id("user_1", "abc_resume.pdf"))["fields"]
+    assert fields["public_id"] == "user_1/abc_resume.pdf"
+    local.verify_upload(fields["folder"], fields["public_id"], fields["timestamp"], fields["signature"])
+
+    with pytest.raises(InvalidUploadSignature):
+        local.verify_upload(fields["folder"], "user_2/abc_resume.pdf", fields["timestamp"], fields["signature"])
+
+    expired = local.sign_upload("resume", "user_1/old.pdf")["fields"]
+    expired["timestamp"] -= storage_module.SIGNED_UPLOAD_TTL + 1
+    with pytest.raises(InvalidUploadSignature):
+        local.verify_upload(expired["folder"], expired["public_id"], expired["timestamp"],
+                            local._signature({k: expired[k] for k in ("folder", "public_id", "timestamp")}))
+
+
+@pytest.mark.parametrize("url, owned", [
+    ("http://files.test/uploads/portfolio_resumes/user_1/abc_resume.pdf", True),
+    ("http://files.test/uploads/portfolio_resumes/user_2/abc_resume.pdf", False),
+    ("http://files.test/uploads/portfolio_resumes/user_10/abc_resume.pdf", False),
+    ("http://files.test/uploads/portfolio_resumes/user_1/../user_2/abc_resume.pdf", False),
+    ("http://files.test/uploads/portfolio_profiles/user_1/me.png", False),  # wrong kind
+    ("https://elsewhere.test/uploads/portfolio_resumes/user_1/abc_resume.pdf", False),
+])
+def test_local_owns_url_requires_the_users_own_path(local, url, owned):
+    assert local.owns_url(url, "resume", "user_1") is owned
+
+
+def _save(local, data, public_id="user_1/abc_resume.pdf"):
+    return asyncio.run(local.save(data, "portfolio_resumes", public_id))
+
+
+def test_local_valid_asset_is_kept(local, tmp_path):
+    url = _save(local, PDF)
+    asyncio.run(local.verify_asset(url, "resume"))
+    assert (tmp_path / "portfolio_resumes/user_1/abc_resume.pdf").read_bytes() == PDF
+
+
+@pytest.mark.parametrize("data, error", [
+    (PDF + b"x" * ONE_MB, "File too large"),
+    (PNG, "Unsupported file type"),
+])
+def test_local_invalid_asset_is_deleted(local, tmp_path, data, error):
+    url = _save(local, data)
+    with pytest.raises(InvalidAsset, match=error):
+        asyncio.run(local.verify_asset(url, "resume"))
+    assert not (tmp_path / "portfolio_resumes/user_1/abc_resume.pdf").exists()
+
+
+def test_local_missing_or_escaping_asset_is_rejected(local):
+    with pytest.raises(InvalidAsset, match="not found"):
+        asyncio.run(local.verify_asset("http://files.test/uploads/portfolio_resumes/user_1/none.pdf", "resume"))
+    with pytest.raises(ValueError):
+        _save(local, PDF, public_id="../../outside.pdf")
+
+
+@pytest.fixture
+def cloud(monkeypatch):
+    cloudinary.config(cloud_name="demo", api_key="key", api_secret="secret")
+    destroyed = []
+    monkeypatch.setattr(cloudinary.uploader, "destroy", lambda public_id, **options: destroyed.append((public_id, options)))
+    backend = CloudinaryStorage()
+    backend.destroyed = destroyed
+    return backend
+
+
+def _serve(monkeypatch, body, total):
+    def handler(request):
+        assert request.headers["Range"] == f"bytes=0-{storage_module.SNIFF_BYTES - 1}"
+        return httpx.Response(206, content=body[:storage_module.SNIFF_BYTES],
+                              headers={"Content-Range": f"bytes 0-{storage_module.SNIFF_BYTES - 1}/{total}"})
+
+    monkeypatch.setattr(outbound_http, "_client", httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+
+
+def test_cloudinary_signature_restricts_formats(cloud):
+    fields = cloud.sign_upload("resume", "user_1/abc_resume.pdf")["fields"]
+    assert fields["allowed_formats"] == "pdf"
+    signed = {k: v for k, v in fields.items() if k not in ("signature", "api_key")}
+    assert fields["signature"] == cloudinary.utils.api_sign_request(signed, "secret")
+
+
+@pytest.mark.parametrize("url, owned", [
+    ("https://res.cloudinary.com/demo/raw/upload/v1700000000/portfolio_resumes/user_1/abc_resume.pdf", True),
+    ("https://res.cloudinary.com/demo/raw/upload/portfolio_resumes/user_1/abc_resume.pdf", True),
+    ("https://res.cloudinary.com/demo/raw/upload/v1700000000/portfolio_resumes/user_2/abc_resume.pdf", False),
+    ("https://res.cloudinary.com/demo/raw/upload/v1/portfolio_resumes/user_1/../user_2/x.pdf", False),
+    ("https://res.cloudinary.com/demo/image/upload/v1/portfolio_resumes/user_1/abc_resume.pdf", False),
+    ("https://res.cloudinary.com/other/raw/upload/v1/portfolio_resumes/user_1/abc_resume.pdf", False),
+])
+def test_cloudinary_owns_url_requires_the_users_public_id(cloud, url, owned):
+    assert cloud.owns_url(url, "resume", "user_1") is owned
+
+
+def test_cloudinary_valid_asset_is_kept(cloud, monkeypatch):
+    _serve(monkeypatch, PDF, len(PDF))
+    url = "https://res.cloudinary.com/demo/raw/upload/v1/portfolio_resumes/user_1/abc_resume.pdf"
+    asyncio.run(cloud.verify_asset(url, "resume"))
+    assert cloud.destroyed == []
+
+
+@pytest.mark.parametrize("body, total, kind, url, public_id", [
+    (PDF, 5 * ONE_MB, "resume",
+     "https://res.cloudinary.com/demo/raw/upload/v1/portfolio_resumes/user_1/abc_resume.pdf",
+     "portfolio_resumes/user_1/abc_resume.pdf"),
+    (PDF, len(PDF), "profile_image",
+     "https://res.cloudinary.com/demo/image/upload/v1/portfolio_profiles/user_1/me.png",
+     "portfolio_profiles/user_1/me"),
+])
+def test_cloudinary_invalid_asset_is_deleted(cloud, monkeypatch, body, total, kind, url, public_id):
+    _serve(monkeypatch, body, total)
+    with pytest.raises(InvalidAsset):
+        asyncio.run(cloud.verify_asset(url, kind))
+    assert [deleted for deleted, _ in cloud.destroyed] == [public_id]
+
+
+def test_direct_upload_flow_through_the_api(app, portfolio, auth_headers, tmp_path, monkeypatch):
+    local = LocalStorage(directory=tmp_path, base_url="http://files.test/uploads",
+                         upload_url="http://test/api/uploads/local")
+    monkeypatch.setattr(app, "storage", local)
+
+    async def run():
+        transport = httpx.ASGITransport(app=app.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            signed = (await client.post("/api/uploads/sign", json={"kind": "resume"}, headers=auth_headers)).json()
+            assert signed["fields"]["public_id"].startswith("user_1/")
+            uploaded = await client.post(signed["upload_url"], data=signed["fields"],
+                                         files={"file": ("cv.pdf", PDF, "application/pdf")})
+            assert uploaded.status_code == 200
+            url = uploaded.json()["secure_url"]
+
+            ok = await client.put("/api/portfolios/portfolio_1", json={"resume_url": url}, headers=auth_headers)
+            assert ok.status_code == 200
+            assert ok.json()["resume_url"] == url
+
+            others = url.replace("/user_1/", "/user_2/")
+            rejected = await client.put("/api/portfolios/portfolio_1", json={"resume_url": others}, headers=auth_headers)
+            assert rejected.status_code == 400
+            assert rejected.json()["detail"] == "Invalid resume_url URL"
+
+    asyncio.run(run())
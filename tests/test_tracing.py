@@ -0,0 +1,232 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from tracing import (
+    CLIENT,
+    SERVER,
+    FileExporter,
+    MongoCommandTracer,
+    OTLPExporter,
+    Tracer,
+    TracingMiddleware,
+    parse_traceparent,
+)
+
+TRACE_ID = "4bf92f3577b34da6a3ce929d0e0e4736"
+PARENT_ID = "00f067aa0ba902b7"
+
+
+class MemoryExporter:
+    def __init__(self):
+        self.payloads = []
+
+    async def export(self, payload):
+        self.payloads.append(payload)
+
+    async def aclose(self):
+        pass
+
+    @property
+    def spans(self):
+        return [span for payload in self.payloads
+                for resource in payload["resourceSpans"]
+                for scope in resource["scopeSpans"]
+                for span in scope["spans"]]
+
+
+def _tracer(**kwargs):
+    return Tracer(exporter=MemoryExporter(), enabled=True, **kwargs)
+
+
+@pytest.mark.parametrize("value, parsed", [
+    (f"00-{TRACE_ID}-{PARENT_ID}-01", (TRACE_ID, PARENT_ID, True)),
+    (f" 00-{TRACE_ID}-{PARENT_ID}-00 ", (TRACE_ID, PARENT_ID, False)),
+    (f"00-{TRACE_ID}-{PARENT_ID}-zz", None),
+    (f"00-{TRACE_ID[:-1]}-{PARENT_ID}-01", None),
+    (f"00-{TRACE_ID}-{PARENT_ID}", None),
+    ("", None),
+    (None, None),
+])
+def test_parse_traceparent(value, parsed):
+    assert parse_traceparent(value) == parsed
+
+
+def test_sampling_follows_the_rate_unless_the_caller_decided():
+    assert Tracer(enabled=False).start_root("GET /") is None
+
+    never, always = _tracer(sample_rate=0.0), _tracer(sample_rate=1.0)
+    assert never.start_root("GET /") is None
+    assert always.start_root("GET /") is not None
+
+    # The caller's sampled flag wins over the local rate
+    span = never.start_root("GET /", traceparent=f"00-{TRACE_ID}-{PARENT_ID}-01")
+    assert (span.trace_id, span.parent_id) == (TRACE_ID, PARENT_ID)
+    assert always.start_root("GET /", traceparent=f"00-{TRACE_ID}-{PARENT_ID}-00") is None
+
+    # Work linked to sampled traces is always kept
+    assert never.start_root("job", links=[(TRACE_ID, PARENT_ID)]) is not None
+
+
+def test_sample_rate_applies_to_the_trace_id():
+    tracer = _tracer(sample_rate=0.5)
+    assert tracer._sampled("7" + "f" * 31)
+    assert not tracer._sampled("8" + "0" * 31)
+
+
+def _app(tracer, seen):
+    async def show(request):
+        with tracer.span("render") as child:
+            seen["child"] = child
+            seen["traceparent"] = tracer.current_traceparent()
+        return JSONResponse({})
+
+    async def boom(request):
+        return JSONResponse({}, status_code=503)
+
+    app = Starlette(routes=[Route("/portfolios/{id}", show), Route("/boom", boom), Route("/health", show)])
+    return TracingMiddleware(app, tracer, route_name=lambda scope: scope["path"].rsplit("/", 1)[0] + "/{id}",
+                             exclude=["/health"])
+
+
+def test_middleware_continues_the_callers_trace():
+    tracer, seen = _tracer(sample_rate=0.0), {}
+    client = TestClient(_app(tracer, seen))
+    client.get("/portfolios/p1", headers={"traceparent": f"00-{TRACE_ID}-{PARENT_ID}-01"})
+    asyncio.run(tracer.flush())
+
+    child, root = tracer.exporter.spans
+    assert root["traceId"] == TRACE_ID and root["parentSpanId"] == PARENT_ID
+    assert root["name"] == "GET /portfolios/{id}"
+    assert root["kind"] == SERVER
+    assert {"key": "http.status_code", "value": {"intValue": "200"}} in root["attributes"]
+    assert child["traceId"] == TRACE_ID and child["parentSpanId"] == root["spanId"]
+    # What the outbox and job queue store to link background work back to the request
+    assert seen["traceparent"] == f"00-{TRACE_ID}-{child['spanId']}-01"
+
+
+def test_middleware_skips_unsampled_and_excluded_requests():
+    tracer, seen = _tracer(sample_rate=0.0), {}
+    client = TestClient(_app(tracer, seen))
+    client.get("/portfolios/p1")
+    assert seen["child"] is None and seen["traceparent"] is None
+
+    tracer.sample_rate = 1.0
+    client.get("/health")
+    client.get("/boom")
+    asyncio.run(tracer.flush())
+    root, = tracer.exporter.spans
+    assert root["status"] == {"code": 2, "message": "HTTP 503"}
+
+
+def test_linked_span_starts_a_trace_linked_to_its_requests():
+    tracer = _tracer(sample_rate=0.0)
+    other = "a" * 32
+    with tracer.linked_span("email outbox", [f"00-{TRACE_ID}-{PARENT_ID}-01", "garbage", f"00-{other}-{'b' * 16}-01"],
+                            {"email.count": 3}) as span:
+        assert span.trace_id not in (TRACE_ID, other)
+        assert span.parent_id is None
+    with tracer.linked_span("email outbox", ["garbage"]) as unlinked:
+        assert unlinked is None
+
+    asyncio.run(tracer.flush())
+    exported, = tracer.exporter.spans
+    assert exported["links"] == [{"traceId": TRACE_ID, "spanId": PARENT_ID}, {"traceId": other, "spanId": "b" * 16}]
+
+
+def _event(command_name="find", request_id=1, **extra):
+    return SimpleNamespace(command_name=command_name, command={command_name: "portfolios"}, database_name="app",
+                           connection_id=("localhost", 27017), request_id=request_id, **extra)
+
+
+def test_mongo_commands_become_children_of_the_current_span():
+    tracer = _tracer()
+    listener = MongoCommandTracer(tracer)
+
+    async def run():
+        listener.started(_event(request_id=0))  # outside any trace
+        with tracer.activate(tracer.start_root("GET /")) as root:
+            # Motor runs commands on executor threads with a copy of the caller's context
+            await asyncio.to_thread(listener.started, _event(request_id=1))
+            await asyncio.to_thread(listener.started, _event("insert", request_id=2))
+        listener.succeeded(_event(request_id=1))
+        listener.failed(_event("insert", request_id=2, failure={"errmsg": "duplicate key"}))
+        listener.succeeded(_event(request_id=0))
+        await tracer.flush()
+        return root
+
+    root = asyncio.run(run())
+    _, find, insert = tracer.exporter.spans
+    assert find["parentSpanId"] == root.span_id and find["traceId"] == root.trace_id
+    assert find["name"] == "mongodb find" and find["kind"] == CLIENT
+    assert {"key": "db.mongodb.collection", "value": {"stringValue": "portfolios"}} in find["attributes"]
+    assert insert["status"] == {"code": 2, "message": "duplicate key"}
+    assert listener._spans == {}
+
+
+def test_file_exporter_writes_one_otlp_request_per_line(tmp_path):
+    path = tmp_path / "traces.jsonl"
+    tracer = Tracer(exporter=FileExporter(str(path)), enabled=True, service_name="portfolio-test", export_batch=2)
+
+    async def run():
+        with tracer.activate(tracer.start_root("GET /")):
+            for i in range(2):
+                with tracer.span("step", attributes={"i": i, "ok": True, "ratio": 0.5}):
+                    pass
+        await tracer.flush()
+
+    asyncio.run(run())
+    first, second = [json.loads(line) for line in path.read_text().splitlines()]
+    resource = first["resourceSpans"][0]
+    assert resource["resource"]["attributes"] == [{"key": "service.name", "value": {"stringValue": "portfolio-test"}}]
+    spans = resource["scopeSpans"][0]["spans"]
+    assert len(spans) == 2
+    assert spans[0]["attributes"] == [
+        {"key": "i", "value": {"intValue": "0"}},
+        {"key": "ok", "value": {"boolValue": True}},
+        {"key": "ratio", "value": {"doubleValue": 0.5}},
+    ]
+    assert int(spans[0]["endTimeUnixNano"]) >= int(spans[0]["startTimeUnixNano"])
+    assert len(second["resourceSpans"][0]["scopeSpans"][0]["spans"]) == 1
+    assert tracer.stats()["exported"] == 3
+
+
+def test_otlp_exporter_posts_json_and_counts_failed_exports_as_dropped():
+    received = []
+
+    def handler(request):
+        received.append(json.loads(request.content))
+        return httpx.Response(200 if len(received) == 1 else 503)
+
+    exporter = OTLPExporter("http://collector.test/v1/traces")
+    exporter._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    tracer = Tracer(exporter=exporter, enabled=True)
+
+    async def run():
+        for _ in range(2):
+            with tracer.activate(tracer.start_root("GET /")):
+                pass
+            await tracer.flush()
+        await exporter.aclose()
+
+    asyncio.run(run())
+    assert len(received) == 2
+    assert received[0]["resourceSpans"][0]["scopeSpans"][0]["spans"][0]["name"] == "GET /"
+    assert tracer.stats()["exported"] == 1
+    assert tracer.stats()["dropped"] == 1
+
+
+def test_full_queue_drops_spans():
+    tracer = _tracer(max_queue=1)
+    for _ in range(3):
+        with tracer.activate(tracer.start_root("GET /")):
+            pass
+    assert tracer.stats()["queued"] == 1
+    assert tracer.stats()["dropped"] == 2
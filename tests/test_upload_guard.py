@@ -0,0 +1,97 @@
+import asyncio
+import hashlib
+import io
+
+import pytest
+from fastapi import UploadFile
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from upload_guard import (
+    IMAGE_TYPES,
+    PDF_TYPES,
+    BodySizeLimitMiddleware,
+    UploadRejected,
+    guard_upload,
+    sniff_mime_type,
+)
+
+PDF = b"%PDF-1.4\n" + b"x" * 1000
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 100
+
+
+@pytest.mark.parametrize("head, mime_type", [
+    (PDF, "application/pdf"),
+    (PNG, "image/png"),
+    (b"\xff\xd8\xff\xe0" + b"\x00" * 12, "image/jpeg"),
+    (b"GIF89a" + b"\x00" * 10, "image/gif"),
+    (b"RIFF\x00\x00\x00\x00WEBPVP8 ", "image/webp"),
+    (b"<html><body>", None),
+    (b"", None),
+])
+def test_sniff_mime_type(head, mime_type):
+    assert sniff_mime_type(head[:16]) == mime_type
+
+
+def _guard(data, max_bytes, allowed_types, filename="upload.bin"):
+    return asyncio.run(guard_upload(UploadFile(io.BytesIO(data), filename=filename), max_bytes, allowed_types, "Resume"))
+
+
+def test_accepted_upload_is_measured_hashed_and_rewound():
+    guarded = _guard(PDF, 10_000, PDF_TYPES, filename="cv.pdf")
+    assert guarded.mime_type == "application/pdf"
+    assert guarded.size == len(PDF)
+    assert guarded.sha256 == hashlib.sha256(PDF).hexdigest()
+    assert guarded.filename == "cv.pdf"
+    assert guarded.file.read() == PDF
+
+
+def test_declared_type_is_ignored_in_favour_of_magic_bytes():
+    # A PNG renamed to .pdf is still a PNG
+    with pytest.raises(UploadRejected) as rejected:
+        _guard(PNG, 10_000, PDF_TYPES, filename="cv.pdf")
+    assert rejected.value.status_code == 415
+    assert "application/pdf" in rejected.value.detail
+
+
+def test_oversized_upload_is_rejected():
+    with pytest.raises(UploadRejected) as rejected:
+        _guard(PDF + b"x" * 2048, 1024, PDF_TYPES)
+    assert rejected.value.status_code == 413
+    assert rejected.value.detail == "Resume too large. Max size is 1KB."
+
+
+def test_upload_exactly_at_the_limit_is_accepted():
+    assert _guard(PNG, len(PNG), IMAGE_TYPES).size == len(PNG)
+
+
+def _client(limit):
+    async def echo(request):
+        body = await request.body()
+        return JSONResponse({"received": len(body)})
+
+    app = Starlette(routes=[Route("/upload", echo, methods=["POST"])])
+    return TestClient(BodySizeLimitMiddleware(app, {("POST", "/upload"): limit}))
+
+
+def test_body_limit_refuses_large_content_length():
+    response = _client(100).post("/upload", content=b"x" * 101)
+    assert response.status_code == 413
+    assert response.json()["detail"].startswith("Request body too large")
+
+
+def test_body_limit_cuts_off_chunked_bodies():
+    def chunks():
+        for _ in range(10):
+            yield b"x" * 50
+
+    response = _client(100).post("/upload", content=chunks())
+    assert response.status_code == 413
+
+
+def test_body_limit_passes_small_bodies_and_other_routes():
+    client = _client(100)
+    assert client.post("/upload", content=b"x" * 100).json() == {"received": 100}
+    assert client.get("/upload").status_code == 405